@@ -0,0 +1,143 @@
+"""
+Datos sintéticos para medir la API (manage.py seed_bench / bench_api).
+
+Todo lo que se crea cuelga de usuarios "bench-user-N" y grupos
+"bench-group-N", así que `flush()` lo quita sin tocar lo demás. Se crea con
+bulk_create y, como hacen las operaciones en bloque de la app, se apunta a
+mano en el buscador y en el registro de cambios.
+"""
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from planner.models import DailyPlan
+from planner.signals import bulk_operation
+from recipes.models import Ingredient, Meal, RecipeIngredient
+from recipes.search import schedule_reindex
+from recipes.typeahead import normalize_name
+from sync.log import CREATE, record
+from users.models import PlanningGroup
+
+USER_PREFIX = 'bench-user-'
+GROUP_PREFIX = 'bench-group-'
+# Los usuarios sintéticos entran con esta contraseña (ver la prueba de carga)
+PASSWORD = 'bench-password'
+
+WORDS = [
+    'tomate', 'arroz', 'pollo', 'cebolla', 'ajo', 'patata', 'huevo', 'leche', 'harina', 'aceite',
+    'pimiento', 'zanahoria', 'lenteja', 'garbanzo', 'atún', 'merluza', 'queso', 'yogur', 'limón',
+    'manzana', 'plátano', 'espinaca', 'calabacín', 'berenjena', 'champiñón', 'pasta', 'pan', 'sal',
+]
+DISHES = ['Guiso', 'Ensalada', 'Crema', 'Tortilla', 'Arroz', 'Salteado', 'Horno', 'Sopa', 'Tarta', 'Pisto']
+UNITS = ['g', 'ml', 'unidades', 'cucharadas']
+
+
+def user_names(count):
+    return [f'{USER_PREFIX}{i}' for i in range(count)]
+
+
+@transaction.atomic
+def seed(users=20, groups=5, members=4, meals=50, ingredients=8, pantry=60, months=3, start=None, seed=0):
+    """
+    Crea `users` usuarios con `meals` recetas cada uno (de `ingredients`
+    ingredientes, sacados de una despensa privada de `pantry`) y `groups`
+    grupos de `members` usuarios con `months` meses de planes (4 franjas al
+    día) desde `start`. Devuelve lo que se ha creado.
+    """
+    rng = random.Random(seed)
+    start = start or date.today().replace(day=1)
+    days = months * 30
+
+    # Una sola vez el hash: con el hasher de verdad son ~0,3 s por usuario
+    password = make_password(PASSWORD)
+    people = User.objects.bulk_create(
+        User(username=name, email=f'{name}@example.com', password=password) for name in user_names(users)
+    )
+
+    pantries = {}
+    all_ingredients = []
+    for user in people:
+        names = {f'{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {i}' for i in range(pantry)}
+        pantries[user.pk] = [
+            Ingredient(name=name, normalized_name=normalize_name(name), user=user) for name in sorted(names)
+        ]
+        all_ingredients += pantries[user.pk]
+    all_ingredients = Ingredient.objects.bulk_create(all_ingredients)
+
+    all_meals = Meal.objects.bulk_create(
+        Meal(
+            name=f'{rng.choice(DISHES)} de {rng.choice(WORDS)} {i}',
+            base_servings=rng.randint(1, 6),
+            instructions=' '.join(rng.choices(WORDS, k=30)),
+            user=user,
+        )
+        for user in people
+        for i in range(meals)
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(meal=meal, ingredient=ingredient, quantity=rng.randint(1, 500), unit=rng.choice(UNITS))
+        for meal in all_meals
+        for ingredient in rng.sample(pantries[meal.user_id], min(ingredients, pantry))
+    )
+
+    meals_by_user = {}
+    for meal in all_meals:
+        meals_by_user.setdefault(meal.user_id, []).append(meal)
+    slots = [slot for slot, _ in DailyPlan.SLOT_CHOICES]
+    all_groups, plans = [], []
+    for g in range(groups):
+        group = PlanningGroup.objects.create(name=f'{GROUP_PREFIX}{g}')
+        group_members = [people[(g * members + m) % len(people)] for m in range(members)]
+        # Las señales de la relación apuntan la entrada de cada miembro
+        group.members.add(*group_members)
+        all_groups.append(group)
+        choices = [meal for member in group_members for meal in meals_by_user.get(member.pk, [])]
+        for d in range(days):
+            for slot in slots:
+                eating_out = rng.random() < 0.1
+                plans.append(DailyPlan(
+                    group=group, date=start + timedelta(days=d), meal_slot=slot,
+                    meal=None if eating_out or not choices else rng.choice(choices),
+                    is_eating_out=eating_out or not choices, custom_name='Fuera' if eating_out or not choices else None,
+                    target_servings=len(group_members),
+                ))
+    plans = DailyPlan.objects.bulk_create(plans)
+
+    # bulk_create no lanza señales: buscador y registro de cambios a mano
+    schedule_reindex([meal.pk for meal in all_meals])
+    record('ingredients', all_ingredients, CREATE)
+    record('meals', all_meals, CREATE)
+    record('plans', plans, CREATE)
+
+    return {
+        'users': len(people), 'groups': len(all_groups), 'meals': len(all_meals),
+        'ingredients': len(all_ingredients), 'plans': len(plans),
+        'start': start.isoformat(), 'end': (start + timedelta(days=days - 1)).isoformat(),
+    }
+
+
+@transaction.atomic
+def flush():
+    """Borra los datos sintéticos (en cascada desde usuarios y grupos)."""
+    groups = PlanningGroup.objects.filter(name__startswith=GROUP_PREFIX)
+    # Los grupos se van enteros: no hace falta recalcular listas plan a plan
+    with bulk_operation():
+        deleted, _ = DailyPlan.objects.filter(group__in=groups).delete()
+    more, _ = groups.delete()
+    rest, _ = User.objects.filter(username__startswith=USER_PREFIX).delete()
+    return deleted + more + rest
+
+
+def summary():
+    """Tamaño de los datos sintéticos que hay ahora mismo."""
+    people = User.objects.filter(username__startswith=USER_PREFIX)
+    return {
+        'users': people.count(),
+        'groups': PlanningGroup.objects.filter(name__startswith=GROUP_PREFIX).count(),
+        'meals': Meal.objects.filter(user__in=people).count(),
+        'ingredients': Ingredient.objects.filter(user__in=people).count(),
+        'plans': DailyPlan.objects.filter(group__name__startswith=GROUP_PREFIX).count(),
+    }
@@ -0,0 +1,249 @@
+import io
+import json
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from benchmarks import dataset
+from planner.models import DailyPlan, ShoppingList
+from recipes.models import Meal
+from sync.log import latest_cursor
+
+
+class Rollback(Exception):
+    """Se lanza para deshacer lo que escribe una acción (o la prueba entera)."""
+
+
+def png_bytes(width=640, height=480):
+    image = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 120, 40)).save(image, 'PNG')
+    return image.getvalue()
+
+
+# Acciones que se miden: nombre -> (método, ruta, datos, escribe). La ruta y
+# los datos se sacan del contexto (ver Command.context). Las que escriben se
+# deshacen después de cada repetición, así todas ven los mismos datos.
+ACTIONS = {
+    'meals_list': ('get', lambda c: '/api/meals/', None, False),
+    'meal_detail': ('get', lambda c: f"/api/meals/{c['meal']}/", None, False),
+    'meal_scaled': ('get', lambda c: f"/api/meals/{c['meal']}/scaled/", lambda c: {'servings': 6}, False),
+    'meal_search': ('get', lambda c: '/api/meals/search/', lambda c: {'q': c['word']}, False),
+    'ingredient_search': ('get', lambda c: '/api/ingredients/search/', lambda c: {'q': c['word'][:3]}, False),
+    'calendar_week': ('get', lambda c: '/api/plans/', lambda c: c['week'], False),
+    'calendar_month_grid': ('get', lambda c: '/api/plans/calendar/', lambda c: c['month'], False),
+    'shopping_list_detail': ('get', lambda c: f"/api/shopping-lists/{c['list']}/", None, False),
+    'sync': ('get', lambda c: '/api/sync/', lambda c: {'cursor': c['cursor']}, False),
+    'shopping_list_generate': ('post', lambda c: '/api/shopping-lists/generate/', lambda c: c['week'], True),
+    'shopping_items_bulk': (
+        'post', lambda c: f"/api/shopping-lists/{c['list']}/items/bulk/",
+        lambda c: {'items': [{'id': item_id, 'is_purchased': True} for item_id in c['items']]}, True,
+    ),
+    'plans_bulk_week': ('post', lambda c: '/api/plans/bulk/', lambda c: c['bulk'], True),
+    'import_recipe': ('post', lambda c: f"/api/meals/{c['foreign_meal']}/import_recipe/", None, True),
+    'image_upload': ('post', lambda c: f"/api/meals/{c['meal']}/image/", lambda c: c['image'], True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide cada acción de la API dentro del proceso (cliente de pruebas de "
+        "DRF, sin red) sobre los datos de seed_bench: latencia p50/p95/p99 y "
+        "consultas. Todo se deshace al terminar; lo que va en on_commit "
+        "(reindexar, eventos) no llega a ejecutarse. Con --baseline compara "
+        "con una ejecución anterior y falla si algo ha empeorado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30, help="Repeticiones medidas por acción")
+        parser.add_argument('--warmup', type=int, default=3, help="Repeticiones previas sin medir")
+        parser.add_argument('--actions', default=','.join(ACTIONS), help="Acciones separadas por comas")
+        parser.add_argument('--user', default=f'{dataset.USER_PREFIX}0', help="Usuario con el que se llama")
+        parser.add_argument('--output', help="Guardar el resultado en este fichero JSON")
+        parser.add_argument('--baseline', help="JSON de una ejecución anterior con el que comparar")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Empeoramiento del p95 que se admite (0.25 = 25%%)")
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help="Diferencias de p95 menores que esto no cuentan (ruido)")
+        parser.add_argument('--json', action='store_true', help="Sacar el JSON por la salida en lugar de la tabla")
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['actions'].split(',') if name.strip()]
+        unknown = set(names) - set(ACTIONS)
+        if unknown:
+            raise CommandError(f"Acciones desconocidas: {', '.join(sorted(unknown))}")
+        if options['iterations'] < 2:
+            raise CommandError("Hacen falta al menos 2 repeticiones para los percentiles.")
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError("No hay datos de prueba: ejecuta antes manage.py seed_bench.")
+
+        media_root = tempfile.mkdtemp()
+        try:
+            # El cliente de pruebas llama como "testserver"; las imágenes, a un directorio temporal
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], MEDIA_ROOT=media_root):
+                report = self.run(user, names, options)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_table(report)
+        if options['baseline']:
+            self.compare(report, options)
+
+    def run(self, user, names, options):
+        client = APIClient()
+        client.force_authenticate(user)
+        results = {}
+        try:
+            # Lo que se prepara para las pruebas (una lista de la compra) también se deshace
+            with transaction.atomic():
+                context = self.context(client, user)
+                for name in names:
+                    results[name] = self.measure(client, context, *ACTIONS[name], options)
+                raise Rollback
+        except Rollback:
+            pass
+        return {
+            'database': connection.vendor,
+            'dataset': dataset.summary(),
+            'user': user.username,
+            'iterations': options['iterations'],
+            'actions': results,
+        }
+
+    def context(self, client, user):
+        group = user.planning_groups.order_by('id').first()
+        meal = Meal.objects.filter(user=user).order_by('id').first()
+        if group is None or meal is None:
+            raise CommandError(f"{user.username} no tiene grupo o recetas: vuelve a ejecutar seed_bench.")
+        first_day = DailyPlan.objects.filter(group=group).order_by('date').values_list('date', flat=True).first()
+        first_day = first_day or date.today()
+        monday = first_day + timedelta(days=(7 - first_day.weekday()) % 7)
+        week = {'group': group.pk, 'start_date': monday.isoformat(),
+                'end_date': (monday + timedelta(days=6)).isoformat()}
+        foreign_meal = Meal.objects.filter(
+            user__planning_groups=group, source_meal__isnull=True,
+        ).exclude(user=user).order_by('id').first()
+
+        response = client.post('/api/shopping-lists/generate/', week, format='json')
+        if response.status_code != 201:
+            raise CommandError(f"No se pudo preparar la lista de la compra: {response.status_code}")
+        shopping_list = ShoppingList.objects.get(pk=response.data['id'])
+
+        slots = [slot for slot, _ in DailyPlan.SLOT_CHOICES]
+        meal_ids = list(Meal.objects.filter(user=user).order_by('id').values_list('id', flat=True)[:7])
+        return {
+            'meal': meal.pk,
+            'foreign_meal': (foreign_meal or meal).pk,
+            'word': meal.name.split()[-2],
+            'week': week,
+            'month': {'group': group.pk, 'start_date': monday.isoformat(),
+                      'end_date': (monday + timedelta(days=34)).isoformat()},
+            'list': shopping_list.pk,
+            'items': list(shopping_list.items.values_list('id', flat=True)[:20]),
+            'bulk': {**week, 'plans': [
+                {'date': (monday + timedelta(days=d)).isoformat(), 'meal_slot': slot,
+                 'meal': meal_ids[(d + s) % len(meal_ids)]}
+                for d in range(7) for s, slot in enumerate(slots)
+            ]},
+            'image': png_bytes(),
+            'cursor': max(latest_cursor() - 200, 0),
+        }
+
+    def measure(self, client, context, method, path, data, writes, options):
+        url = path(context)
+        payload = data(context) if data else None
+        if isinstance(payload, bytes):
+            kwargs = {'data': payload, 'content_type': 'image/png'}
+        elif method == 'get':
+            kwargs = {'data': payload}
+        else:
+            kwargs = {'data': payload or {}, 'format': 'json'}
+
+        timings = []
+        queries = 0
+        status = None
+        counted = []
+
+        # Contamos con un execute_wrapper: no depende de DEBUG ni del límite del log
+        def count_query(execute, sql, params, many, ctx):
+            counted.append(sql)
+            return execute(sql, params, many, ctx)
+
+        for i in range(options['warmup'] + options['iterations']):
+            counted.clear()
+            try:
+                with transaction.atomic():
+                    with connection.execute_wrapper(count_query):
+                        started = time.perf_counter()
+                        response = getattr(client, method)(url, **kwargs)
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                        elapsed = (time.perf_counter() - started) * 1000
+                    if writes:
+                        raise Rollback
+            except Rollback:
+                pass
+            status = response.status_code
+            if i >= options['warmup']:
+                timings.append(elapsed)
+                queries = max(queries, len(counted))
+
+        cuts = statistics.quantiles(timings, n=100, method='inclusive')
+        return {
+            'status': status,
+            'queries': queries,
+            'p50_ms': round(cuts[49], 3),
+            'p95_ms': round(cuts[94], 3),
+            'p99_ms': round(cuts[98], 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+        }
+
+    def print_table(self, report):
+        self.stdout.write(
+            f"{report['database']} | {report['user']} | "
+            + ', '.join(f'{count} {name}' for name, count in report['dataset'].items())
+        )
+        for name, result in report['actions'].items():
+            line = (
+                f"{name:>24}: {result['status']} | {result['queries']:>3} consultas | "
+                f"p50 {result['p50_ms']:8.2f} ms | p95 {result['p95_ms']:8.2f} ms | p99 {result['p99_ms']:8.2f} ms"
+            )
+            self.stdout.write(line if result['status'] < 400 else self.style.ERROR(line))
+
+    def compare(self, report, options):
+        with open(options['baseline']) as baseline_file:
+            baseline = json.load(baseline_file)['actions']
+
+        regressions = []
+        for name, result in report['actions'].items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if result['queries'] > before['queries']:
+                regressions.append(f"{name}: {before['queries']} -> {result['queries']} consultas")
+            delta = result['p95_ms'] - before['p95_ms']
+            if delta > options['min_delta_ms'] and result['p95_ms'] > before['p95_ms'] * (1 + options['tolerance']):
+                regressions.append(f"{name}: p95 {before['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms")
+
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f"{len(regressions)} empeoramiento(s) respecto a {options['baseline']}")
+        self.stdout.write(self.style.SUCCESS(f"Sin empeoramientos respecto a {options['baseline']}"))
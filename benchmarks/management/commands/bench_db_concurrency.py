@@ -0,0 +1,140 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.models import F
+
+from meal_backend.database import sqlite_options
+from planner.models import ShoppingList, ShoppingListItem
+from users.models import PlanningGroup
+
+# Configuraciones que se comparan: (OPTIONS de la BD, conexión persistente)
+PROFILES = {
+    # Lo que había: SQLite tal cual y una conexión nueva por petición
+    'default': ({}, False),
+    # meal_backend/database.py: WAL, busy_timeout, BEGIN IMMEDIATE... y CONN_MAX_AGE
+    'tuned': (sqlite_options(), True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide escrituras concurrentes sobre SQLite (varios miembros marcando "
+        "ítems de la misma lista a la vez) con la configuración antigua y la "
+        "ajustada. Cada perfil usa una base de datos temporal."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help="Hilos que escriben")
+        parser.add_argument('--readers', type=int, default=4, help="Hilos que leen la lista a la vez")
+        parser.add_argument('--seconds', type=float, default=5, help="Duración de cada perfil")
+        parser.add_argument('--items', type=int, default=100, help="Ítems de la lista")
+        parser.add_argument('--profiles', default=','.join(PROFILES), help="Perfiles separados por comas")
+
+    def handle(self, *args, **options):
+        for name in options['profiles'].split(','):
+            options_for_db, persistent = PROFILES[name]
+            with tempfile.TemporaryDirectory() as tmp:
+                alias = f'bench_{name}'
+                self.add_database(alias, {
+                    'ENGINE': 'django.db.backends.sqlite3',
+                    'NAME': os.path.join(tmp, 'bench.sqlite3'),
+                    'OPTIONS': options_for_db,
+                })
+                try:
+                    list_id = self.seed(alias, options['items'])
+                    stats = self.run(alias, list_id, persistent, options)
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+            self.report(name, stats, options['seconds'])
+
+    def add_database(self, alias, config):
+        databases = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            alias: config,
+        })
+        connections.settings[alias] = databases[alias]
+
+    def seed(self, alias, items):
+        # Solo las tablas que usa la prueba
+        with connections[alias].schema_editor() as editor:
+            for model in (PlanningGroup, ShoppingList, ShoppingListItem):
+                editor.create_model(model)
+        group = PlanningGroup.objects.using(alias).create(name="bench-concurrency")
+        shopping_list = ShoppingList.objects.using(alias).create(
+            group=group, start_date='2026-01-01', end_date='2026-01-07',
+        )
+        ShoppingListItem.objects.using(alias).bulk_create(
+            ShoppingListItem(shopping_list=shopping_list, name=f"item-{i}", quantity=1, unit='u')
+            for i in range(items)
+        )
+        return shopping_list.pk
+
+    def run(self, alias, list_id, persistent, options):
+        deadline = time.perf_counter() + options['seconds']
+        stats = {'writes': [], 'write_errors': 0, 'reads': [], 'read_errors': 0}
+        lock = threading.Lock()
+
+        def write(worker):
+            # Como update_items: leer los ítems, tocar uno y subir la revisión
+            with transaction.atomic(using=alias):
+                items = list(ShoppingListItem.objects.using(alias).filter(
+                    shopping_list_id=list_id,
+                ).values_list('pk', 'is_purchased'))
+                pk, is_purchased = items[worker % len(items)]
+                ShoppingListItem.objects.using(alias).filter(pk=pk).update(is_purchased=not is_purchased)
+                ShoppingList.objects.using(alias).filter(pk=list_id).update(revision=F('revision') + 1)
+
+        def read(worker):
+            list(ShoppingListItem.objects.using(alias).filter(shopping_list_id=list_id))
+
+        def loop(operation, kind, worker):
+            timings, errors = [], 0
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        operation(worker)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    except OperationalError:
+                        # "database is locked"
+                        errors += 1
+                    if not persistent:
+                        connections[alias].close()
+            finally:
+                connections[alias].close()
+            with lock:
+                stats[kind] += timings
+                stats[f'{kind[:-1]}_errors'] += errors
+
+        threads = [
+            threading.Thread(target=loop, args=(write, 'writes', i)) for i in range(options['writers'])
+        ] + [
+            threading.Thread(target=loop, args=(read, 'reads', i)) for i in range(options['readers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats
+
+    def report(self, name, stats, seconds):
+        def percentiles(timings):
+            if len(timings) < 2:
+                return 0, 0
+            cuts = statistics.quantiles(timings, n=100)
+            return cuts[49], cuts[94]
+
+        write_p50, write_p95 = percentiles(stats['writes'])
+        read_p50, read_p95 = percentiles(stats['reads'])
+        self.stdout.write(
+            f"{name:>8}: {len(stats['writes']) / seconds:8.1f} escrituras/s "
+            f"({stats['write_errors']} bloqueadas) | p50 {write_p50:6.2f} ms | p95 {write_p95:7.2f} ms || "
+            f"{len(stats['reads']) / seconds:8.1f} lecturas/s ({stats['read_errors']} fallidas) | "
+            f"p50 {read_p50:6.2f} ms | p95 {read_p95:7.2f} ms"
+        )
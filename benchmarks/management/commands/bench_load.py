@@ -0,0 +1,396 @@
+import http.client
+import json
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from benchmarks import dataset
+from planner.models import DailyPlan, ShoppingList
+from users.models import PlanningGroup
+
+# Peso de cada escenario en cada mezcla
+MIXES = {
+    # Una familia con la semana abierta: miran el calendario, cambian
+    # raciones, marcan la compra y de vez en cuando generan otra lista
+    'family': {'calendar': 30, 'plans_week': 15, 'patch_plan': 20, 'tick_item': 20, 'read_list': 10, 'generate_list': 5},
+    'read_heavy': {'calendar': 50, 'plans_week': 30, 'read_list': 15, 'tick_item': 5},
+    'write_heavy': {'calendar': 10, 'patch_plan': 40, 'tick_item': 40, 'generate_list': 10},
+}
+
+
+def parse_mix(value):
+    """'family' o 'calendar=50,patch_plan=50'."""
+    if value in MIXES:
+        return MIXES[value]
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in SCENARIOS or not weight.strip().isdigit():
+            raise CommandError(f"Mezcla no válida: {part!r} (escenarios: {', '.join(SCENARIOS)})")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+# Escenarios: (vu, rng) -> (método, ruta, cuerpo). `vu.group` tiene lo que se
+# preparó para su grupo (semana, planes, lista de la compra).
+def calendar(vu, rng):
+    return 'GET', '/api/plans/calendar/?' + urlencode(vu.group['week']), None
+
+
+def plans_week(vu, rng):
+    return 'GET', '/api/plans/?' + urlencode(vu.group['week']), None
+
+
+def patch_plan(vu, rng):
+    return 'PATCH', f"/api/plans/{rng.choice(vu.group['plans'])}/", {'target_servings': rng.randint(1, 8)}
+
+
+def tick_item(vu, rng):
+    items = [{'id': item_id, 'is_purchased': rng.random() < 0.5} for item_id in rng.sample(vu.group['items'], 1)]
+    return 'POST', f"/api/shopping-lists/{vu.group['list']}/items/bulk/", {'items': items}
+
+
+def read_list(vu, rng):
+    return 'GET', f"/api/shopping-lists/{vu.group['list']}/", None
+
+
+def generate_list(vu, rng):
+    return 'POST', '/api/shopping-lists/generate/', vu.group['week']
+
+
+SCENARIOS = {
+    'calendar': calendar, 'plans_week': plans_week, 'patch_plan': patch_plan,
+    'tick_item': tick_item, 'read_list': read_list, 'generate_list': generate_list,
+}
+
+
+class VirtualUser(threading.Thread):
+    """Un cliente con su conexión keep-alive que lanza escenarios hasta que se acaba el tiempo."""
+
+    def __init__(self, number, host, port, token, group, mix, deadline, think_ms, seed):
+        super().__init__(daemon=True)
+        self.host, self.port = host, port
+        self.token = token
+        self.group = group
+        self.names, self.weights = list(mix), list(mix.values())
+        self.deadline = deadline
+        self.think_ms = think_ms
+        self.rng = random.Random(seed * 1000 + number)
+        self.samples = []  # (escenario, ms, estado o None si falló la conexión)
+        self.connection = None
+
+    def run(self):
+        while time.perf_counter() < self.deadline:
+            name = self.rng.choices(self.names, self.weights)[0]
+            method, path, body = SCENARIOS[name](self, self.rng)
+            started = time.perf_counter()
+            status = self.request(method, path, body)
+            self.samples.append((name, (time.perf_counter() - started) * 1000, status))
+            if self.think_ms:
+                time.sleep(self.rng.uniform(0, self.think_ms) / 1000)
+        if self.connection is not None:
+            self.connection.close()
+
+    def request(self, method, path, body):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        headers = {'Authorization': f'Bearer {self.token}'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.connection.request(method, path, payload, headers)
+            response = self.connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            return None
+
+
+class LockProbe(threading.Thread):
+    """
+    Cada `interval` segundos intenta coger el bloqueo de escritura de SQLite
+    sin esperar (BEGIN IMMEDIATE y ROLLBACK): la proporción de intentos que
+    lo encuentran cogido es cuánto tiempo hay alguien escribiendo.
+    """
+
+    def __init__(self, path, interval=0.02):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.samples = 0
+        self.busy = 0
+
+    def run(self):
+        connection = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        try:
+            while not self.stopped.wait(self.interval):
+                self.samples += 1
+                try:
+                    connection.execute('BEGIN IMMEDIATE')
+                    connection.execute('ROLLBACK')
+                except sqlite3.OperationalError:
+                    self.busy += 1
+        finally:
+            connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga: muchos usuarios virtuales a la vez contra la app "
+        "servida en local (uvicorn con meal_backend.asgi o meal_backend.wsgi, "
+        "o un servidor ya arrancado con --serve none --url). Usa los datos de "
+        "seed_bench: los usuarios virtuales son miembros de los grupos "
+        "bench-group-N y trabajan sobre la misma semana. Saca peticiones por "
+        "segundo, latencias, errores y cuánto está bloqueada SQLite. Escribe "
+        "de verdad: para volver a los datos iniciales, seed_bench --flush."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5, help="Usuarios virtuales concurrentes")
+        parser.add_argument('--groups', type=int, default=1, help="Grupos entre los que se reparten")
+        parser.add_argument('--duration', type=float, default=30, help="Segundos de prueba")
+        parser.add_argument('--mix', default='family',
+                            help=f"Mezcla de escenarios: {', '.join(MIXES)} o 'calendar=50,patch_plan=50'")
+        parser.add_argument('--think-ms', type=float, default=0, help="Pausa aleatoria máxima entre peticiones")
+        parser.add_argument('--serve', choices=['asgi', 'wsgi', 'none'], default='asgi',
+                            help="Arrancar uvicorn con la app ASGI o WSGI, o usar --url")
+        parser.add_argument('--workers', type=int, default=1, help="Procesos de uvicorn")
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Servidor ya arrancado (--serve none)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Guardar el resultado en este fichero JSON")
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        groups = list(PlanningGroup.objects.filter(
+            name__startswith=dataset.GROUP_PREFIX,
+        ).order_by('id').prefetch_related('members')[:options['groups']])
+        if not groups:
+            raise CommandError("No hay datos de prueba: ejecuta antes manage.py seed_bench.")
+
+        server, log_path = None, None
+        if options['serve'] == 'none':
+            url = urlsplit(options['url'])
+            host, port = url.hostname, url.port or 80
+        else:
+            host, port = '127.0.0.1', self.free_port()
+            server, log_path = self.start_server(options['serve'], port, options['workers'])
+        try:
+            report = self.run(host, port, groups, mix, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+        if log_path:
+            report['server_errors'] = self.server_errors(log_path)
+            os.unlink(log_path)
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+    # --- Servidor ---
+
+    def free_port(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def start_server(self, interface, port, workers):
+        # Los errores de Django (500) a un fichero para contar los "database is locked"
+        log_path = tempfile.mkstemp(suffix='.log')[1]
+        log_config = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        json.dump({
+            'version': 1,
+            'disable_existing_loggers': False,
+            'handlers': {'file': {'class': 'logging.FileHandler', 'filename': log_path}},
+            'loggers': {
+                'django.request': {'handlers': ['file'], 'level': 'ERROR', 'propagate': False},
+                'uvicorn.error': {'handlers': ['file'], 'level': 'WARNING'},
+            },
+        }, log_config)
+        log_config.close()
+
+        command = [
+            sys.executable, '-m', 'uvicorn', f'meal_backend.{interface}:application',
+            '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+            '--no-access-log', '--log-config', log_config.name,
+        ]
+        if interface == 'wsgi':
+            command += ['--interface', 'wsgi']
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("El servidor no ha arrancado:\n" + server.stderr.read().decode(errors='replace'))
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.2)
+        else:
+            server.terminate()
+            raise CommandError("El servidor no ha arrancado en 30 segundos")
+        os.unlink(log_config.name)
+        return server, log_path
+
+    def server_errors(self, log_path):
+        with open(log_path, errors='replace') as log:
+            text = log.read()
+        return {
+            'locked': text.count('database is locked'),
+            'internal': text.count('Internal Server Error'),
+        }
+
+    # --- Prueba ---
+
+    def prepare(self, host, port, groups):
+        """Tokens de cada miembro y, por grupo, su semana, planes y una lista de la compra."""
+        tokens = {}
+        prepared = []
+        for group in groups:
+            members = list(group.members.all())
+            for member in members:
+                if member.pk not in tokens:
+                    tokens[member.pk] = self.call(host, port, None, 'POST', '/api/token/', {
+                        'username': member.username, 'password': dataset.PASSWORD,
+                    })['access']
+
+            first_day = DailyPlan.objects.filter(group=group).order_by('date').values_list('date', flat=True).first()
+            if first_day is None:
+                raise CommandError(f"{group.name} no tiene planes: vuelve a ejecutar seed_bench.")
+            monday = first_day + timedelta(days=(7 - first_day.weekday()) % 7)
+            week = {'group': group.pk, 'start_date': monday.isoformat(),
+                    'end_date': (monday + timedelta(days=6)).isoformat()}
+            # Lista que se mantiene sola: cada cambio de plan la recalcula (lo que más
+            # compite). Las de pruebas anteriores se quitan para no recalcular varias.
+            ShoppingList.objects.filter(group=group, auto_update=True).delete()
+            shopping_list = self.call(host, port, tokens[members[0].pk], 'POST', '/api/shopping-lists/generate/',
+                                      {**week, 'auto_update': True})
+            plans = list(DailyPlan.objects.filter(
+                group=group, date__range=[week['start_date'], week['end_date']], is_eating_out=False,
+            ).values_list('id', flat=True))
+            prepared.append({
+                'members': [member.pk for member in members],
+                'context': {'week': week, 'plans': plans, 'list': shopping_list['id'],
+                            'items': [item['id'] for item in shopping_list['items']]},
+            })
+        return tokens, prepared
+
+    def call(self, host, port, token, method, path, body):
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        try:
+            connection.request(method, path, json.dumps(body), headers)
+            response = connection.getresponse()
+            content = response.read()
+        finally:
+            connection.close()
+        if response.status >= 400:
+            raise CommandError(f"{method} {path}: {response.status} {content[:200]!r}")
+        return json.loads(content)
+
+    def run(self, host, port, groups, mix, options):
+        tokens, prepared = self.prepare(host, port, groups)
+
+        probe = None
+        database = settings.DATABASES[DEFAULT_DB_ALIAS]
+        if database['ENGINE'] == 'django.db.backends.sqlite3':
+            probe = LockProbe(str(database['NAME']))
+
+        started = time.perf_counter()
+        deadline = started + options['duration']
+        users = []
+        for number in range(options['users']):
+            group = prepared[number % len(prepared)]
+            member = group['members'][(number // len(prepared)) % len(group['members'])]
+            users.append(VirtualUser(
+                number, host, port, tokens[member], group['context'], mix, deadline,
+                options['think_ms'], options['seed'],
+            ))
+        if probe:
+            probe.start()
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.perf_counter() - started
+        if probe:
+            probe.stopped.set()
+            probe.join()
+
+        samples = [sample for user in users for sample in user.samples]
+        report = {
+            'server': options['serve'], 'workers': options['workers'], 'database': database['ENGINE'].rsplit('.', 1)[-1],
+            'users': options['users'], 'groups': len(groups), 'mix': mix, 'seconds': round(elapsed, 2),
+            'total': self.summarize(samples, elapsed),
+            'scenarios': {
+                name: self.summarize([sample for sample in samples if sample[0] == name], elapsed)
+                for name in mix
+            },
+        }
+        if probe and probe.samples:
+            report['sqlite_write_lock_busy'] = round(probe.busy / probe.samples, 4)
+        return report
+
+    def summarize(self, samples, elapsed):
+        timings = [ms for name, ms, status in samples]
+        errors = sum(1 for name, ms, status in samples if status is None or status >= 400)
+        statuses = {}
+        for name, ms, status in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        summary = {
+            'requests': len(samples),
+            'rps': round(len(samples) / elapsed, 2),
+            'errors': errors,
+            'error_rate': round(errors / len(samples), 4) if samples else 0,
+            'statuses': statuses,
+        }
+        if len(timings) >= 2:
+            cuts = statistics.quantiles(timings, n=100, method='inclusive')
+            summary.update(p50_ms=round(cuts[49], 2), p95_ms=round(cuts[94], 2),
+                           p99_ms=round(cuts[98], 2), max_ms=round(max(timings), 2))
+        return summary
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['server']} x{report['workers']} | {report['database']} | {report['users']} usuarios en "
+            f"{report['groups']} grupo(s) | {report['seconds']} s"
+        )
+        for name, summary in [('TOTAL', report['total']), *report['scenarios'].items()]:
+            line = (
+                f"{name:>14}: {summary['requests']:>6} peticiones | {summary['rps']:8.1f}/s | "
+                f"errores {summary['error_rate']:7.2%}"
+            )
+            if 'p50_ms' in summary:
+                line += (
+                    f" | p50 {summary['p50_ms']:8.2f} ms | p95 {summary['p95_ms']:8.2f} ms"
+                    f" | p99 {summary['p99_ms']:8.2f} ms"
+                )
+            self.stdout.write(line if not summary['errors'] else self.style.WARNING(line))
+        if 'sqlite_write_lock_busy' in report:
+            self.stdout.write(f"Bloqueo de escritura de SQLite cogido el {report['sqlite_write_lock_busy']:.1%} del tiempo")
+        if 'server_errors' in report:
+            errors = report['server_errors']
+            self.stdout.write(f"Errores del servidor: {errors['internal']} (\"database is locked\": {errors['locked']})")
@@ -0,0 +1,136 @@
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from planner.models import DailyPlan
+from planner.shopping import aggregate_ingredients
+from recipes.models import Ingredient, Meal, RecipeIngredient
+from users.models import PlanningGroup
+
+
+class Rollback(Exception):
+    """Se lanza para deshacer los datos sintéticos al terminar."""
+
+
+def legacy_totals(group, start_date, end_date):
+    """
+    Implementación antigua (bucle en Python), solo para comparar.
+    """
+    plans = DailyPlan.objects.filter(
+        group=group,
+        date__range=[start_date, end_date],
+        is_eating_out=False
+    ).select_related('meal')
+
+    totals = {}
+    for plan in plans:
+        base = plan.meal.base_servings if plan.meal.base_servings > 0 else 1
+        ratio = plan.target_servings / base
+        for recipe_ing in plan.meal.ingredients.all():
+            key = (recipe_ing.ingredient.name, recipe_ing.unit)
+            totals[key] = totals.get(key, 0) + recipe_ing.quantity * ratio
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide consultas y latencia de la generación de la lista de la compra "
+        "(bucle antiguo vs agregación SQL) sobre datos sintéticos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help="Días del rango (por defecto 3 meses)")
+        parser.add_argument('--members', type=int, default=5)
+        parser.add_argument('--meals', type=int, default=40, help="Recetas por miembro")
+        parser.add_argument('--ingredients', type=int, default=8, help="Ingredientes por receta")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                group, start_date, end_date = self.seed(options)
+                plans = DailyPlan.objects.filter(group=group).count()
+                self.stdout.write(f"Planes en el rango: {plans}")
+
+                legacy = self.measure("bucle (antiguo)", legacy_totals, group, start_date, end_date, options['repeat'])
+                current = self.measure("agregación SQL", aggregate_ingredients, group, start_date, end_date, options['repeat'])
+
+                # Comprobación de que ambos caminos dan lo mismo
+                for key, qty in legacy.items():
+                    if abs(current.get(key, 0) - qty) > 1e-6:
+                        self.stderr.write(f"Diferencia en {key}: {qty} != {current.get(key)}")
+                raise Rollback
+        except Rollback:
+            pass
+
+    def measure(self, label, func, group, start_date, end_date, repeat):
+        timings = []
+        queries = []
+        result = None
+
+        # Contamos con un execute_wrapper: no depende de DEBUG ni del límite del log
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        for _ in range(repeat):
+            queries.clear()
+            with connection.execute_wrapper(count_query):
+                started = time.perf_counter()
+                result = func(group, start_date, end_date)
+                timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(
+            f"{label:>18}: {len(queries):>6} consultas | "
+            f"mediana {statistics.median(timings):8.2f} ms | mín {min(timings):8.2f} ms"
+        )
+        return result
+
+    def seed(self, options):
+        group = PlanningGroup.objects.create(name="bench-shopping-list")
+        users = [
+            User.objects.create(username=f"bench-sl-{i}-{time.monotonic_ns()}")
+            for i in range(options['members'])
+        ]
+        group.members.add(*users)
+
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"bench-ing-{i}", normalized_name=f"bench-ing-{i}") for i in range(200)
+        )
+
+        meals = []
+        for user in users:
+            meals += Meal.objects.bulk_create(
+                Meal(name=f"bench-meal-{i}", base_servings=2 + i % 3, user=user)
+                for i in range(options['meals'])
+            )
+
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                meal=meal,
+                ingredient=ingredients[(m * 7 + i) % len(ingredients)],
+                quantity=50 + i * 10,
+                unit='g' if i % 2 else 'ml',
+            )
+            for m, meal in enumerate(meals)
+            for i in range(options['ingredients'])
+        )
+
+        start_date = date.today()
+        end_date = start_date + timedelta(days=options['days'] - 1)
+        slots = [slot for slot, _ in DailyPlan.SLOT_CHOICES]
+        DailyPlan.objects.bulk_create(
+            DailyPlan(
+                group=group,
+                date=start_date + timedelta(days=d),
+                meal_slot=slot,
+                meal=meals[(d * len(slots) + s) % len(meals)],
+                target_servings=len(users),
+            )
+            for d in range(options['days'])
+            for s, slot in enumerate(slots)
+        )
+        return group, start_date, end_date
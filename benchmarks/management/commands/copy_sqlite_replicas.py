@@ -0,0 +1,33 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = (
+        "Copia la base de datos SQLite principal sobre las réplicas de "
+        "DB_REPLICAS, para probar en local las lecturas en réplicas (SQLite "
+        "no replica: entre una copia y otra, las réplicas se quedan atrás)."
+    )
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("Solo sirve con SQLite: con PostgreSQL las réplicas las mantiene la replicación.")
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No hay réplicas configuradas (DB_REPLICAS).")
+
+        source = sqlite3.connect(primary['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    # La API de copia de SQLite: consistente aunque haya alguien escribiendo
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"{alias}: {settings.DATABASES[alias]['NAME']}")
+        finally:
+            source.close()
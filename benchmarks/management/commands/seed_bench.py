@@ -0,0 +1,45 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea datos sintéticos para medir la API (usuarios bench-user-N con "
+        "contraseña 'bench-password', recetas, ingredientes, grupos y meses de "
+        "planes). Con --flush borra antes los que hubiera."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--groups', type=int, default=5)
+        parser.add_argument('--members', type=int, default=4, help="Miembros por grupo")
+        parser.add_argument('--meals', type=int, default=50, help="Recetas por usuario")
+        parser.add_argument('--ingredients', type=int, default=8, help="Ingredientes por receta")
+        parser.add_argument('--pantry', type=int, default=60, help="Ingredientes privados por usuario")
+        parser.add_argument('--months', type=int, default=3, help="Meses de planes por grupo")
+        parser.add_argument('--start', type=date.fromisoformat, default=None,
+                            help="Primer día de los planes (por defecto, el 1 de este mes)")
+        parser.add_argument('--seed', type=int, default=0, help="Semilla: mismos argumentos, mismos datos")
+        parser.add_argument('--flush', action='store_true', help="Borrar antes los datos sintéticos")
+
+    def handle(self, *args, **options):
+        if options['flush']:
+            self.stdout.write(f"Borrados {dataset.flush()} objetos")
+        elif dataset.summary()['users']:
+            raise CommandError("Ya hay datos sintéticos: usa --flush para rehacerlos.")
+        if options['users'] < 1 or options['members'] < 1:
+            raise CommandError("Hace falta al menos un usuario y un miembro por grupo.")
+
+        created = dataset.seed(
+            users=options['users'], groups=options['groups'], members=options['members'],
+            meals=options['meals'], ingredients=options['ingredients'], pantry=options['pantry'],
+            months=options['months'], start=options['start'], seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{created['users']} usuarios, {created['groups']} grupos, {created['meals']} recetas, "
+            f"{created['ingredients']} ingredientes y {created['plans']} planes "
+            f"({created['start']} a {created['end']})"
+        ))
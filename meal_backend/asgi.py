@@ -3,6 +3,13 @@ ASGI config for meal_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Es la que hay que usar para el tiempo real (GET /api/groups/<id>/events/, ver
+planner/realtime.py), por ejemplo:
+
+    uvicorn meal_backend.asgi:application --workers 4
+
+Con más de un worker, REALTIME_BROKER=planner.realtime.DatabaseBroker.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
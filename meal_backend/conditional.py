@@ -0,0 +1,95 @@
+"""
+Peticiones condicionales (ETag / Last-Modified) para los ViewSets de la API.
+
+Antes de serializar nada se calcula una "huella" barata con UNA consulta
+agregada sobre las columnas `updated_at`:
+
+- Listado: COUNT(*) y MAX(updated_at) del queryset filtrado. Si se borra,
+  crea o modifica algo, cambia alguno de los dos.
+- Detalle: los updated_at de la fila (y de lo que lleve dentro).
+
+Si el cliente manda If-None-Match (o If-Modified-Since en el detalle) y la
+huella no ha cambiado, se responde 304 sin serializar.
+
+Cada vista indica en `conditional_timestamps` qué columnas forman la huella,
+incluidas las de objetos relacionados que salgan en la respuesta
+(ej: 'meal__updated_at' en los planes, que llevan la receta dentro). Lo que
+sale en la respuesta pero no está en esas filas (ej: si el usuario ya tiene
+una copia de la receta) va en `conditional_state`, como subconsultas que se
+calculan en la misma consulta que la huella.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+class ConditionalResponseMixin:
+    conditional_timestamps = ('updated_at',)
+
+    def conditional_key(self, request):
+        # La misma huella puede dar respuestas distintas según quién pregunte,
+        # la URL (cursor, filtros) y el formato (JSON / API navegable)
+        return (
+            request.build_absolute_uri(),
+            request.user.pk,
+            getattr(request.accepted_renderer, 'format', None),
+        )
+
+    def conditional_state(self, request):
+        """{nombre: subconsulta escalar} que también forma parte de la huella."""
+        return {}
+
+    def finalize_conditional(self, response, etag, last_modified=None):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = last_modified
+            # Se puede guardar, pero siempre hay que revalidar
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        fingerprint = queryset.aggregate(
+            count=Count('pk'),
+            **{f'max_{i}': Max(path) for i, path in enumerate(self.conditional_timestamps)},
+            **{f'state_{name}': Max(expression) for name, expression in self.conditional_state(request).items()},
+        )
+        etag = make_etag('list', self.conditional_key(request), sorted(fingerprint.items()))
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        # Sin Last-Modified: un borrado no lo haría avanzar
+        return self.finalize_conditional(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        state = {f'state_{name}': expression for name, expression in self.conditional_state(request).items()}
+        row = self.filter_queryset(self.get_queryset()).order_by().filter(
+            **{self.lookup_field: kwargs[lookup_url_kwarg]}
+        ).annotate(**state).values_list(*self.conditional_timestamps, *state).first()
+        if row is None:
+            # No existe o no es mío: que responda la vista normal (404)
+            return super().retrieve(request, *args, **kwargs)
+
+        etag = make_etag('detail', self.conditional_key(request), row)
+        timestamps = [timestamp for timestamp in row[:len(self.conditional_timestamps)] if timestamp is not None]
+        last_modified = int(max(timestamps).timestamp()) if timestamps else None
+        if state:
+            # Las fechas no recogen ese estado: solo vale el ETag
+            last_modified = None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        return self.finalize_conditional(
+            response, etag, http_date(last_modified) if last_modified is not None else None,
+        )
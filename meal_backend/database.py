@@ -0,0 +1,117 @@
+"""
+Configuración de la base de datos a partir de variables de entorno.
+
+DB_ENGINE=sqlite (por defecto):
+    DB_NAME          ruta del fichero (por defecto BASE_DIR/db.sqlite3)
+    SQLITE_TUNING    "False" para dejar SQLite como viene (ver SQLITE_PRAGMAS)
+
+DB_ENGINE=postgresql (necesita `pip install "psycopg[binary,pool]"`):
+    DB_NAME, DB_USER, DB_PASSWORD, DB_HOST (localhost), DB_PORT (5432)
+    DB_POOL          "True" para usar el pool de conexiones de psycopg
+    DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE / DB_POOL_TIMEOUT
+
+Para los dos:
+    DB_CONN_MAX_AGE  segundos que se reutiliza una conexión (60). Con pool no
+                     se usa: es el pool el que las mantiene abiertas.
+    DB_REPLICAS      réplicas de solo lectura separadas por comas (ver
+                     meal_backend/routers.py): rutas de fichero con SQLite,
+                     host[:puerto] con PostgreSQL (mismo nombre y usuario).
+"""
+import os
+
+# Se ejecutan al abrir cada conexión:
+# - WAL: los que leen no bloquean al que escribe (ni al revés).
+# - synchronous=NORMAL: con WAL no se pierde consistencia, solo la última
+#   transacción si se va la luz, y ahorra un fsync por commit.
+# - busy_timeout: si la BD está bloqueada, esperar en lugar de fallar.
+# - mmap_size: lecturas desde memoria mapeada en lugar de read().
+# - cache_size negativo = KiB; temp_store en memoria para ordenaciones.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -16000,
+    'temp_store': 'MEMORY',
+}
+
+
+def env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value == 'True'
+
+
+def sqlite_options(pragmas=SQLITE_PRAGMAS):
+    return {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in pragmas.items()),
+        # BEGIN IMMEDIATE: la transacción coge el bloqueo de escritura al
+        # empezar. Con el BEGIN normal, dos transacciones que leen y luego
+        # escriben se bloquean entre sí y una falla con "database is locked"
+        # sin esperar el busy_timeout.
+        'transaction_mode': 'IMMEDIATE',
+        # Segundos que espera el driver de Python por el bloqueo
+        'timeout': pragmas['busy_timeout'] / 1000,
+    }
+
+
+def database_config(base_dir):
+    engine = os.environ.get('DB_ENGINE', 'sqlite')
+    conn_max_age = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+    if engine == 'postgresql':
+        config = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'meal_planner'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': conn_max_age,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+        if env_flag('DB_POOL'):
+            config['OPTIONS']['pool'] = {
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            }
+            # Django no deja combinar el pool con conexiones persistentes
+            config['CONN_MAX_AGE'] = 0
+        return config
+
+    if engine != 'sqlite':
+        raise ValueError(f"DB_ENGINE no soportado: {engine} (sqlite o postgresql)")
+
+    config = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DB_NAME') or base_dir / 'db.sqlite3',
+        'CONN_MAX_AGE': conn_max_age,
+        'CONN_HEALTH_CHECKS': True,
+    }
+    if env_flag('SQLITE_TUNING', default=True):
+        config['OPTIONS'] = sqlite_options()
+    return config
+
+
+def replica_configs(primary):
+    """
+    {alias: config} de las réplicas de DB_REPLICAS, con las mismas opciones
+    que el primario. En los tests apuntan a la BD del primario.
+    """
+    replicas = {}
+    entries = [entry.strip() for entry in os.environ.get('DB_REPLICAS', '').split(',') if entry.strip()]
+    for number, entry in enumerate(entries, start=1):
+        config = {**primary, 'TEST': {'MIRROR': 'default'}}
+        if 'OPTIONS' in primary:
+            config['OPTIONS'] = {**primary['OPTIONS']}
+        if primary['ENGINE'] == 'django.db.backends.sqlite3':
+            config['NAME'] = entry
+        else:
+            host, _, port = entry.partition(':')
+            config['HOST'] = host
+            config['PORT'] = port or primary['PORT']
+        replicas[f'replica_{number}'] = config
+    return replicas
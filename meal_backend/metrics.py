@@ -0,0 +1,258 @@
+"""
+Métricas de rendimiento por petición.
+
+metrics_middleware mide cada petición y apunta en una ContextVar (vale igual
+con hilos que con ASGI) cuánto tiempo se va en cada fase:
+- db: consultas y su tiempo, con un execute_wrapper en cada conexión.
+- serializer: is_valid() y .data de los serializers de DRF (incluye las
+  consultas que lancen, las fases se solapan). Solo con METRICS_SERIALIZERS:
+  para medirlo hay que envolver los métodos de BaseSerializer en todo el
+  proceso (ver `instrument_serializers`).
+- image: lo que se hace con Pillow dentro de la petición (ver `timed`).
+- total: la petición entera, middlewares incluidos.
+
+Con SERVER_TIMING (por defecto, solo con DEBUG) se devuelven en la cabecera
+Server-Timing (las herramientas de desarrollo del navegador la enseñan), y
+siempre se acumulan en histogramas por vista y acción que se leen en
+/metrics en el formato de texto de Prometheus. /metrics pide
+"Authorization: Bearer <METRICS_TOKEN>" (si no viene, 401); sin token
+configurado responde 403 (salvo con DEBUG).
+
+Los histogramas están en memoria: con varios procesos (gunicorn/uvicorn
+--workers) cada uno tiene los suyos y Prometheus ve el del proceso que
+atiende cada scrape. En las respuestas en streaming (exportar, SSE) se mide
+hasta que empieza la respuesta, no hasta que termina.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+_current = ContextVar('request_timings', default=None)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.phases = {}  # Fase -> segundos
+        self.running = set()  # Fases abiertas (para no contar dos veces lo anidado)
+        self.queries = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.phases['db'] = self.phases.get('db', 0) + time.perf_counter() - started
+            self.queries += 1
+
+
+@contextmanager
+def timed(phase):
+    """
+    Suma a `phase` lo que tarda el bloque en la petición en curso. Fuera de
+    una petición (worker, comandos) no hace nada. También vale de decorador.
+    """
+    timings = _current.get()
+    if timings is None or phase in timings.running:
+        yield
+        return
+    timings.running.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[phase] = timings.phases.get(phase, 0) + time.perf_counter() - started
+        timings.running.discard(phase)
+
+
+def instrument_serializers():
+    """
+    Mide is_valid() y .data de todos los serializers de DRF (una sola vez).
+    Cambia BaseSerializer para todo el proceso, tests y comandos incluidos:
+    el middleware solo lo llama con METRICS_SERIALIZERS.
+    """
+    if getattr(BaseSerializer, '_timed', False):
+        return
+    # Serializer.data y ListSerializer.data acaban en BaseSerializer.data
+    BaseSerializer.data = property(timed('serializer')(BaseSerializer.data.fget))
+    for serializer_class in (BaseSerializer, ListSerializer):
+        serializer_class.is_valid = timed('serializer')(serializer_class.is_valid)
+    BaseSerializer._timed = True
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels)
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets):
+        self.name, self.help_text, self.labels, self.buckets = name, help_text, labels, buckets
+        self.series = {}  # Valores de las etiquetas -> [cuenta por cubo, suma, total]
+
+    def observe(self, values, amount):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = [[0] * len(self.buckets), 0, 0]
+        index = bisect_left(self.buckets, amount)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += amount
+        series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for values, (counts, total, count) in sorted(self.series.items()):
+            labels = format_labels(zip(self.labels, values))
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self.series = {}
+
+    def inc(self, values):
+        self.series[values] = self.series.get(values, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for values, count in sorted(self.series.items()):
+            lines.append(f'{self.name}{{{format_labels(zip(self.labels, values))}}} {count}')
+        return lines
+
+
+class Registry:
+    """Las métricas del proceso. Un solo candado por petición al apuntarla."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        view = ('view', 'action')
+        self.requests = Counter('meal_http_requests_total', 'Peticiones atendidas.', (*view, 'method', 'status'))
+        self.duration = Histogram('meal_http_request_duration_seconds', 'Tiempo total de la petición.',
+                                  view, SECONDS_BUCKETS)
+        self.db_time = Histogram('meal_http_request_db_seconds', 'Tiempo en consultas a la base de datos.',
+                                 view, SECONDS_BUCKETS)
+        self.db_queries = Histogram('meal_http_request_db_queries', 'Consultas por petición.', view, QUERY_BUCKETS)
+        self.phases = {
+            'serializer': Histogram('meal_http_request_serializer_seconds',
+                                    'Tiempo en serializers (validar y representar).', view, SECONDS_BUCKETS),
+            'image': Histogram('meal_http_request_image_seconds',
+                               'Tiempo procesando imágenes (solo peticiones que lo hacen).', view, SECONDS_BUCKETS),
+        }
+
+    def observe(self, view, method, status, total, timings):
+        with self.lock:
+            self.requests.inc((*view, method, str(status)))
+            self.duration.observe(view, total)
+            self.db_time.observe(view, timings.phases.get('db', 0))
+            self.db_queries.observe(view, timings.queries)
+            if settings.METRICS_SERIALIZERS:
+                self.phases['serializer'].observe(view, timings.phases.get('serializer', 0))
+            if 'image' in timings.phases:
+                self.phases['image'].observe(view, timings.phases['image'])
+
+    def render(self):
+        with self.lock:
+            metrics = [self.requests, self.duration, self.db_time, self.db_queries, *self.phases.values()]
+            return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+registry = Registry()
+
+
+def view_labels(request):
+    """(vista, acción): el ViewSet y su acción de DRF, o el nombre de la URL."""
+    method = request.method.lower()
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return ('unmatched', method)
+    view_class = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None) or {}
+    return (view_class.__name__ if view_class else match.view_name, actions.get(method, method))
+
+
+def server_timing(timings, total):
+    entries = []
+    if 'db' in timings.phases:
+        entries.append(f'db;desc="{timings.queries} consultas";dur={timings.phases["db"] * 1000:.1f}')
+    for phase in ('serializer', 'image'):
+        if phase in timings.phases:
+            entries.append(f'{phase};dur={timings.phases[phase] * 1000:.1f}')
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Mide la petición y la apunta en los histogramas (y en Server-Timing)."""
+    if settings.METRICS_SERIALIZERS:
+        instrument_serializers()
+
+    def start():
+        timings = RequestTimings()
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(timings.record_query))
+        return timings, stack, _current.set(timings), time.perf_counter()
+
+    def finish(request, response, timings, total):
+        registry.observe(view_labels(request), request.method, response.status_code, total, timings)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = server_timing(timings, total)
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            timings, stack, token, started = start()
+            try:
+                with stack:
+                    response = await get_response(request)
+            finally:
+                _current.reset(token)
+            return finish(request, response, timings, time.perf_counter() - started)
+    else:
+        def middleware(request):
+            timings, stack, token, started = start()
+            try:
+                with stack:
+                    response = get_response(request)
+            finally:
+                _current.reset(token)
+            return finish(request, response, timings, time.perf_counter() - started)
+    return middleware
+
+
+def metrics_view(request):
+    """Las métricas del proceso en el formato de texto de Prometheus."""
+    token = settings.METRICS_TOKEN
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+            response = JsonResponse({"detail": "Falta el token de métricas o no es válido."}, status=401)
+            response['WWW-Authenticate'] = 'Bearer'
+            return response
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,140 @@
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) para todos los listados de la API.
+
+    - Las páginas profundas cuestan lo mismo que la primera: se filtra por
+      la última posición vista (WHERE id > X) en vez de usar OFFSET.
+    - El cuerpo sigue siendo una lista JSON (el frontend no cambia); los
+      enlaces a la página siguiente/anterior van en la cabecera `Link`.
+    - Cada vista puede indicar su orden estable con `cursor_ordering`.
+
+    A diferencia de CursorPagination de DRF (que solo usa el primer campo y
+    desempata con OFFSET), la posición es la tupla ENTERA del orden, ej:
+    (date, meal_slot, id) en el calendario. El último campo tiene que ser
+    único (si no es el id, se añade), así que nunca hay empates: ni OFFSET
+    ni filas repetidas o saltadas aunque un plan cambie de fecha.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        ordering = tuple(ordering)
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering += ('id',)
+        return ordering
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            name = field.lstrip('-')
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            values.append(None if value is None else str(value))
+        return json.dumps(values, separators=(',', ':'))
+
+    def after_position(self, position, reverse):
+        """
+        Filtro "después de `position`" en el orden de la página (o antes si
+        el cursor va hacia atrás):
+            date > d OR (date = d AND meal_slot > s) OR (date = d AND meal_slot = s AND id > i)
+        más un `date >= d` redundante para que la BD recorra el índice por rango.
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        fields = [(field.lstrip('-'), field.startswith('-') != reverse) for field in self.ordering]
+        condition = Q()
+        for i, (name, descending) in enumerate(fields):
+            equal = {previous: values[j] for j, (previous, _) in enumerate(fields[:i])}
+            condition |= Q(**equal, **{f"{name}__{'lt' if descending else 'gt'}": values[i]})
+        name, descending = fields[0]
+        return Q(**{f"{name}__{'lte' if descending else 'gte'}": values[0]}) & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Igual que CursorPagination.paginate_queryset salvo el filtro por la
+        # posición (ver `after_position`)
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(self.after_position(current_position, reverse))
+
+        # Uno de más para saber si hay página siguiente
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        response = Response(data)
+        links = []
+        next_link = self.get_next_link()
+        previous_link = self.get_previous_link()
+        if next_link:
+            links.append(f'<{next_link}>; rel="next"')
+        if previous_link:
+            links.append(f'<{previous_link}>; rel="prev"')
+        if links:
+            response['Link'] = ', '.join(links)
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        return schema
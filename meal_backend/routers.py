@@ -0,0 +1,128 @@
+"""
+Lecturas en réplicas.
+
+Las vistas que lo piden (ReplicaReadMixin) leen de una réplica en los GET,
+salvo que el usuario haya escrito hace poco: durante REPLICA_PIN_SECONDS
+después de escribir, todo lo suyo va al primario para que vea sus propios
+cambios aunque la réplica vaya con retraso. El resto de vistas, y todas las
+escrituras, van siempre al primario.
+
+Lo que toca cada petición se guarda en una ContextVar (vale igual con hilos
+que con ASGI) que abre replica_pin_middleware:
+- Una petición lee siempre de la MISMA réplica.
+- En cuanto la petición escribe algo (o abre una transacción), deja de usar
+  la réplica; al terminar, el usuario queda "anclado" al primario.
+
+El anclaje se guarda en la caché REPLICA_PIN_CACHE. Con varios procesos
+tiene que ser una caché compartida (Redis, base de datos...), si no cada
+proceso solo sabe de las escrituras que ha atendido él.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.permissions import SAFE_METHODS
+
+_state = ContextVar('replica_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self):
+        self.replica = None  # Alias de la réplica, si esta petición puede usarla
+        self.wrote = False
+
+
+def pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def is_pinned(user):
+    return bool(caches[settings.REPLICA_PIN_CACHE].get(pin_key(user.pk)))
+
+
+def pin(user):
+    caches[settings.REPLICA_PIN_CACHE].set(pin_key(user.pk), True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def use_replica():
+    """La petición en curso puede leer de una réplica (si hay alguna)."""
+    state = _state.get()
+    if state is not None and settings.DATABASE_REPLICAS and not state.wrote:
+        state.replica = random.choice(settings.DATABASE_REPLICAS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.replica is None or state.wrote:
+            return DEFAULT_DB_ALIAS
+        # Dentro de una transacción del primario se lee de lo que se está escribiendo
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            state.wrote = True
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primario y réplicas tienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Las réplicas las rellena la replicación. En local se pueden copiar
+        # (manage.py copy_sqlite_replicas) o migrar con --database.
+        return True
+
+
+@sync_and_async_middleware
+def replica_pin_middleware(get_response):
+    """Abre el estado de enrutado de la petición y ancla al usuario si ha escrito."""
+
+    def should_pin(request, state):
+        # DRF deja en la petición de Django el usuario que autenticó (JWT)
+        user = getattr(request, 'user', None)
+        return state.wrote and user is not None and user.is_authenticated
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            state = RoutingState()
+            token = _state.set(state)
+            try:
+                response = await get_response(request)
+            finally:
+                _state.reset(token)
+            if should_pin(request, state):
+                await sync_to_async(pin)(request.user)
+            return response
+    else:
+        def middleware(request):
+            state = RoutingState()
+            token = _state.set(state)
+            try:
+                response = get_response(request)
+            finally:
+                _state.reset(token)
+            if should_pin(request, state):
+                pin(request.user)
+            return response
+    return middleware
+
+
+class ReplicaReadMixin:
+    """
+    Para ViewSets de DRF: sus GET/HEAD/OPTIONS leen de una réplica, salvo que
+    el usuario esté anclado al primario.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and settings.DATABASE_REPLICAS and not is_pinned(request.user):
+            use_replica()
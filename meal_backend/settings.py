@@ -14,6 +14,7 @@ from pathlib import Path
 import os
 # import dj_database_url
 from dotenv import load_dotenv
+from .database import database_config, replica_configs
 load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -53,11 +54,15 @@ INSTALLED_APPS = [
     'planner',
     'users',
     'recipes',
+    'sync',
+    'benchmarks',
     
     'django_cleanup.apps.CleanupConfig', # Should be placed last
 ]
 
 MIDDLEWARE = [
+    # El primero, para que el tiempo total incluya el resto de middlewares
+    'meal_backend.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -67,6 +72,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'meal_backend.routers.replica_pin_middleware',
 ]
 
 ROOT_URLCONF = 'meal_backend.urls'
@@ -92,13 +98,34 @@ WSGI_APPLICATION = 'meal_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# SQLite (con WAL y demás ajustes) o PostgreSQL con pool, según el entorno:
+# ver meal_backend/database.py
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
 
+# Réplicas de lectura (DB_REPLICAS). Solo las usan las vistas con
+# ReplicaReadMixin, en los GET (ver meal_backend/routers.py)
+DATABASES.update(replica_configs(DATABASES['default']))
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['meal_backend.routers.ReplicaRouter']
+# Segundos que un usuario lee del primario después de escribir, para que vea
+# sus cambios aunque la réplica vaya con retraso
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+# Alias de CACHES donde se apunta quién ha escrito. Con varios procesos tiene
+# que ser una caché compartida entre ellos (la de por defecto es local)
+REPLICA_PIN_CACHE = os.environ.get('REPLICA_PIN_CACHE', 'default')
+
+# Métricas de rendimiento (meal_backend.metrics). La cabecera Server-Timing
+# enseña consultas y tiempos a cualquiera: por defecto, solo en desarrollo.
+# /metrics pide "Authorization: Bearer <METRICS_TOKEN>"; sin token solo se
+# puede leer con DEBUG
+SERVER_TIMING = os.environ.get('SERVER_TIMING', str(DEBUG)) == 'True'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Medir también el tiempo en serializers. Envuelve los métodos de
+# BaseSerializer de DRF en todo el proceso: mejor solo mientras se investiga
+METRICS_SERIALIZERS = os.environ.get('METRICS_SERIALIZERS', 'False') == 'True'
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -141,6 +168,67 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# MediaProxyView (recipes/media.py)
+# Segundos de caché para ficheros sin hash en la ruta (los que lo llevan son inmutables)
+MEDIA_PROXY_MAX_AGE = int(os.environ.get('MEDIA_PROXY_MAX_AGE', 3600))
+# Delegar el envío al servidor web: 'x-sendfile' (Apache/lighttpd) o 'x-accel-redirect' (nginx)
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE') or None
+# Para nginx: location "internal" que apunta a MEDIA_ROOT
+MEDIA_SENDFILE_PREFIX = os.environ.get('MEDIA_SENDFILE_PREFIX', '/protected-media/')
+
+# Las imágenes de recetas se procesan en segundo plano (manage.py process_images).
+# En desarrollo, sin worker, se puede procesar al guardar con IMAGE_PROCESSING_EAGER=True.
+IMAGE_PROCESSING_EAGER = os.environ.get('IMAGE_PROCESSING_EAGER') == 'True'
+
+# Límites de las imágenes subidas (se comprueban antes de decodificarlas)
+MEAL_IMAGE_MAX_BYTES = int(os.environ.get('MEAL_IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+MEAL_IMAGE_MAX_DIMENSION = int(os.environ.get('MEAL_IMAGE_MAX_DIMENSION', 8000))
+MEAL_IMAGE_MAX_PIXELS = int(os.environ.get('MEAL_IMAGE_MAX_PIXELS', 40_000_000))
+
+
+# Caché de ingredientes por ración de cada receta (recipes/cache.py).
+# Si se indica un alias de CACHES, se comparte entre procesos además de la LRU local.
+MEAL_VECTOR_CACHE_SIZE = int(os.environ.get('MEAL_VECTOR_CACHE_SIZE', 2048))
+MEAL_VECTOR_CACHE_ALIAS = os.environ.get('MEAL_VECTOR_CACHE_ALIAS') or None
+
+# Cada cuántos segundos se reconstruye el catálogo en memoria de ingredientes
+# globales para el buscador (en el propio proceso se refresca al momento).
+INGREDIENT_CATALOG_TTL = int(os.environ.get('INGREDIENT_CATALOG_TTL', 300))
+
+# Tamaño máximo de un fichero de recetas subido a /api/meals/import/
+# (para ficheros más grandes: manage.py import_recipes)
+RECIPE_IMPORT_MAX_BYTES = int(os.environ.get('RECIPE_IMPORT_MAX_BYTES', 20 * 1024 * 1024))
+
+# Configuración de texto de PostgreSQL para el buscador de recetas (stemming).
+# Con SQLite (FTS5) no se usa.
+RECIPE_SEARCH_CONFIG = os.environ.get('RECIPE_SEARCH_CONFIG', 'spanish')
+
+# Tiempo real por grupo (SSE, ver planner/realtime.py). Necesita servir la app
+# con ASGI (meal_backend/asgi.py). Con un solo proceso vale el broker en
+# memoria; con varios workers: 'planner.realtime.DatabaseBroker'.
+REALTIME_BROKER = os.environ.get('REALTIME_BROKER', 'planner.realtime.MemoryBroker')
+# Segundos sin eventos antes de mandar un comentario para mantener la conexión
+REALTIME_KEEPALIVE = int(os.environ.get('REALTIME_KEEPALIVE', 25))
+# Milisegundos que espera el navegador para reconectar
+REALTIME_RETRY_MS = int(os.environ.get('REALTIME_RETRY_MS', 3000))
+# Eventos pendientes por conexión antes de pedirle que recargue todo
+REALTIME_QUEUE_SIZE = int(os.environ.get('REALTIME_QUEUE_SIZE', 100))
+# Eventos por grupo que se pueden recuperar al reconectar (Last-Event-ID)
+REALTIME_HISTORY = int(os.environ.get('REALTIME_HISTORY', 200))
+# DatabaseBroker: cada cuánto se leen los eventos nuevos y cuánto se guardan (segundos)
+REALTIME_POLL_INTERVAL = float(os.environ.get('REALTIME_POLL_INTERVAL', 1))
+REALTIME_RETENTION = int(os.environ.get('REALTIME_RETENTION', 3600))
+
+# Sincronización por diferencias (GET /api/sync/, ver sync/views.py)
+# Entradas del registro de cambios por respuesta
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+# Segundos que se vuelven a mirar por detrás del cursor, por si una
+# transacción con un id menor se confirmó después (PostgreSQL)
+SYNC_SAFETY_WINDOW = int(os.environ.get('SYNC_SAFETY_WINDOW', 5))
+# Días que se guarda el registro (manage.py prune_change_log). Un cliente con
+# un cursor más viejo recibe "reset" y tiene que cargarlo todo.
+SYNC_LOG_RETENTION_DAYS = int(os.environ.get('SYNC_LOG_RETENTION_DAYS', 30))
+
 
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
@@ -149,6 +237,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://192.168.0.49:5173",
     "https://meal-planner-pi-nine.vercel.app",
 ]
+# Para que el frontend pueda leer el cursor de la página siguiente, el ETag
+# y los tiempos del servidor
+CORS_EXPOSE_HEADERS = ['Link', 'ETag', 'Server-Timing']
 
 # backend/settings.py
 
@@ -161,6 +252,9 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated', 
     ),
+    # Todos los listados van paginados por cursor (ver meal_backend/pagination.py).
+    # La página siguiente se indica en la cabecera "Link".
+    'DEFAULT_PAGINATION_CLASS': 'meal_backend.pagination.KeysetPagination',
 }
 
 # Configuración básica de JWT
@@ -0,0 +1,53 @@
+"""
+Ayudas para los tests de rendimiento de la API.
+
+QueryBudgetMixin.assertQueryBudget(n) comprueba que lo que se ejecuta dentro
+del `with` no pasa de `n` consultas y, con SQLite, que ninguna lectura
+recorre una tabla entera (EXPLAIN QUERY PLAN). Así un N+1 o un filtro sin
+índice rompe un test en lugar de notarse en producción.
+
+Los datos de los tests deben tener varias filas de cada cosa: con una sola,
+un N+1 cuesta lo mismo que una consulta con prefetch.
+"""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+def full_scans(connection, sql):
+    """Tablas que recorre entera la consulta (SQLite): ["recipes_meal", ...]."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        details = [row[-1] for row in cursor.fetchall()]
+    # "SCAN tabla" a secas. Con "USING INDEX" recorre un índice para ordenar,
+    # y las tablas virtuales (FTS5) tienen su propio índice.
+    return [
+        detail.split()[1] for detail in details
+        if detail.startswith('SCAN ') and 'USING' not in detail and 'VIRTUAL TABLE' not in detail
+        and 'CONSTANT ROW' not in detail and '(' not in detail
+    ]
+
+
+class QueryBudgetMixin:
+    # Tablas que se pueden recorrer enteras (pocas filas y sin filtro útil)
+    allowed_scans = ()
+
+    @contextmanager
+    def assertQueryBudget(self, budget, using=DEFAULT_DB_ALIAS):
+        connection = connections[using]
+        with CaptureQueriesContext(connection) as context:
+            yield context
+
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertLessEqual(
+            len(queries), budget,
+            f"{len(queries)} consultas (máximo {budget}):\n" + '\n'.join(queries),
+        )
+        if connection.vendor != 'sqlite':
+            return  # Con PostgreSQL el plan depende de las estadísticas de la tabla
+        for sql in queries:
+            if not sql.startswith('SELECT'):
+                continue
+            scans = [table for table in full_scans(connection, sql) if table not in self.allowed_scans]
+            self.assertFalse(scans, f"Recorre {', '.join(scans)} entera:\n{sql}")
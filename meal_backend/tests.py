@@ -0,0 +1,209 @@
+import os
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import SimpleTestCase, override_settings
+from django.test.client import RequestFactory
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APITestCase
+
+from .database import SQLITE_PRAGMAS, database_config, replica_configs, sqlite_options
+from .routers import ReplicaReadMixin, ReplicaRouter, RoutingState, _state, is_pinned, replica_pin_middleware, use_replica
+
+BASE_DIR = Path('/srv/meal_planner')
+
+
+def environ(**values):
+    # Solo las variables del test: las DB_* de quien los lanza no cuentan
+    return mock.patch.dict(os.environ, values, clear=True)
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    def test_sqlite_defaults(self):
+        with environ():
+            config = database_config(BASE_DIR)
+        self.assertEqual(config['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(config['NAME'], BASE_DIR / 'db.sqlite3')
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertEqual(config['OPTIONS'], sqlite_options())
+
+    def test_sqlite_options(self):
+        options = sqlite_options()
+        self.assertEqual(options['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(options['timeout'], 5)
+        self.assertIn('PRAGMA journal_mode=WAL', options['init_command'].split(';'))
+        self.assertEqual(len(options['init_command'].split(';')), len(SQLITE_PRAGMAS))
+
+    def test_sqlite_without_tuning(self):
+        with environ(DB_NAME='/tmp/otra.sqlite3', SQLITE_TUNING='False', DB_CONN_MAX_AGE='0'):
+            config = database_config(BASE_DIR)
+        self.assertEqual(config['NAME'], '/tmp/otra.sqlite3')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertNotIn('OPTIONS', config)
+
+    def test_postgresql(self):
+        with environ(DB_ENGINE='postgresql', DB_NAME='comidas', DB_USER='app', DB_HOST='db'):
+            config = database_config(BASE_DIR)
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((config['NAME'], config['USER'], config['HOST'], config['PORT']),
+                         ('comidas', 'app', 'db', '5432'))
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertEqual(config['OPTIONS'], {})
+
+    def test_postgresql_pool(self):
+        with environ(DB_ENGINE='postgresql', DB_POOL='True', DB_POOL_MAX_SIZE='20'):
+            config = database_config(BASE_DIR)
+        self.assertEqual(config['OPTIONS']['pool'], {'min_size': 2, 'max_size': 20, 'timeout': 10})
+        # El pool no se puede combinar con conexiones persistentes
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+
+    def test_unknown_engine(self):
+        with environ(DB_ENGINE='mysql'), self.assertRaises(ValueError):
+            database_config(BASE_DIR)
+
+    def test_sqlite_replicas(self):
+        with environ(DB_REPLICAS=' /data/r1.sqlite3, ,/data/r2.sqlite3'):
+            primary = database_config(BASE_DIR)
+            replicas = replica_configs(primary)
+        self.assertEqual(list(replicas), ['replica_1', 'replica_2'])
+        self.assertEqual(replicas['replica_2']['NAME'], '/data/r2.sqlite3')
+        self.assertEqual(replicas['replica_1']['TEST'], {'MIRROR': 'default'})
+        self.assertEqual(replicas['replica_1']['OPTIONS'], primary['OPTIONS'])
+        # Copia, no el mismo dict del primario
+        self.assertIsNot(replicas['replica_1']['OPTIONS'], primary['OPTIONS'])
+
+    def test_postgresql_replicas(self):
+        with environ(DB_ENGINE='postgresql', DB_PORT='5433', DB_REPLICAS='r1:6432,r2'):
+            replicas = replica_configs(database_config(BASE_DIR))
+        self.assertEqual([(config['HOST'], config['PORT']) for config in replicas.values()],
+                         [('r1', '6432'), ('r2', '5433')])
+
+    def test_no_replicas(self):
+        with environ():
+            self.assertEqual(replica_configs(database_config(BASE_DIR)), {})
+
+
+class View:
+    def initial(self, request, *args, **kwargs):
+        pass
+
+
+class ReplicaView(ReplicaReadMixin, View):
+    pass
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], REPLICA_PIN_CACHE='default')
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.user = User(pk=1, username='ana')
+        self.state = RoutingState()
+        token = _state.set(self.state)
+        self.addCleanup(_state.reset, token)
+
+    def test_primary_by_default(self):
+        self.assertEqual(self.router.db_for_read(User), DEFAULT_DB_ALIAS)
+        _state.set(None)  # Fuera de una petición (comandos, tareas...)
+        use_replica()
+        self.assertEqual(self.router.db_for_read(User), DEFAULT_DB_ALIAS)
+
+    def test_reads_from_replica_until_write(self):
+        use_replica()
+        self.assertEqual(self.router.db_for_read(User), 'replica_1')
+        self.assertEqual(self.router.db_for_write(User), DEFAULT_DB_ALIAS)
+        self.assertTrue(self.state.wrote)
+        # Lo que se lea después tiene que ver lo recién escrito
+        self.assertEqual(self.router.db_for_read(User), DEFAULT_DB_ALIAS)
+
+    def test_no_replica_after_write(self):
+        self.router.db_for_write(User)
+        use_replica()
+        self.assertEqual(self.router.db_for_read(User), DEFAULT_DB_ALIAS)
+
+    def test_primary_inside_transaction(self):
+        use_replica()
+        with mock.patch.object(connections[DEFAULT_DB_ALIAS], 'in_atomic_block', True):
+            self.assertEqual(self.router.db_for_read(User), DEFAULT_DB_ALIAS)
+        # Y ya no vuelve a la réplica en toda la petición
+        self.assertEqual(self.router.db_for_read(User), DEFAULT_DB_ALIAS)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        use_replica()
+        self.assertEqual(self.router.db_for_read(User), DEFAULT_DB_ALIAS)
+
+    def run_request(self, method, writes):
+        def view(request):
+            # El middleware abre su propio estado
+            self.assertIsNot(_state.get(), self.state)
+            ReplicaView().initial(request)
+            routed = self.router.db_for_read(User)
+            if writes:
+                self.router.db_for_write(User)
+            return routed
+
+        request = getattr(RequestFactory(), method)('/api/meals/')
+        request.user = self.user
+        return replica_pin_middleware(view)(request)
+
+    def test_pinned_after_write(self):
+        self.assertEqual(self.run_request('get', writes=False), 'replica_1')
+        self.assertFalse(is_pinned(self.user))
+
+        self.assertEqual(self.run_request('post', writes=True), DEFAULT_DB_ALIAS)
+        self.assertTrue(is_pinned(self.user))
+        # Sus siguientes lecturas van al primario; las de otros, no
+        self.assertEqual(self.run_request('get', writes=False), DEFAULT_DB_ALIAS)
+        self.user = User(pk=2, username='luis')
+        self.assertEqual(self.run_request('get', writes=False), 'replica_1')
+
+    @override_settings(REPLICA_PIN_SECONDS=60)
+    def test_pin_expires(self):
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=1000):
+            self.run_request('post', writes=True)
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=1059):
+            self.assertTrue(is_pinned(self.user))
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=1061):
+            self.assertFalse(is_pinned(self.user))
+
+
+@override_settings(METRICS_TOKEN='secreto', SERVER_TIMING=False, METRICS_SERIALIZERS=False)
+class MetricsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        self.client.force_authenticate(self.user)
+
+    def test_token(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer otro').status_code, 401)
+
+        self.client.get('/api/ingredients/')
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('meal_http_requests_total{view="IngredientViewSet",action="list",method="GET",status="200"}', body)
+        self.assertIn('meal_http_request_db_queries_count{view="IngredientViewSet",action="list"}', body)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_without_token(self):
+        # Sin token configurado no hay forma de entrar, salvo en desarrollo
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_server_timing(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/ingredients/'))
+        with self.settings(SERVER_TIMING=True):
+            timing = self.client.get('/api/ingredients/')['Server-Timing']
+        self.assertRegex(timing, r'^db;desc="\d+ consultas";dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_serializers_not_instrumented(self):
+        # Solo con METRICS_SERIALIZERS se tocan los serializers de DRF
+        self.client.get('/api/ingredients/')
+        self.assertFalse(getattr(BaseSerializer, '_timed', False))
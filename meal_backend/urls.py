@@ -2,8 +2,10 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from recipes.views import MealViewSet, IngredientViewSet, MediaProxyView
-from planner.views import DailyPlanViewSet, ShoppingListViewSet
+from planner.views import DailyPlanViewSet, ShoppingListViewSet, WeekTemplateViewSet, group_events
 from users.views import RegisterView, UserViewSet, PlanningGroupViewSet
+from sync.views import SyncView
+from meal_backend.metrics import metrics_view
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -15,11 +17,17 @@ router.register(r'meals', MealViewSet)
 router.register(r'ingredients', IngredientViewSet)
 router.register(r'plans', DailyPlanViewSet)
 router.register(r'shopping-lists', ShoppingListViewSet)
+router.register(r'week-templates', WeekTemplateViewSet)
 router.register(r'users', UserViewSet)
 router.register(r'groups', PlanningGroupViewSet, basename='planninggroup')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Métricas para Prometheus
+    path('metrics', metrics_view, name='metrics'),
+    # Canal de tiempo real del grupo (SSE, solo con ASGI)
+    path('api/groups/<int:group_id>/events/', group_events, name='group_events'),
+    path('api/sync/', SyncView.as_view(), name='sync'),
     path('api/', include(router.urls)), # Todas nuestras rutas empezarán por /api/
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
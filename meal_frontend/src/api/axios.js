@@ -40,4 +40,19 @@ api.interceptors.response.use(
     }
 );
 
+// Los listados de la API vienen paginados: la página siguiente llega en la
+// cabecera "Link" (rel="next"). Esta función las recorre todas y devuelve
+// la misma forma que una respuesta de axios ({ data: [...] }).
+export const getAllPages = async (url, config) => {
+    const data = [];
+    let next = url;
+    while (next) {
+        const res = await api.get(next, config);
+        data.push(...res.data);
+        const match = /<([^>]+)>;\s*rel="next"/.exec(res.headers['link'] || '');
+        next = match ? match[1] : null;
+    }
+    return { data };
+};
+
 export default api;
\ No newline at end of file
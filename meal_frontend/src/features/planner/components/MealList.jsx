@@ -1,13 +1,13 @@
 // frontend/src/components/MealList.jsx
 import { useEffect, useState } from "react";
-import api from "../../../api/axios";
+import { getAllPages } from "../../../api/axios";
 
 export const MealList = () => {
     const [meals, setMeals] = useState([]);
 
     useEffect(() => {
         // Pedimos las recetas al cargar el componente
-        api.get("meals/")
+        getAllPages("meals/")
             .then((response) => {
                 console.log("Datos recibidos:", response.data);
                 setMeals(response.data);
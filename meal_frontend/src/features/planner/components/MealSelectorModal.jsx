@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import api from '../../../api/axios';
+import { getAllPages } from '../../../api/axios';
 
 export const MealSelectorModal = ({ isOpen, onClose, onSave, date, slotLabel }) => {
     const [meals, setMeals] = useState([]);
@@ -9,7 +9,7 @@ export const MealSelectorModal = ({ isOpen, onClose, onSave, date, slotLabel })
     // Cargar recetas al abrir el modal
     useEffect(() => {
         if (isOpen) {
-            api.get('meals/').then(res => {
+            getAllPages('meals/').then(res => {
                 setMeals(res.data);
                 // Seleccionar la primera por defecto si hay
                 if (res.data.length > 0) setSelectedMealId(res.data[0].id);
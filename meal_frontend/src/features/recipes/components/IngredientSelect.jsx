@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import CreatableSelect from 'react-select/creatable';
-import api from '../../../api/axios';
+import api, { getAllPages } from '../../../api/axios';
 
 export const IngredientSelect = ({ value, onChange }) => {
     const [options, setOptions] = useState([]);
@@ -12,7 +12,7 @@ export const IngredientSelect = ({ value, onChange }) => {
 
     const loadIngredients = async () => {
         try {
-            const res = await api.get('ingredients/');
+            const res = await getAllPages('ingredients/');
             const formatted = res.data.map(i => ({ value: i.id, label: i.name }));
             setOptions(formatted);
         } catch (error) {
@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import api from '../../../api/axios';
+import { getAllPages } from '../../../api/axios';
 import {
     MagnifyingGlassIcon,
     BuildingStorefrontIcon,
@@ -34,7 +34,7 @@ export const RecipeSelectorModal = ({ isOpen, onClose, onSave, date, slotLabel }
 
     const fetchRecipes = async () => {
         try {
-            const res = await api.get('meals/');
+            const res = await getAllPages('meals/');
             setRecipes(res.data);
         } catch (error) {
             console.error(error);
@@ -155,7 +155,7 @@ export const RecipeSelectorModal = ({ isOpen, onClose, onSave, date, slotLabel }
                                         >
                                             <div className="w-14 h-14 bg-[color:hsl(var(--muted))] rounded-lg overflow-hidden shrink-0 relative">
                                                 {meal.image ? (
-                                                    <img src={meal.image} className="w-full h-full object-cover" />
+                                                    <img src={meal.image_variants?.thumb?.webp || meal.image} className="w-full h-full object-cover" />
                                                 ) : (
                                                     <div className="flex items-center justify-center h-full text-xl bg-[color:hsl(var(--muted))]/50">🍳</div>
                                                 )}
@@ -42,6 +42,7 @@ export const EditRecipePage = () => {
                 setCurrentImageUrl(meal.image);
 
                 const formattedIngredients = meal.ingredients.map(ing => ({
+                    id: ing.id,
                     ingredient_id: ing.ingredient,
                     quantity: ing.quantity,
                     unit: normalizeUnit(ing.unit)
@@ -96,7 +97,9 @@ export const EditRecipePage = () => {
                 return;
             }
 
+            // Mandamos el id de cada fila para que el backend la actualice en su sitio
             const ingredientsPayload = validIngredients.map(i => ({
+                ...(i.id ? { id: i.id } : {}),
                 ingredient: i.ingredient_id,
                 quantity: i.quantity,
                 unit: i.unit
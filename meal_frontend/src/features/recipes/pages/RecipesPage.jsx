@@ -1,6 +1,6 @@
 import { useEffect, useState } from 'react';
 import { Link } from 'react-router-dom';
-import api from '../../../api/axios';
+import { getAllPages } from '../../../api/axios';
 import { useAuth } from '../../auth/context/AuthContext';
 import {
     PlusIcon,
@@ -25,7 +25,7 @@ export const RecipesPage = () => {
 
     const fetchRecipes = async () => {
         try {
-            const res = await api.get('meals/');
+            const res = await getAllPages('meals/');
             setRecipes(res.data);
         } catch (error) {
             console.error("Error cargando recetas", error);
@@ -132,7 +132,7 @@ export const RecipesPage = () => {
                                 <div className="aspect-[4/3] overflow-hidden relative bg-[color:hsl(var(--muted))]">
                                     {meal.image ? (
                                         <img
-                                            src={meal.image}
+                                            src={meal.image_variants?.list?.webp || meal.image}
                                             alt={meal.name}
                                             className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-500"
                                         />
@@ -44,10 +44,19 @@ export const ShoppingListPage = () => {
     };
 
     const toggleItem = async (itemId, currentStatus) => {
-        const updatedItems = shoppingList.items.map(item =>
-            item.id === itemId ? { ...item, is_purchased: !currentStatus } : item
-        );
-        setShoppingList({ ...shoppingList, items: updatedItems });
+        const setPurchased = (value) => setShoppingList(list => ({
+            ...list,
+            items: list.items.map(item => item.id === itemId ? { ...item, is_purchased: value } : item)
+        }));
+        // Se marca al momento y se guarda de fondo; si falla, se deshace
+        setPurchased(!currentStatus);
+        try {
+            await api.post(`shopping-lists/${shoppingList.id}/items/bulk/`, {
+                items: [{ id: itemId, is_purchased: !currentStatus }]
+            });
+        } catch (error) {
+            setPurchased(currentStatus);
+        }
     };
 
     return (
@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import api from '../../../api/axios';
+import api, { getAllPages } from '../../../api/axios';
 import { useAuth } from '../../auth/context/AuthContext';
 import {
     UserGroupIcon,
@@ -116,7 +116,7 @@ export const GroupsPage = () => {
 
     const loadGroups = async () => {
         try {
-            const res = await api.get('groups/');
+            const res = await getAllPages('groups/');
             setGroups(res.data);
             if (!activeGroup && res.data.length > 0) {
                 selectGroup(res.data[0]);
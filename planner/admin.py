@@ -1,6 +1,6 @@
 # planner/admin.py
 from django.contrib import admin
-from .models import DailyPlan, ShoppingList, ShoppingListItem
+from .models import DailyPlan, ShoppingList, ShoppingListItem, WeekTemplate, WeekTemplateEntry
 
 @admin.register(DailyPlan)
 class DailyPlanAdmin(admin.ModelAdmin):
@@ -14,5 +14,14 @@ class ShoppingListItemInline(admin.TabularInline):
 
 @admin.register(ShoppingList)
 class ShoppingListAdmin(admin.ModelAdmin):
-    list_display = ('start_date', 'end_date', 'group')
-    inlines = [ShoppingListItemInline]
\ No newline at end of file
+    list_display = ('start_date', 'end_date', 'group', 'auto_update')
+    inlines = [ShoppingListItemInline]
+
+class WeekTemplateEntryInline(admin.TabularInline):
+    model = WeekTemplateEntry
+    extra = 0
+
+@admin.register(WeekTemplate)
+class WeekTemplateAdmin(admin.ModelAdmin):
+    list_display = ('name', 'group', 'created_at')
+    inlines = [WeekTemplateEntryInline]
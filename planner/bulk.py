@@ -0,0 +1,143 @@
+"""
+Operaciones en bloque sobre el calendario (DailyPlan): guardar muchos planes
+de una vez, copiar un rango de fechas a otro y aplicar semanas tipo.
+
+Cada operación es UNA transacción con un bulk_update, un bulk_create y un
+DELETE como mucho. Las señales por instancia se silencian (ver
+`bulk_operation`) y al final se manda `plans_changed` con todos los
+cambios, que es lo que usan las listas auto-mantenidas. El registro de
+cambios para la sincronización (sync/log.py) se apunta aquí a mano.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from .models import DailyPlan, WeekTemplateEntry
+from .shopping import plan_state
+from .signals import bulk_operation, plans_changed
+from sync.log import CREATE, DELETE, UPDATE, record
+
+# Campos de un plan que se escriben en bloque (además del grupo)
+PLAN_FIELDS = ('date', 'meal_slot', 'meal_id', 'target_servings', 'is_eating_out', 'custom_name')
+# Nombres de campo para bulk_update (meal, no meal_id; updated_at no se rellena sola)
+PLAN_UPDATE_FIELDS = ('date', 'meal_slot', 'meal', 'target_servings', 'is_eating_out', 'custom_name', 'updated_at')
+
+WEEK_DAYS = 7
+
+
+def write_plans(group, specs, start_date=None, end_date=None):
+    """
+    Guarda los planes `specs` (diccionarios con PLAN_FIELDS) en el grupo.
+
+    - Sin rango: se añaden todos.
+    - Con rango (start_date, end_date): el rango queda EXACTAMENTE como
+      indica `specs`. Los planes existentes se reutilizan por (fecha, franja)
+      y solo se actualizan si cambia algo; los que sobran se borran.
+
+    Devuelve {"plans": [...], "created": n, "updated": n, "deleted": n}.
+    """
+    now = timezone.now()
+    with transaction.atomic(), bulk_operation():
+        pool = {}
+        if start_date is not None:
+            existing = DailyPlan.objects.select_for_update().filter(
+                group=group, date__range=[start_date, end_date],
+            ).order_by('date', 'meal_slot', 'id')
+            for plan in existing:
+                pool.setdefault((plan.date, plan.meal_slot), []).append(plan)
+
+        plans, changes = [], []
+        to_update, to_create = [], []
+        for spec in specs:
+            candidates = pool.get((spec['date'], spec['meal_slot']))
+            if candidates:
+                plan = candidates.pop(0)
+                if any(getattr(plan, field) != spec[field] for field in PLAN_FIELDS):
+                    old_state = plan_state(plan)
+                    for field in PLAN_FIELDS:
+                        setattr(plan, field, spec[field])
+                    plan.updated_at = now
+                    to_update.append(plan)
+                    changes.append((old_state, plan_state(plan)))
+            else:
+                plan = DailyPlan(group=group, **spec)
+                to_create.append(plan)
+            plans.append(plan)
+        to_delete = [plan for candidates in pool.values() for plan in candidates]
+
+        if to_update:
+            DailyPlan.objects.bulk_update(to_update, PLAN_UPDATE_FIELDS)
+            record('plans', to_update, UPDATE)
+        if to_create:
+            DailyPlan.objects.bulk_create(to_create)
+            changes.extend((None, plan_state(plan)) for plan in to_create)
+            record('plans', to_create, CREATE)
+        if to_delete:
+            DailyPlan.objects.filter(pk__in=[plan.pk for plan in to_delete]).delete()
+            changes.extend((plan_state(plan), None) for plan in to_delete)
+            record('plans', to_delete, DELETE)
+
+        if changes:
+            plans_changed.send(sender=DailyPlan, changes=changes)
+
+    return {
+        'plans': plans,
+        'created': len(to_create),
+        'updated': len(to_update),
+        'deleted': len(to_delete),
+    }
+
+
+def copy_range(group, source_start, source_end, target_start, replace=True):
+    """
+    Copia los planes de [source_start, source_end] a partir de target_start
+    (mismo desplazamiento en días para todos). Con `replace`, el rango de
+    destino queda solo con la copia.
+    """
+    offset = target_start - source_start
+    rows = DailyPlan.objects.filter(
+        group=group, date__range=[source_start, source_end],
+    ).order_by('date', 'meal_slot', 'id').values(*PLAN_FIELDS)
+    specs = [{**row, 'date': row['date'] + offset} for row in rows]
+
+    if replace:
+        return write_plans(group, specs, target_start, source_end + offset)
+    return write_plans(group, specs)
+
+
+def capture_week(template, start_date):
+    """Guarda en `template` los planes de la semana que empieza en start_date."""
+    rows = DailyPlan.objects.filter(
+        group_id=template.group_id,
+        date__range=[start_date, start_date + timedelta(days=WEEK_DAYS - 1)],
+    ).order_by('date', 'meal_slot', 'id').values(*PLAN_FIELDS)
+    return WeekTemplateEntry.objects.bulk_create([
+        WeekTemplateEntry(
+            template=template,
+            day=(row['date'] - start_date).days,
+            meal_slot=row['meal_slot'],
+            meal_id=row['meal_id'],
+            custom_name=row['custom_name'],
+            is_eating_out=row['is_eating_out'],
+            target_servings=row['target_servings'],
+        )
+        for row in rows
+    ])
+
+
+def apply_template(template, start_date, replace=True):
+    """Aplica una semana tipo a la semana que empieza en start_date."""
+    specs = [
+        {
+            'date': start_date + timedelta(days=entry.day),
+            'meal_slot': entry.meal_slot,
+            'meal_id': entry.meal_id,
+            'target_servings': entry.target_servings,
+            'is_eating_out': entry.is_eating_out,
+            'custom_name': entry.custom_name,
+        }
+        for entry in template.entries.order_by('day', 'meal_slot', 'id')
+    ]
+    if replace:
+        return write_plans(template.group, specs, start_date, start_date + timedelta(days=WEEK_DAYS - 1))
+    return write_plans(template.group, specs)
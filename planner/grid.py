@@ -0,0 +1,56 @@
+"""
+Calendario compacto de un grupo: una rejilla fecha x franja con solo lo que
+pinta la vista semanal (nombre, miniatura, raciones), sin el MealSerializer
+completo de cada plan.
+
+La respuesta lleva un ETag con PlanningGroup.version, que sube con cualquier
+cambio en los planes del grupo o en las recetas que aparecen en ellos (ver
+planner/signals.py). Si el cliente ya la tiene, basta con leer la versión.
+"""
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from .models import DailyPlan
+
+SLOTS = [code for code, _ in DailyPlan.SLOT_CHOICES]
+
+
+def grid_etag(group_id, version, start_date, end_date):
+    return f'"calendar-{group_id}-{version}-{start_date:%Y%m%d}-{end_date:%Y%m%d}"'
+
+
+def thumbnail_url(request, variants):
+    thumb = (variants or {}).get('thumb')
+    if not thumb:
+        return None
+    return request.build_absolute_uri(default_storage.url(thumb['webp']))
+
+
+def build_grid(request, group_id, start_date, end_date):
+    """
+    {"2026-03-02": {"BREAKFAST": [...], "LUNCH": [...], ...}, ...} con todos
+    los días del rango (vacíos incluidos). Una sola consulta.
+    """
+    rows = DailyPlan.objects.filter(
+        group_id=group_id, date__range=[start_date, end_date],
+    ).order_by('date', 'meal_slot', 'id').values(
+        'id', 'date', 'meal_slot', 'meal_id', 'target_servings', 'is_eating_out', 'custom_name',
+        'meal__name', 'meal__image_variants',
+    )
+
+    days = {}
+    day = start_date
+    while day <= end_date:
+        days[day.isoformat()] = {slot: [] for slot in SLOTS}
+        day += timedelta(days=1)
+
+    for row in rows:
+        days[row['date'].isoformat()][row['meal_slot']].append({
+            'id': row['id'],
+            'meal': row['meal_id'],
+            'name': row['custom_name'] if row['is_eating_out'] else row['meal__name'],
+            'thumb': None if row['is_eating_out'] else thumbnail_url(request, row['meal__image_variants']),
+            'target_servings': row['target_servings'],
+            'is_eating_out': row['is_eating_out'],
+        })
+    return days
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='auto_update',
+            field=models.BooleanField(default=False, verbose_name='Actualizar automáticamente'),
+        ),
+    ]
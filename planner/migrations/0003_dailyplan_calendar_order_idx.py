@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0002_shoppinglist_auto_update'),
+        ('recipes', '0002_meal_ingredients_version'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyplan',
+            index=models.Index(fields=['date', 'meal_slot', 'id'], name='plan_calendar_order_idx'),
+        ),
+    ]
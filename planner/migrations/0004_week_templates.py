@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0003_dailyplan_calendar_order_idx'),
+        ('recipes', '0005_meal_search_index'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeekTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='week_templates', to='users.planninggroup')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WeekTemplateEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.PositiveSmallIntegerField()),
+                ('meal_slot', models.CharField(choices=[('BREAKFAST', 'Desayuno'), ('LUNCH', 'Comida'), ('DINNER', 'Cena'), ('SNACK', 'Otros')], default='LUNCH', max_length=20)),
+                ('custom_name', models.CharField(blank=True, max_length=200, null=True)),
+                ('is_eating_out', models.BooleanField(default=False)),
+                ('target_servings', models.PositiveIntegerField(default=4)),
+                ('meal', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='recipes.meal')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='planner.weektemplate')),
+            ],
+            options={
+                'ordering': ['day', 'meal_slot', 'id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='weektemplate',
+            constraint=models.UniqueConstraint(fields=('group', 'name'), name='weektemplate_unique_name'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 19:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0006_group_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItemTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.BigIntegerField()),
+                ('revision', models.PositiveBigIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='revision',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shoppinglistitem',
+            name='revision',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglistitem',
+            index=models.Index(fields=['shopping_list', 'revision'], name='item_list_revision_idx'),
+        ),
+        migrations.AddField(
+            model_name='shoppinglistitemtombstone',
+            name='shopping_list',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tombstones', to='planner.shoppinglist'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglistitemtombstone',
+            index=models.Index(fields=['shopping_list', 'revision'], name='tombstone_list_revision_idx'),
+        ),
+    ]
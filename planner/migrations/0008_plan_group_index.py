@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0007_shopping_revisions'),
+        ('recipes', '0007_meal_copy_index'),
+        ('users', '0003_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyplan',
+            index=models.Index(fields=['group', 'date', 'meal_slot', 'id'], name='plan_group_calendar_idx'),
+        ),
+    ]
@@ -31,8 +31,26 @@ class DailyPlan(models.Model):
     # Esto permite recalcular ingredientes sin tocar la receta original.
     target_servings = models.PositiveIntegerField(default=4, verbose_name="Raciones para este día")
 
+    # Ojo: bulk_update no la rellena sola (ver planner/bulk.py)
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ['date', 'meal_slot'] # Ordenamos por fecha y luego por franja
+        indexes = [
+            # Orden estable para la paginación por cursor del calendario
+            models.Index(fields=['date', 'meal_slot', 'id'], name='plan_calendar_order_idx'),
+            # Calendario y lista de la compra de un grupo: group + rango de
+            # fechas, ya en el orden del calendario (sin ordenar aparte)
+            models.Index(fields=['group', 'date', 'meal_slot', 'id'], name='plan_group_calendar_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Guardamos los valores tal y como vinieron de la BD para poder calcular
+        # qué ha cambiado al guardar (sin hacer otra consulta).
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def __str__(self):
         return f"{self.date} ({self.get_meal_slot_display()}) - {self.meal.name}"
@@ -46,6 +64,18 @@ class ShoppingList(models.Model):
     end_date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Si está activo, la lista se mantiene sola: cada cambio en un DailyPlan del
+    # rango ajusta solo las cantidades afectadas (ver planner/shopping.py).
+    auto_update = models.BooleanField(default=False, verbose_name="Actualizar automáticamente")
+
+    # Sube también cuando cambia cualquiera de sus ítems (la API los devuelve dentro)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Contador de cambios en los ítems: cada escritura lo sube en uno y marca
+    # con él los ítems que toca (y los borrados, ver ShoppingListItemTombstone).
+    # Es el cursor de /shopping-lists/<id>/changes/?since=N (ver planner/shopping.py).
+    revision = models.PositiveBigIntegerField(default=0, editable=False)
+
     def __str__(self):
         return f"Lista del {self.start_date} al {self.end_date}"
 
@@ -55,12 +85,94 @@ class ShoppingListItem(models.Model):
     Guardamos el nombre como texto (no ForeignKey) para permitir que el usuario
     edite la lista libremente (ej: añadir 'Papel higiénico' que no es una receta).
     """
+    # `quantity` se guarda exacta y se enseña con estos decimales
+    QUANTITY_DECIMALS = 2
+
     shopping_list = models.ForeignKey(ShoppingList, related_name='items', on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
     quantity = models.FloatField(default=0)
     unit = models.CharField(max_length=20)
     is_purchased = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Revisión de la lista en la que cambió por última vez
+    revision = models.PositiveBigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['shopping_list', 'revision'], name='item_list_revision_idx'),
+        ]
 
     def __str__(self):
         status = "[X]" if self.is_purchased else "[ ]"
-        return f"{status} {self.name} ({self.quantity} {self.unit})"
\ No newline at end of file
+        return f"{status} {self.name} ({self.quantity} {self.unit})"
+
+class ShoppingListItemTombstone(models.Model):
+    """
+    Rastro de un ítem borrado, para que los clientes que sincronizan por
+    diferencias sepan que tienen que quitarlo. Se van con la lista.
+    """
+    shopping_list = models.ForeignKey(ShoppingList, related_name='tombstones', on_delete=models.CASCADE)
+    item_id = models.BigIntegerField()
+    revision = models.PositiveBigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['shopping_list', 'revision'], name='tombstone_list_revision_idx'),
+        ]
+
+    def __str__(self):
+        return f"Ítem {self.item_id} borrado (revisión {self.revision})"
+
+class WeekTemplate(models.Model):
+    """
+    Semana tipo de un grupo (ej: "Semana de verano") para aplicarla de golpe
+    a cualquier semana del calendario (ver planner/bulk.py).
+    """
+    group = models.ForeignKey(PlanningGroup, on_delete=models.CASCADE, related_name='week_templates')
+    name = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'name'], name='weektemplate_unique_name'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.group})"
+
+class WeekTemplateEntry(models.Model):
+    """
+    Una comida de la semana tipo. `day` es el desplazamiento (0-6) respecto
+    al primer día de la semana a la que se aplique.
+    """
+    template = models.ForeignKey(WeekTemplate, on_delete=models.CASCADE, related_name='entries')
+    day = models.PositiveSmallIntegerField()
+    meal_slot = models.CharField(max_length=20, choices=DailyPlan.SLOT_CHOICES, default='LUNCH')
+    meal = models.ForeignKey(Meal, on_delete=models.CASCADE, null=True, blank=True)
+    custom_name = models.CharField(max_length=200, null=True, blank=True)
+    is_eating_out = models.BooleanField(default=False)
+    target_servings = models.PositiveIntegerField(default=4)
+
+    class Meta:
+        ordering = ['day', 'meal_slot', 'id']
+
+    def __str__(self):
+        return f"{self.template.name}: día {self.day} ({self.get_meal_slot_display()})"
+
+class GroupEvent(models.Model):
+    """
+    Evento de tiempo real de un grupo, para el broker en base de datos
+    (planner.realtime.DatabaseBroker): así lo ven todos los procesos.
+    Se borran solos pasado REALTIME_RETENTION.
+    """
+    # Sin ForeignKey: el evento puede llegar cuando el grupo ya no existe
+    # (ej: al borrar un grupo se borran sus listas en cascada)
+    group_id = models.PositiveIntegerField(db_index=True)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.group_id}: {self.payload.get('type')}"
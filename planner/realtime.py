@@ -0,0 +1,331 @@
+"""
+Tiempo real por grupo: cada PlanningGroup tiene un canal por el que se
+empujan eventos pequeños cuando cambian sus planes o sus listas de la compra.
+El cliente se suscribe con Server-Sent Events (GET /api/groups/<id>/events/,
+ver planner/views.py) y solo vuelve a pedir lo que el evento dice que ha
+cambiado, en lugar de consultar cada X segundos.
+
+Eventos (el `type` va también como `event:` del SSE):
+    {"type": "plans", "dates": ["2026-03-02", ...]}
+    {"type": "meals", "ids": [12, ...]}                # cambió una receta planificada
+    {"type": "shopping_list", "op": "saved" | "deleted", "id": 5}
+    {"type": "shopping_items", "list": 5, "revision": 12, "items": [{...}], "deleted": [7, 8]}
+    {"type": "resync"}                                 # se han perdido eventos: recargar todo
+
+Los eventos se publican al confirmar la transacción (`send_event`). Quién los
+reparte lo decide REALTIME_BROKER:
+- MemoryBroker: colas en memoria. Un solo proceso (y los tests).
+- DatabaseBroker: los eventos pasan por la tabla GroupEvent y cada proceso
+  los recoge con UNA consulta periódica para todas sus conexiones. Sirve con
+  varios workers sin instalar nada más.
+Otro backend solo tiene que heredar de BaseBroker e implementar `publish` y
+`replay` (y llamar a `fan_out` cuando le llegue un evento).
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+RESYNC = {'type': 'resync'}
+
+
+class Subscription:
+    """Una conexión abierta: cola de eventos en el bucle asyncio que la atiende."""
+
+    def __init__(self, group_id):
+        self.group_id = group_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.REALTIME_QUEUE_SIZE)
+        # El cliente va tan lento que se ha llenado la cola: le pedimos que recargue
+        self.overflowed = False
+
+    def put(self, event):
+        # Se llama desde cualquier hilo (las vistas síncronas corren en otro)
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # El bucle ya se ha cerrado: la conexión se está yendo
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return None, RESYNC
+        return await self.queue.get()
+
+
+class BaseBroker:
+    """
+    Reparte eventos (id, payload) a las suscripciones de ESTE proceso.
+    Los ids son crecientes y van en el `id:` del SSE: al reconectar, el
+    navegador manda Last-Event-ID y `replay` devuelve lo que se perdió.
+    """
+
+    def __init__(self):
+        self._subscriptions = {}  # {group_id: {Subscription, ...}}
+        self._lock = threading.Lock()
+
+    def subscribe(self, group_id):
+        subscription = Subscription(group_id)
+        with self._lock:
+            self._subscriptions.setdefault(group_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.group_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.group_id, None)
+
+    def subscribed_groups(self):
+        with self._lock:
+            return list(self._subscriptions)
+
+    def fan_out(self, group_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(group_id, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def publish(self, group_id, payload):
+        raise NotImplementedError
+
+    async def replay(self, group_id, last_event_id):
+        """
+        Eventos del grupo posteriores a `last_event_id`, o None si no se
+        puede saber (hay que mandar `resync`).
+        """
+        raise NotImplementedError
+
+
+class MemoryBroker(BaseBroker):
+    """Todo en memoria: solo ve los eventos de su propio proceso."""
+
+    def __init__(self):
+        super().__init__()
+        # Empezamos en el instante actual: tras un reinicio los ids siguen
+        # creciendo y un Last-Event-ID anterior se detecta (ver replay)
+        self._first_id = int(time.time() * 1000)
+        self._ids = itertools.count(self._first_id)
+        self._history = {}  # {group_id: deque([(id, payload), ...])}
+
+    def publish(self, group_id, payload):
+        with self._lock:
+            event = (next(self._ids), payload)
+            history = self._history.get(group_id)
+            if history is None:
+                history = self._history[group_id] = deque(maxlen=settings.REALTIME_HISTORY)
+            history.append(event)
+        self.fan_out(group_id, event)
+
+    async def replay(self, group_id, last_event_id):
+        if last_event_id < self._first_id:
+            return None  # De antes de arrancar este proceso
+        with self._lock:
+            history = list(self._history.get(group_id, ()))
+        if len(history) == settings.REALTIME_HISTORY and history[0][0] > last_event_id + 1:
+            return None  # Ya se han descartado eventos que no tenía
+        return [event for event in history if event[0] > last_event_id]
+
+
+class DatabaseBroker(BaseBroker):
+    """
+    Los eventos se guardan en GroupEvent. Mientras haya alguien conectado,
+    una tarea por proceso consulta cada REALTIME_POLL_INTERVAL segundos los
+    eventos nuevos de los grupos suscritos (una consulta para todos) y los
+    reparte. Los navegadores no consultan nada.
+    """
+    # Un evento con id menor puede confirmarse después que otro con id mayor:
+    # en lugar de "id > último" miramos los últimos segundos y descartamos
+    # los ya repartidos
+    GRACE = timedelta(seconds=5)
+    PRUNE_EVERY = 60
+
+    def __init__(self):
+        super().__init__()
+        self._poller = None
+        self._since = None
+        self._seen = {}  # {id: created_at} de los eventos ya repartidos
+        self._next_prune = 0
+
+    def publish(self, group_id, payload):
+        from .models import GroupEvent
+
+        GroupEvent.objects.create(group_id=group_id, payload=payload)
+        if time.monotonic() >= self._next_prune:
+            self._next_prune = time.monotonic() + self.PRUNE_EVERY
+            GroupEvent.objects.filter(
+                created_at__lt=timezone.now() - timedelta(seconds=settings.REALTIME_RETENTION),
+            ).delete()
+
+    def subscribe(self, group_id):
+        subscription = super().subscribe(group_id)
+        poller = self._poller
+        if poller is None or poller.done() or poller.get_loop() is not subscription.loop:
+            self._since = timezone.now()
+            self._seen = {}
+            self._poller = subscription.loop.create_task(self._poll())
+        return subscription
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(settings.REALTIME_POLL_INTERVAL)
+            group_ids = self.subscribed_groups()
+            if not group_ids:
+                return  # Nadie escuchando: la siguiente suscripción la vuelve a arrancar
+            try:
+                events = await sync_to_async(self._fetch)(group_ids)
+            except Exception:
+                logger.exception("No se pudieron leer los eventos de tiempo real")
+                continue
+            for group_id, event in events:
+                self.fan_out(group_id, event)
+
+    def _fetch(self, group_ids):
+        from .models import GroupEvent
+
+        rows = GroupEvent.objects.filter(
+            group_id__in=group_ids, created_at__gte=self._since - self.GRACE,
+        ).values_list('id', 'group_id', 'payload', 'created_at')
+
+        events = []
+        for event_id, group_id, payload, created_at in rows:
+            if event_id not in self._seen:
+                self._seen[event_id] = created_at
+                events.append((group_id, (event_id, payload)))
+                self._since = max(self._since, created_at)
+        # Lo que ya no entra en la ventana no puede volver a salir
+        limit = self._since - self.GRACE
+        self._seen = {event_id: created_at for event_id, created_at in self._seen.items() if created_at >= limit}
+        return events
+
+    async def replay(self, group_id, last_event_id):
+        return await sync_to_async(self._replay)(group_id, last_event_id)
+
+    def _replay(self, group_id, last_event_id):
+        from .models import GroupEvent
+
+        oldest = GroupEvent.objects.order_by('id').values_list('id', flat=True).first()
+        if oldest is None or oldest > last_event_id + 1:
+            return None  # Puede que se hayan borrado eventos que no tenía
+        rows = list(GroupEvent.objects.filter(
+            group_id=group_id, id__gt=last_event_id,
+        ).values_list('id', 'payload')[:settings.REALTIME_HISTORY + 1])
+        if len(rows) > settings.REALTIME_HISTORY:
+            return None  # Son demasiados: mejor recargar
+        return rows
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.REALTIME_BROKER)()
+    return _broker
+
+
+def send_event(group_id, payload):
+    """
+    Publica `payload` en el canal del grupo cuando se confirme la transacción
+    en curso (si no hay, al momento). Si el broker falla se registra el error,
+    pero la petición que hizo el cambio no se entera.
+    """
+    if group_id is None:
+        return
+    transaction.on_commit(partial(get_broker().publish, group_id, payload), robust=True)
+
+
+def item_payload(item):
+    """Lo mismo que ShoppingListItemSerializer, sin pasar por DRF."""
+    return {
+        'id': item.pk,
+        'name': item.name,
+        'quantity': round(item.quantity, item.QUANTITY_DECIMALS),
+        'unit': item.unit,
+        'is_purchased': item.is_purchased,
+    }
+
+
+# --- SSE ---
+
+def format_sse(event_id, payload):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f"event: {payload['type']}")
+    lines.append('data: ' + json.dumps(payload, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+async def event_stream(group_id, last_event_id=None, is_member=None):
+    """
+    Genera el cuerpo SSE de una conexión: primero lo que se perdió desde
+    `last_event_id` y luego los eventos según llegan. Cada
+    REALTIME_KEEPALIVE segundos sin eventos manda un comentario para que
+    los proxies no corten la conexión.
+
+    `is_member` (corutina sin argumentos) se vuelve a comprobar cada
+    REALTIME_KEEPALIVE segundos: si el usuario ya no es del grupo, se cierra.
+    """
+    broker = get_broker()
+    # Nos suscribimos ANTES de leer lo perdido para no dejar un hueco entre
+    # las dos cosas; lo que llegue repetido se descarta por id
+    subscription = broker.subscribe(group_id)
+    try:
+        yield f'retry: {settings.REALTIME_RETRY_MS}\n\n'
+
+        replayed = set()
+        if last_event_id is not None:
+            backlog = await broker.replay(group_id, last_event_id)
+            if backlog is None:
+                yield format_sse(None, RESYNC)
+            else:
+                for event_id, payload in backlog:
+                    replayed.add(event_id)
+                    yield format_sse(event_id, payload)
+
+        loop = asyncio.get_running_loop()
+        next_check = loop.time() + settings.REALTIME_KEEPALIVE
+        while True:
+            try:
+                event_id, payload = await asyncio.wait_for(
+                    subscription.get(), timeout=settings.REALTIME_KEEPALIVE,
+                )
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+            else:
+                if event_id not in replayed:
+                    yield format_sse(event_id, payload)
+            # También con eventos seguidos (sin keepalive de por medio)
+            if is_member is not None and loop.time() >= next_check:
+                if not await is_member():
+                    return
+                next_check = loop.time() + settings.REALTIME_KEEPALIVE
+    finally:
+        broker.unsubscribe(subscription)
@@ -1,18 +1,55 @@
 from rest_framework import serializers
-from .models import DailyPlan, ShoppingList, ShoppingListItem, Meal
+from .models import DailyPlan, ShoppingList, ShoppingListItem, Meal, WeekTemplate, WeekTemplateEntry
 from recipes.serializers import MealSerializer
+from users.models import PlanningGroup
 from django.db import transaction
+from .bulk import WEEK_DAYS, capture_week
+from .shopping import aggregate_ingredients
+
+# Límites de las operaciones en bloque (un mes y pico de calendario)
+MAX_BULK_DAYS = 62
+MAX_BULK_PLANS = 500
+MAX_BULK_ITEMS = 500
+
+
+def validate_plan_choice(meal, is_eating_out, custom_name):
+    # Lógica de validación: O hay receta, O es comer fuera
+    if not meal and not is_eating_out:
+        raise serializers.ValidationError("Debes seleccionar una receta o indicar que comes fuera.")
+
+    # Si es comer fuera, el nombre es obligatorio
+    if is_eating_out and not custom_name:
+        raise serializers.ValidationError("Si comes fuera, debes indicar el nombre del sitio.")
+
+
+class MemberGroupField(serializers.PrimaryKeyRelatedField):
+    """Un PlanningGroup del que el usuario de la petición es miembro."""
+
+    def get_queryset(self):
+        request = self.context.get('request')
+        if request is None:
+            return PlanningGroup.objects.none()
+        return PlanningGroup.objects.filter(members=request.user)
+
+
+class VisibleMealField(serializers.PrimaryKeyRelatedField):
+    """Una receta que el usuario de la petición puede ver (ver Meal.objects.visible_to)."""
+
+    def get_queryset(self):
+        request = self.context.get('request')
+        if request is None:
+            return Meal.objects.none()
+        return Meal.objects.visible_to(request.user)
+
 
 class DailyPlanSerializer(serializers.ModelSerializer):
+    meal = VisibleMealField(required=False, allow_null=True)
     # Al leer, queremos ver todos los datos de la comida (nombre, foto, etc), no solo el ID
     meal_details = MealSerializer(source='meal', read_only=True)
 
     class Meta:
         model = DailyPlan
         fields = ['id', 'date', 'group', 'meal', 'meal_details', 'target_servings', 'meal_slot', 'is_eating_out', 'custom_name']
-        extra_kwargs = {
-            'meal': {'required': False, 'allow_null': True}
-        }
 
     def validate(self, data):
         # Si estamos editando (PATCH/PUT), usamos valores de la instancia si no vienen en data
@@ -25,17 +62,167 @@ class DailyPlanSerializer(serializers.ModelSerializer):
             is_eating_out = data.get('is_eating_out')
             custom_name = data.get('custom_name')
 
-        # Lógica de validación: O hay receta, O es comer fuera
-        if not meal and not is_eating_out:
-            raise serializers.ValidationError("Debes seleccionar una receta o indicar que comes fuera.")
-        
-        # Si es comer fuera, el nombre es obligatorio
-        if is_eating_out and not custom_name:
-            raise serializers.ValidationError("Si comes fuera, debes indicar el nombre del sitio.")
+        validate_plan_choice(meal, is_eating_out, custom_name)
+        return data
+
+
+# --- OPERACIONES EN BLOQUE (ver planner/bulk.py) ---
+
+class PlanEntrySerializer(serializers.Serializer):
+    """
+    Un plan dentro de una operación en bloque. La receta va como id y se
+    comprueba para todos a la vez en BulkPlansSerializer (no una consulta
+    por plan).
+    """
+    date = serializers.DateField()
+    meal_slot = serializers.ChoiceField(choices=DailyPlan.SLOT_CHOICES, default='LUNCH')
+    meal = serializers.IntegerField(allow_null=True, default=None)
+    target_servings = serializers.IntegerField(min_value=1, default=4)
+    is_eating_out = serializers.BooleanField(default=False)
+    custom_name = serializers.CharField(max_length=200, allow_null=True, allow_blank=True, default=None)
+
+    def validate(self, data):
+        validate_plan_choice(data['meal'], data['is_eating_out'], data['custom_name'])
+        data['meal_id'] = data.pop('meal')
+        return data
+
+
+class BulkPlansSerializer(serializers.Serializer):
+    """
+    Muchos planes de un grupo en una petición. Si se indica el rango
+    (start_date, end_date), el rango queda exactamente con estos planes.
+    """
+    group = MemberGroupField()
+    plans = PlanEntrySerializer(many=True, allow_empty=True, max_length=MAX_BULK_PLANS)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+    def validate(self, data):
+        start_date, end_date = data.get('start_date'), data.get('end_date')
+        if (start_date is None) != (end_date is None):
+            raise serializers.ValidationError("Indica start_date y end_date, o ninguno de los dos.")
+        if start_date is not None:
+            if end_date < start_date:
+                raise serializers.ValidationError("end_date no puede ser anterior a start_date.")
+            if (end_date - start_date).days >= MAX_BULK_DAYS:
+                raise serializers.ValidationError(f"El rango no puede superar {MAX_BULK_DAYS} días.")
+            outside = [plan['date'] for plan in data['plans'] if not start_date <= plan['date'] <= end_date]
+            if outside:
+                raise serializers.ValidationError(f"Hay planes fuera del rango: {outside[0]}")
+        elif not data['plans']:
+            raise serializers.ValidationError("No hay planes que guardar.")
+
+        # Todas las recetas de golpe (solo las que el usuario puede ver)
+        meal_ids = {plan['meal_id'] for plan in data['plans'] if plan['meal_id']}
+        found = set(Meal.objects.visible_to(self.context['request'].user).filter(
+            pk__in=meal_ids,
+        ).values_list('pk', flat=True))
+        if meal_ids - found:
+            raise serializers.ValidationError(f"No existen las recetas: {sorted(meal_ids - found)}")
+        return data
+
+
+class CopyRangeSerializer(serializers.Serializer):
+    group = MemberGroupField()
+    source_start = serializers.DateField()
+    source_end = serializers.DateField()
+    target_start = serializers.DateField()
+    replace = serializers.BooleanField(default=True)
+
+    def validate(self, data):
+        if data['source_end'] < data['source_start']:
+            raise serializers.ValidationError("source_end no puede ser anterior a source_start.")
+        if (data['source_end'] - data['source_start']).days >= MAX_BULK_DAYS:
+            raise serializers.ValidationError(f"El rango no puede superar {MAX_BULK_DAYS} días.")
+        return data
+
+
+class WeekTemplateEntrySerializer(serializers.ModelSerializer):
+    day = serializers.IntegerField(min_value=0, max_value=WEEK_DAYS - 1)
+    meal = VisibleMealField(required=False, allow_null=True)
+
+    class Meta:
+        model = WeekTemplateEntry
+        fields = ['id', 'day', 'meal_slot', 'meal', 'custom_name', 'is_eating_out', 'target_servings']
+
+    def validate(self, data):
+        validate_plan_choice(data.get('meal'), data.get('is_eating_out'), data.get('custom_name'))
+        return data
+
+
+class WeekTemplateSerializer(serializers.ModelSerializer):
+    """
+    Semana tipo. Al crearla se pueden mandar las comidas (`entries`) o una
+    fecha (`source_start`) para copiar la semana que empieza ese día.
+    """
+    group = MemberGroupField()
+    entries = WeekTemplateEntrySerializer(many=True, required=False)
+    source_start = serializers.DateField(write_only=True, required=False)
+
+    class Meta:
+        model = WeekTemplate
+        fields = ['id', 'group', 'name', 'created_at', 'entries', 'source_start']
+        read_only_fields = ['created_at']
+
+    def validate(self, data):
+        if self.instance is None and 'entries' not in data and 'source_start' not in data:
+            raise serializers.ValidationError("Indica las comidas (entries) o la semana a copiar (source_start).")
+        return data
+
+    @transaction.atomic
+    def create(self, validated_data):
+        entries = validated_data.pop('entries', None)
+        source_start = validated_data.pop('source_start', None)
+        template = WeekTemplate.objects.create(**validated_data)
+        if entries is not None:
+            WeekTemplateEntry.objects.bulk_create([WeekTemplateEntry(template=template, **entry) for entry in entries])
+        else:
+            capture_week(template, source_start)
+        return template
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        entries = validated_data.pop('entries', None)
+        source_start = validated_data.pop('source_start', None)
+        instance = super().update(instance, validated_data)
+        # Las comidas se reemplazan enteras (son pocas: una semana)
+        if entries is not None or source_start is not None:
+            instance.entries.all().delete()
+            if entries is not None:
+                WeekTemplateEntry.objects.bulk_create([WeekTemplateEntry(template=instance, **entry) for entry in entries])
+            else:
+                capture_week(instance, source_start)
+        return instance
+
 
+class CalendarQuerySerializer(serializers.Serializer):
+    """Parámetros de GET /api/plans/calendar/."""
+    group = serializers.IntegerField()
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+
+    def validate(self, data):
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError("end_date no puede ser anterior a start_date.")
+        if (data['end_date'] - data['start_date']).days >= MAX_BULK_DAYS:
+            raise serializers.ValidationError(f"El rango no puede superar {MAX_BULK_DAYS} días.")
         return data
 
+
+class ApplyTemplateSerializer(serializers.Serializer):
+    start_date = serializers.DateField()
+    replace = serializers.BooleanField(default=True)
+
+class RoundedQuantityField(serializers.FloatField):
+    """Las cantidades se guardan exactas (ver planner/shopping.py) y se enseñan redondeadas."""
+
+    def to_representation(self, value):
+        return round(super().to_representation(value), ShoppingListItem.QUANTITY_DECIMALS)
+
+
 class ShoppingListItemSerializer(serializers.ModelSerializer):
+    quantity = RoundedQuantityField(read_only=True)
+
     class Meta:
         model = ShoppingListItem
         fields = ['id', 'name', 'quantity', 'unit', 'is_purchased']
@@ -48,8 +235,8 @@ class ShoppingListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ShoppingList
-        fields = ['id', 'start_date', 'end_date', 'group', 'items', 'created_at']
-        read_only_fields = ['items', 'created_at'] # Items se generan solos
+        fields = ['id', 'start_date', 'end_date', 'group', 'items', 'created_at', 'auto_update', 'revision']
+        read_only_fields = ['items', 'created_at', 'revision'] # Items se generan solos
 
     def create(self, validated_data):
         """
@@ -60,32 +247,10 @@ class ShoppingListSerializer(serializers.ModelSerializer):
         end_date = validated_data['end_date']
         group = validated_data['group']
 
-        # 1. Lógica de Negocio: Buscar planes y calcular ingredientes
-        plans = DailyPlan.objects.filter(
-            group=group,
-            date__range=[start_date, end_date],
-            is_eating_out=False
-        ).select_related('meal')
-
-        # Si no hay planes, podríamos lanzar error, o crear lista vacía.
-        # Aquí creamos lista vacía para no romper el flujo.
-        
-        ingredients_totals = {}
-
-        for plan in plans:
-            # Cálculo de ratio (Raciones deseadas / Raciones base)
-            # Evitamos división por cero si la receta estuviera mal
-            base = plan.meal.base_servings if plan.meal.base_servings > 0 else 1
-            ratio = plan.target_servings / base
-            
-            for recipe_ing in plan.meal.ingredients.all():
-                needed_qty = recipe_ing.quantity * ratio
-                key = (recipe_ing.ingredient.name, recipe_ing.unit)
-                
-                if key in ingredients_totals:
-                    ingredients_totals[key] += needed_qty
-                else:
-                    ingredients_totals[key] = needed_qty
+        # 1. Lógica de Negocio: Sumar ingredientes de los planes del rango.
+        # Se hace en una única consulta agregada (ver planner/shopping.py).
+        # Si no hay planes, creamos lista vacía para no romper el flujo.
+        ingredients_totals = aggregate_ingredients(group, start_date, end_date)
 
         # 2. Guardado Atómico (Todo o nada)
         with transaction.atomic():
@@ -98,11 +263,46 @@ class ShoppingListSerializer(serializers.ModelSerializer):
                 items_to_create.append(ShoppingListItem(
                     shopping_list=shopping_list,
                     name=name,
-                    quantity=round(qty, 2),
+                    quantity=qty,
                     unit=unit
                 ))
             
             # Bulk create es más eficiente que hacer un create por cada ingrediente
             ShoppingListItem.objects.bulk_create(items_to_create)
 
-        return shopping_list
\ No newline at end of file
+        return shopping_list
+
+# --- SINCRONIZACIÓN DE ÍTEMS (ver planner/shopping.py) ---
+
+class ItemChangeSerializer(serializers.Serializer):
+    """Cambios de un ítem: el id y solo los campos que se quieran tocar."""
+    id = serializers.IntegerField()
+    name = serializers.CharField(max_length=100, required=False)
+    quantity = serializers.FloatField(min_value=0, required=False)
+    unit = serializers.CharField(max_length=20, required=False)
+    is_purchased = serializers.BooleanField(required=False)
+
+
+class BulkItemsSerializer(serializers.Serializer):
+    """
+    Muchos ítems de una lista en una petición:
+        {"items": [{"id": 3, "is_purchased": true}, {"id": 4, "quantity": 2}]}
+    La lista va en el contexto ("shopping_list").
+    """
+    items = ItemChangeSerializer(many=True, allow_empty=False, max_length=MAX_BULK_ITEMS)
+
+    def validate_items(self, items):
+        ids = [item['id'] for item in items]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Hay ítems repetidos.")
+        # Todos de golpe, y todos de esta lista
+        found = set(self.context['shopping_list'].items.filter(pk__in=ids).values_list('pk', flat=True))
+        missing = sorted(set(ids) - found)
+        if missing:
+            raise serializers.ValidationError(f"Estos ítems no son de la lista: {missing}")
+        return items
+
+
+class ItemChangesQuerySerializer(serializers.Serializer):
+    # Revisión que ya tiene el cliente (0 = no tiene nada)
+    since = serializers.IntegerField(min_value=0, default=0)
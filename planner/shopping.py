@@ -0,0 +1,374 @@
+from django.db import transaction
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from recipes.cache import get_vectors_by_id, scale_vector
+from .models import DailyPlan, ShoppingList, ShoppingListItem, ShoppingListItemTombstone
+from .realtime import item_payload, send_event
+from sync.log import record_rows
+
+
+def aggregate_ingredients(group, start_date, end_date):
+    """
+    Calcula los ingredientes necesarios de un grupo en un rango de fechas.
+
+    Toda la suma se hace en la base de datos con UNA sola consulta:
+    SUM(quantity * target_servings / base_servings) agrupado por (nombre, unidad).
+    Devuelve un diccionario {(nombre, unidad): cantidad}.
+    """
+    # Evitamos división por cero si la receta estuviera mal (base_servings = 0)
+    ratio_qty = (
+        F('meal__ingredients__quantity') * F('target_servings')
+        / Greatest(F('meal__base_servings'), 1)
+    )
+
+    rows = (
+        DailyPlan.objects
+        .filter(
+            group=group,
+            date__range=[start_date, end_date],
+            is_eating_out=False,
+            meal__ingredients__isnull=False,
+        )
+        .order_by()  # Sin ordenación, si no Django la mete en el GROUP BY
+        .values(
+            ingredient_name=F('meal__ingredients__ingredient__name'),
+            ingredient_unit=F('meal__ingredients__unit'),
+        )
+        .annotate(total=Sum(ratio_qty, output_field=FloatField()))
+    )
+
+    return {
+        (row['ingredient_name'], row['ingredient_unit']): row['total']
+        for row in rows
+    }
+
+
+# --- LISTAS AUTO-MANTENIDAS ---
+# Campos de un DailyPlan que influyen en la lista de la compra
+PLAN_STATE_FIELDS = ('group_id', 'date', 'meal_id', 'target_servings', 'is_eating_out')
+
+# Las cantidades se guardan sin redondear (se redondean al enseñarlas, ver
+# ShoppingListItem.QUANTITY_DECIMALS) para que sumar y restar deltas dé lo mismo que
+# aggregate_ingredients. Por debajo de esto lo que queda es ruido de coma
+# flotante de las restas: el ítem ya no hace falta.
+EMPTY_QUANTITY = 1e-6
+
+
+def plan_state(plan, values=None):
+    """
+    Foto de los campos de un plan que afectan a la compra.
+    Si se pasa `values` (ej: los valores cargados de la BD) se usan esos.
+    """
+    if values is None:
+        values = {field: getattr(plan, field) for field in PLAN_STATE_FIELDS}
+    return tuple(values[field] for field in PLAN_STATE_FIELDS)
+
+
+def plan_contribution(state, vectors=None):
+    """
+    Ingredientes que aporta UN plan: {(nombre, unidad): cantidad}.
+    `vectors` ({meal_id: vector}) evita ir a la caché receta a receta.
+    """
+    group_id, plan_date, meal_id, target_servings, is_eating_out = state
+    if is_eating_out or not meal_id:
+        return {}
+
+    # Sale de la caché de ingredientes por ración (recipes/cache.py)
+    if vectors is None:
+        vectors = get_vectors_by_id([meal_id])
+    contribution = {}
+    for entry, quantity in scale_vector(vectors.get(meal_id, ()), target_servings):
+        key = (entry.name, entry.unit)
+        contribution[key] = contribution.get(key, 0) + quantity
+    return contribution
+
+
+def sync_auto_lists(old_state, new_state):
+    """
+    Ajusta por diferencia las listas auto-mantenidas afectadas por un cambio
+    en un plan. `old_state`/`new_state` son fotos de `plan_state` (None si el
+    plan se acaba de crear o se ha borrado).
+    """
+    sync_auto_lists_many([(old_state, new_state)])
+
+
+def sync_auto_lists_many(changes):
+    """
+    Igual que `sync_auto_lists` pero para muchos cambios a la vez (operaciones
+    en bloque): una consulta para las listas, una para los vectores de las
+    recetas y un único ajuste de los ítems.
+    """
+    changes = [(old_state, new_state) for old_state, new_state in changes if old_state != new_state]
+    states = [
+        (state, sign)
+        for old_state, new_state in changes
+        for state, sign in ((old_state, -1), (new_state, 1))
+        if state is not None
+    ]
+    if not states:
+        return
+
+    dates = [state[1] for state, sign in states]
+    auto_lists = list(ShoppingList.objects.filter(
+        group_id__in={state[0] for state, sign in states},
+        auto_update=True,
+        start_date__lte=max(dates),
+        end_date__gte=min(dates),
+    ).values_list('id', 'group_id', 'start_date', 'end_date'))
+    if not auto_lists:
+        return
+
+    vectors = get_vectors_by_id({
+        state[2] for state, sign in states if state[2] and not state[4]
+    })
+
+    deltas = {}  # {shopping_list_id: {(nombre, unidad): delta}}
+    for state, sign in states:
+        group_id, plan_date = state[0], state[1]
+        list_ids = [
+            list_id for list_id, list_group_id, start_date, end_date in auto_lists
+            if list_group_id == group_id and start_date <= plan_date <= end_date
+        ]
+        if not list_ids:
+            continue
+
+        for key, qty in plan_contribution(state, vectors).items():
+            for list_id in list_ids:
+                list_deltas = deltas.setdefault(list_id, {})
+                list_deltas[key] = list_deltas.get(key, 0) + sign * qty
+
+    apply_item_deltas(deltas, {list_id: group_id for list_id, group_id, start_date, end_date in auto_lists})
+
+
+def meals_changed_in_auto_lists(meal_ids, previous_vector):
+    """
+    Han cambiado los vectores de las recetas `meal_ids` (ingredientes,
+    raciones, nombres): lo que aportan sus planes a las listas
+    auto-mantenidas pasa del vector de antes al actual.
+    `previous_vector(meal_id, vector)` devuelve el de antes a partir del actual.
+    """
+    plans = DailyPlan.objects.filter(meal_id__in=meal_ids, is_eating_out=False)
+    auto_lists = list(ShoppingList.objects.filter(
+        auto_update=True, group_id__in=plans.values('group_id'),
+    ).values_list('id', 'group_id', 'start_date', 'end_date'))
+    if not auto_lists:
+        return
+
+    states = list(plans.filter(
+        group_id__in={group_id for list_id, group_id, start_date, end_date in auto_lists},
+        date__range=[min(row[2] for row in auto_lists), max(row[3] for row in auto_lists)],
+    ).values_list(*PLAN_STATE_FIELDS))
+    vectors = get_vectors_by_id({state[2] for state in states})
+
+    deltas = {}
+    for group_id, plan_date, meal_id, target_servings, is_eating_out in states:
+        list_ids = [
+            list_id for list_id, list_group_id, start_date, end_date in auto_lists
+            if list_group_id == group_id and start_date <= plan_date <= end_date
+        ]
+        if not list_ids:
+            continue
+
+        vector = vectors.get(meal_id, ())
+        contribution = {}
+        for entries, sign in ((previous_vector(meal_id, vector), -1), (vector, 1)):
+            for entry, qty in scale_vector(entries, target_servings):
+                key = (entry.name, entry.unit)
+                contribution[key] = contribution.get(key, 0) + sign * qty
+        for key, qty in contribution.items():
+            for list_id in list_ids:
+                list_deltas = deltas.setdefault(list_id, {})
+                list_deltas[key] = list_deltas.get(key, 0) + qty
+
+    apply_item_deltas(deltas, {list_id: group_id for list_id, group_id, start_date, end_date in auto_lists})
+
+
+def rename_in_auto_lists(ingredient_id, previous_name, meal_ids):
+    """
+    Un ingrediente de las recetas `meal_ids` se llamaba `previous_name`: lo
+    que aportan sus planes se mueve del ítem con el nombre viejo al del nuevo
+    (los vectores ya lo tienen).
+    """
+    def previous_vector(meal_id, vector):
+        return tuple(
+            entry._replace(name=previous_name) if entry.ingredient_id == ingredient_id else entry
+            for entry in vector
+        )
+
+    meals_changed_in_auto_lists(meal_ids, previous_vector)
+
+
+def apply_item_deltas(deltas, list_groups):
+    """
+    Aplica {lista: {(nombre, unidad): delta}} sobre los ShoppingListItem.
+    Solo toca los ítems afectados: sube/baja cantidades, crea los que faltan
+    y borra los que se quedan a cero. `list_groups` ({lista: grupo}) indica a
+    qué grupo avisar de los cambios.
+    """
+    # Quitamos los deltas nulos (ej: se cambió el plan de franja horaria)
+    deltas = {
+        list_id: {key: delta for key, delta in list_deltas.items() if abs(delta) > 1e-9}
+        for list_id, list_deltas in deltas.items()
+    }
+    deltas = {list_id: list_deltas for list_id, list_deltas in deltas.items() if list_deltas}
+    if not deltas:
+        return
+
+    names = {name for list_deltas in deltas.values() for name, unit in list_deltas}
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Primero la revisión: bloquea las listas hasta el final
+        revisions = bump_revisions(list(deltas), now)
+        existing = {}
+        items = ShoppingListItem.objects.select_for_update().filter(
+            shopping_list_id__in=list(deltas),
+            name__in=names,
+        )
+        for item in items:
+            existing.setdefault((item.shopping_list_id, item.name, item.unit), item)
+
+        to_update, to_create, to_delete = [], [], []
+        for list_id, list_deltas in deltas.items():
+            for (name, unit), delta in list_deltas.items():
+                item = existing.get((list_id, name, unit))
+                if item is None:
+                    if delta > EMPTY_QUANTITY:
+                        to_create.append(ShoppingListItem(
+                            shopping_list_id=list_id,
+                            name=name,
+                            quantity=delta,
+                            unit=unit,
+                            revision=revisions[list_id],
+                        ))
+                    continue
+
+                item.quantity += delta
+                item.updated_at = now
+                item.revision = revisions[list_id]
+                if item.quantity < EMPTY_QUANTITY:
+                    to_delete.append(item)
+                else:
+                    to_update.append(item)
+
+        if to_update:
+            ShoppingListItem.objects.bulk_update(to_update, ['quantity', 'updated_at', 'revision'])
+        if to_create:
+            ShoppingListItem.objects.bulk_create(to_create)
+        if to_delete:
+            delete_items(to_delete)
+
+        # Un evento por lista con los ítems que han cambiado
+        changed = {}
+        for item in to_update + to_create:
+            changed.setdefault(item.shopping_list_id, ([], []))[0].append(item_payload(item))
+        for item in to_delete:
+            changed.setdefault(item.shopping_list_id, ([], []))[1].append(item.pk)
+        for list_id, (items, deleted) in changed.items():
+            send_items_event(list_groups[list_id], list_id, revisions[list_id], items, deleted)
+
+
+# --- SINCRONIZACIÓN POR DIFERENCIAS ---
+# Campos de un ítem que se pueden editar desde la API (ver update_items)
+ITEM_EDITABLE_FIELDS = ('name', 'quantity', 'unit', 'is_purchased')
+
+
+def bump_revisions(list_ids, now):
+    """
+    Sube en uno la revisión (y el updated_at) de las listas y devuelve
+    {lista: nueva revisión}. Va dentro de la transacción de la escritura: el
+    UPDATE deja las filas bloqueadas, así que dos escrituras a la vez en la
+    misma lista no pueden acabar con la misma revisión.
+    """
+    ShoppingList.objects.filter(pk__in=list_ids).update(revision=F('revision') + 1, updated_at=now)
+    rows = list(ShoppingList.objects.filter(pk__in=list_ids).values_list('id', 'revision', 'group_id'))
+    # La lista se sincroniza con sus ítems dentro
+    record_rows('shopping_lists', ((list_id, None, group_id) for list_id, revision, group_id in rows))
+    return {list_id: revision for list_id, revision, group_id in rows}
+
+
+def delete_items(items):
+    """Borra ítems (con su `revision` ya puesta) dejando el rastro para los clientes."""
+    ShoppingListItemTombstone.objects.bulk_create([
+        ShoppingListItemTombstone(shopping_list_id=item.shopping_list_id, item_id=item.pk, revision=item.revision)
+        for item in items
+    ])
+    ShoppingListItem.objects.filter(pk__in=[item.pk for item in items]).delete()
+
+
+def send_items_event(group_id, list_id, revision, items, deleted=()):
+    send_event(group_id, {
+        'type': 'shopping_items', 'list': list_id, 'revision': revision,
+        'items': items, 'deleted': list(deleted),
+    })
+
+
+def update_items(shopping_list, changes):
+    """
+    Edita muchos ítems de una lista de una vez (ej: marcar lo que ya está en
+    el carro). `changes` es [{"id": 3, "is_purchased": True}, ...] con ítems
+    de la lista (ya comprobado en el serializer); solo se escriben los campos
+    que cambian, con UN bulk_update. Un ítem puede haberse borrado después de
+    comprobarlo (ej: la lista auto-mantenida lo quita porque otro miembro ha
+    cambiado un plan): esos se saltan y se devuelven aparte.
+    Devuelve (revisión de la lista, ítems modificados, ids que ya no existen).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        items = ShoppingListItem.objects.select_for_update().filter(
+            shopping_list=shopping_list, pk__in=[change['id'] for change in changes],
+        ).in_bulk()
+
+        changed, missing = [], []
+        for change in changes:
+            item = items.get(change['id'])
+            if item is None:
+                missing.append(change['id'])
+                continue
+            fields = [field for field in ITEM_EDITABLE_FIELDS if field in change and getattr(item, field) != change[field]]
+            if not fields:
+                continue
+            for field in fields:
+                setattr(item, field, change[field])
+            changed.append(item)
+        if not changed:
+            return shopping_list.revision, [], missing
+
+        revision = bump_revisions([shopping_list.pk], now)[shopping_list.pk]
+        for item in changed:
+            item.revision = revision
+            item.updated_at = now
+        ShoppingListItem.objects.bulk_update(changed, ITEM_EDITABLE_FIELDS + ('revision', 'updated_at'))
+        send_items_event(shopping_list.group_id, shopping_list.pk, revision, [item_payload(item) for item in changed])
+
+    shopping_list.revision = revision
+    return revision, changed, missing
+
+
+def item_changes(shopping_list, since=0):
+    """
+    Lo que ha cambiado en los ítems de una lista después de la revisión `since`:
+        {"revision": 12, "reset": false, "items": [...], "deleted": [7, 8]}
+    Con since=0 (o uno que no cuadra con la lista) se devuelven todos los
+    ítems y "reset": true, para que el cliente reemplace lo que tenga.
+    El cliente guarda `revision` y la manda como `since` la próxima vez.
+    """
+    # La revisión se lee ANTES que los ítems: si entra una escritura entre
+    # medias, como mucho se repite algún ítem en la siguiente llamada
+    revision = ShoppingList.objects.filter(pk=shopping_list.pk).values_list('revision', flat=True).get()
+    reset = since <= 0 or since > revision
+
+    items = ShoppingListItem.objects.filter(shopping_list=shopping_list).order_by('id')
+    deleted = []
+    if not reset:
+        items = items.filter(revision__gt=since)
+        deleted = list(ShoppingListItemTombstone.objects.filter(
+            shopping_list=shopping_list, revision__gt=since,
+        ).order_by('item_id').values_list('item_id', flat=True))
+    return {
+        'revision': revision,
+        'reset': reset,
+        'items': [item_payload(item) for item in items],
+        'deleted': deleted,
+    }
@@ -0,0 +1,175 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+from recipes.cache import meal_vector_changed
+from recipes.images import variants_ready
+from recipes.models import Meal
+from recipes.signals import ingredient_name_changed
+from users.models import PlanningGroup
+from .models import DailyPlan, ShoppingList
+from .realtime import send_event
+from sync.log import record_rows
+from .shopping import PLAN_STATE_FIELDS, meals_changed_in_auto_lists, plan_state, rename_in_auto_lists, sync_auto_lists_many
+
+# Se lanza tras cualquier cambio en DailyPlan, sea de un plan (post_save /
+# post_delete) o de una operación en bloque (ver planner/bulk.py), dentro de
+# la misma transacción. Argumentos:
+# - changes: lista de (estado anterior, estado nuevo) de `plan_state`
+#   (None si el plan se ha creado / borrado). Pueden ser iguales si solo
+#   cambió algo que no está en el estado (franja, nombre del sitio...).
+plans_changed = Signal()
+
+_bulk_operation = ContextVar('planner_bulk_operation', default=False)
+
+
+@contextmanager
+def bulk_operation():
+    """
+    Mientras dura, las señales por instancia de DailyPlan (ej: las del
+    borrado en bloque) no hacen nada: quien hace la operación manda
+    `plans_changed` con todos los cambios al final.
+    """
+    token = _bulk_operation.set(True)
+    try:
+        yield
+    finally:
+        _bulk_operation.reset(token)
+
+
+def in_bulk_operation():
+    return _bulk_operation.get()
+
+
+def previous_state(plan):
+    """
+    Estado del plan antes de guardarlo (None si aún no está en la BD), a
+    partir de lo que se cargó de la BD. Hay que llamarla ANTES de guardar.
+    """
+    if plan.pk is None:
+        return None
+    loaded = getattr(plan, '_loaded_values', None)
+    if loaded is None or not all(field in loaded for field in PLAN_STATE_FIELDS):
+        # No viene de la BD (ej: DailyPlan(pk=...)) o se cargó con
+        # .only()/.defer(): lo pedimos a la BD
+        loaded = DailyPlan.objects.filter(pk=plan.pk).values(*PLAN_STATE_FIELDS).first()
+        if loaded is None:
+            return None
+    return plan_state(plan, loaded)
+
+
+@receiver(pre_save, sender=DailyPlan)
+def plan_saving(sender, instance, raw=False, **kwargs):
+    if raw or in_bulk_operation():
+        return
+    instance._previous_state = previous_state(instance)
+
+
+@receiver(post_save, sender=DailyPlan)
+def plan_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or in_bulk_operation():
+        return
+    old_state = None if created else instance._previous_state
+    new_state = plan_state(instance)
+    # A partir de ahora, el estado "cargado" es el recién guardado
+    instance._loaded_values = dict(zip(PLAN_STATE_FIELDS, new_state))
+    # Aunque el estado sea el mismo (ej: solo cambió la franja) se avisa:
+    # a la compra no le afecta, pero al calendario sí
+    plans_changed.send(sender=DailyPlan, changes=[(old_state, new_state)])
+
+
+@receiver(post_delete, sender=DailyPlan)
+def plan_deleted(sender, instance, origin=None, **kwargs):
+    if in_bulk_operation() or instance.pk in getattr(origin, '_planner_removed_plans', ()):
+        return
+    plans_changed.send(sender=DailyPlan, changes=[(plan_state(instance), None)])
+
+
+@receiver(pre_delete, sender=Meal)
+def meal_deleting(sender, instance, origin=None, **kwargs):
+    # En el borrado en cascada los ingredientes de la receta pueden irse antes
+    # que sus planes, y entonces no se sabría qué restar de las listas. Se
+    # quitan aquí, con la receta aún entera, y `plan_deleted` se los salta.
+    if origin is None:
+        return
+    plans = list(DailyPlan.objects.filter(meal=instance).values_list('pk', *PLAN_STATE_FIELDS))
+    if not plans:
+        return
+    removed = getattr(origin, '_planner_removed_plans', set())
+    removed.update(row[0] for row in plans)
+    origin._planner_removed_plans = removed
+    plans_changed.send(sender=DailyPlan, changes=[(tuple(row[1:]), None) for row in plans])
+
+
+@receiver(plans_changed)
+def update_auto_lists(sender, changes, **kwargs):
+    sync_auto_lists_many(changes)
+
+
+@receiver(plans_changed)
+def bump_group_versions(sender, changes, **kwargs):
+    PlanningGroup.touch(state[0] for change in changes for state in change if state is not None)
+
+
+@receiver(plans_changed)
+def broadcast_plans(sender, changes, **kwargs):
+    # A los miembros conectados solo les decimos qué días recargar
+    dates = {}
+    for change in changes:
+        for state in change:
+            if state is not None:
+                dates.setdefault(state[0], set()).add(state[1])
+    for group_id, group_dates in dates.items():
+        send_event(group_id, {'type': 'plans', 'dates': sorted(day.isoformat() for day in group_dates)})
+
+
+@receiver(post_save, sender=ShoppingList)
+def shopping_list_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        send_event(instance.group_id, {'type': 'shopping_list', 'op': 'saved', 'id': instance.pk})
+
+
+@receiver(post_delete, sender=ShoppingList)
+def shopping_list_deleted(sender, instance, **kwargs):
+    send_event(instance.group_id, {'type': 'shopping_list', 'op': 'deleted', 'id': instance.pk})
+
+
+@receiver(post_save, sender=Meal)
+def meal_saved(sender, instance, created, raw=False, **kwargs):
+    # El calendario muestra el nombre y la miniatura de la receta
+    if not created and not raw:
+        touch_groups_planning([instance.pk])
+
+
+@receiver(ingredient_name_changed)
+def ingredient_renamed_in_lists(sender, ingredient, previous_name, meal_ids, **kwargs):
+    # Sin el nombre anterior no sabemos qué ítems mover
+    if previous_name is not None:
+        rename_in_auto_lists(ingredient.pk, previous_name, meal_ids)
+
+
+@receiver(meal_vector_changed)
+def meal_changed_in_lists(sender, meal, previous, **kwargs):
+    # Se han editado los ingredientes o las raciones de la receta
+    meals_changed_in_auto_lists([meal.pk], lambda meal_id, vector: previous)
+
+
+@receiver(variants_ready)
+def meal_variants_ready(sender, meal_id, **kwargs):
+    touch_groups_planning([meal_id])
+
+
+def touch_groups_planning(meal_ids):
+    """
+    Sube la versión de los grupos que tienen planificada alguna de las recetas
+    y les avisa por el canal de tiempo real.
+    """
+    group_ids = list(
+        DailyPlan.objects.filter(meal_id__in=meal_ids).order_by().values_list('group_id', flat=True).distinct()
+    )
+    PlanningGroup.touch(group_ids)
+    for group_id in group_ids:
+        send_event(group_id, {'type': 'meals', 'ids': sorted(meal_ids)})
+    # Los miembros ven la receta aunque no sea suya (sale en sus planes)
+    record_rows('meals', ((meal_id, None, group_id) for meal_id in meal_ids for group_id in group_ids))
@@ -1,3 +1,799 @@
-from django.test import TestCase
+import asyncio
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from meal_backend.testing import QueryBudgetMixin
+from recipes.cache import meal_vectors
+from recipes.models import Ingredient, Meal, RecipeIngredient
+from sync.models import ChangeLogEntry
+from users.models import PlanningGroup
+from .models import DailyPlan, ShoppingList, ShoppingListItem, WeekTemplate, WeekTemplateEntry
+from .bulk import apply_template, copy_range, write_plans
+from .realtime import MemoryBroker
+from .shopping import aggregate_ingredients, update_items
+
+
+class DailyPlanQueryBudgetTests(APITestCase):
+    """
+    El calendario (/api/plans/) debe costar siempre las mismas consultas,
+    tenga 1 plan o 100.
+    """
+    # huella del ETag + planes + recetas (con dueño y "is_saved_by_user") + ingredientes
+    QUERY_BUDGET = 4
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        self.partner = User.objects.create_user(username='luis', password='x')
+        self.group = PlanningGroup.objects.create(name='Casa')
+        self.group.members.add(self.user, self.partner)
+
+        salt = Ingredient.objects.create(name='Sal')
+        self.meals = []
+        for owner in (self.user, self.partner):
+            for i in range(3):
+                meal = Meal.objects.create(name=f'Receta {i}', user=owner)
+                private = Ingredient.objects.create(name=f'Privado {i}', user=owner)
+                RecipeIngredient.objects.create(meal=meal, ingredient=salt, quantity=1, unit='g')
+                RecipeIngredient.objects.create(meal=meal, ingredient=private, quantity=100, unit='g')
+                self.meals.append(meal)
+
+        # Una copia guardada para que "is_saved_by_user" tenga ambos valores
+        Meal.objects.create(name='Copia', user=self.user, source_meal=self.meals[-1])
+
+        self.client.force_authenticate(self.user)
+
+    def create_plans(self, days):
+        start = date(2026, 1, 5)
+        slots = [slot for slot, _ in DailyPlan.SLOT_CHOICES]
+        DailyPlan.objects.bulk_create(
+            DailyPlan(
+                group=self.group,
+                date=start + timedelta(days=d),
+                meal_slot=slot,
+                meal=self.meals[(d + s) % len(self.meals)],
+            )
+            for d in range(days)
+            for s, slot in enumerate(slots)
+        )
+
+    def test_list_runs_in_constant_queries(self):
+        for days in (1, 25):
+            DailyPlan.objects.all().delete()
+            self.create_plans(days)
+            with self.assertNumQueries(self.QUERY_BUDGET):
+                response = self.client.get('/api/plans/', {'group': self.group.id})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data), days * len(DailyPlan.SLOT_CHOICES))
+
+    def test_is_saved_by_user_is_annotated(self):
+        self.create_plans(2)
+        response = self.client.get('/api/plans/', {'group': self.group.id})
+        saved = {plan['meal']: plan['meal_details']['is_saved_by_user'] for plan in response.data}
+
+        for meal in self.meals:
+            if meal.id not in saved:
+                continue
+            expected = meal.user == self.user or meal == self.meals[-1]
+            self.assertEqual(saved[meal.id], expected)
+
+
+class PlannerEndpointBudgetTests(QueryBudgetMixin, APITestCase):
+    """
+    Consultas máximas de cada acción del planificador, y que ninguna lectura
+    recorra una tabla entera. Hay varios planes, recetas, ítems y miembros
+    para que un N+1 se note.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        self.partner = User.objects.create_user(username='luis', password='x')
+        self.group = PlanningGroup.objects.create(name='Casa')
+        self.group.members.add(self.user, self.partner)
+        # Otro grupo con datos que no se deben leer
+        other = PlanningGroup.objects.create(name='Otra casa')
+        other.members.add(self.partner)
+
+        salt = Ingredient.objects.create(name='Sal')
+        self.meals = []
+        for owner in (self.user, self.partner):
+            for i in range(3):
+                meal = Meal.objects.create(name=f'Receta {i}', user=owner, base_servings=2)
+                rice = Ingredient.objects.create(name=f'Arroz {i}', user=owner)
+                RecipeIngredient.objects.create(meal=meal, ingredient=salt, quantity=1, unit='g')
+                RecipeIngredient.objects.create(meal=meal, ingredient=rice, quantity=100, unit='g')
+                self.meals.append(meal)
+
+        self.start = date(2026, 1, 5)
+        for group in (self.group, other):
+            DailyPlan.objects.bulk_create(
+                DailyPlan(group=group, date=self.start + timedelta(days=d), meal_slot=slot, meal=self.meals[(d + s) % 6])
+                for d in range(7)
+                for s, (slot, _) in enumerate(DailyPlan.SLOT_CHOICES)
+            )
+        self.client.force_authenticate(self.user)
+        self.generate_list(self.group)
+        self.shopping_list = self.generate_list(self.group)
+        self.client.force_authenticate(self.partner)
+        self.generate_list(other)
+        self.client.force_authenticate(self.user)
+
+        self.template = WeekTemplate.objects.create(group=self.group, name='Semana tipo')
+        WeekTemplateEntry.objects.bulk_create(
+            WeekTemplateEntry(template=self.template, day=d, meal_slot='LUNCH', meal=self.meals[d % 6])
+            for d in range(7)
+        )
+
+    def generate_list(self, group):
+        response = self.client.post('/api/shopping-lists/generate/', {
+            'group': group.id, 'start_date': '2026-01-05', 'end_date': '2026-01-11',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return ShoppingList.objects.get(pk=response.data['id'])
+
+    def request(self, budget, method, url, data=None, status=200):
+        # Lo que se hace al confirmar (eventos de tiempo real...) también cuenta
+        with self.assertQueryBudget(budget), self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, status, response.content)
+        return response
+
+    def week(self, **extra):
+        return {'group': self.group.id, 'start_date': '2026-01-05', 'end_date': '2026-01-11', **extra}
+
+    def test_plan_reads(self):
+        self.request(4, 'get', '/api/plans/', self.week())
+        self.request(2, 'get', '/api/plans/calendar/', self.week())
+        plan = DailyPlan.objects.filter(group=self.group).first()
+        self.request(4, 'get', f'/api/plans/{plan.id}/')
+
+    def test_plan_writes(self):
+        plan = DailyPlan.objects.filter(group=self.group).first()
+        self.request(10, 'post', '/api/plans/', {
+            'group': self.group.id, 'date': '2026-02-02', 'meal': self.meals[0].id, 'meal_slot': 'DINNER',
+        }, status=201)
+        self.request(7, 'patch', f'/api/plans/{plan.id}/', {'target_servings': 6})
+        self.request(7, 'delete', f'/api/plans/{plan.id}/', status=204)
+
+    def test_plan_bulk_operations(self):
+        plans = [
+            {'date': (self.start + timedelta(days=d)).isoformat(), 'meal_slot': 'LUNCH', 'meal': self.meals[d % 6].id}
+            for d in range(7)
+        ]
+        self.request(15, 'post', '/api/plans/bulk/', self.week(plans=plans))
+        self.request(12, 'post', '/api/plans/copy/', {
+            'group': self.group.id, 'source_start': '2026-01-05', 'source_end': '2026-01-11',
+            'target_start': '2026-01-12',
+        })
+
+    def test_week_templates(self):
+        self.request(2, 'get', '/api/week-templates/', {'group': self.group.id})
+        self.request(8, 'post', '/api/week-templates/', {
+            'group': self.group.id, 'name': 'Copia', 'source_start': '2026-01-05',
+        }, status=201)
+        self.request(14, 'post', f'/api/week-templates/{self.template.id}/apply/', {'start_date': '2026-01-19'})
+
+    def test_shopping_list_reads(self):
+        self.request(3, 'get', '/api/shopping-lists/')
+        self.request(3, 'get', f'/api/shopping-lists/{self.shopping_list.id}/')
+        self.request(3, 'get', f'/api/shopping-lists/{self.shopping_list.id}/changes/', {'since': 0})
+
+    def test_shopping_list_writes(self):
+        items = list(self.shopping_list.items.values_list('id', flat=True))
+        self.request(9, 'post', f'/api/shopping-lists/{self.shopping_list.id}/items/bulk/', {
+            'items': [{'id': item_id, 'is_purchased': True} for item_id in items],
+        })
+        self.request(8, 'post', '/api/shopping-lists/generate/', self.week(), status=201)
+
+
+class AutoListTests(APITestCase):
+    """
+    Una lista auto-mantenida tiene que quedar igual que si se generara de
+    nuevo (aggregate_ingredients) después de cualquier cambio en los planes.
+    """
+
+    def setUp(self):
+        # Cada test deshace su transacción y SQLite reutiliza los id: sin
+        # esto la LRU devolvería el vector de la receta de otro test
+        meal_vectors.clear()
+        self.user = User.objects.create_user(username='ana', password='x')
+        self.group = PlanningGroup.objects.create(name='Casa')
+        self.group.members.add(self.user)
+        # 3 huevos para 8: una ración son 0,375 (redondear cada paso se desvía)
+        self.tortilla = Meal.objects.create(name='Tortilla', base_servings=8, user=self.user)
+        RecipeIngredient.objects.create(meal=self.tortilla, ingredient=Ingredient.objects.create(name='Huevo'),
+                                        quantity=3, unit='unidades')
+        # Una ración de paella lleva 0,0025 g de azafrán: también tiene que salir
+        self.paella = Meal.objects.create(name='Paella', base_servings=4, user=self.user)
+        RecipeIngredient.objects.create(meal=self.paella, ingredient=Ingredient.objects.create(name='Azafrán'),
+                                        quantity=0.01, unit='g')
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/shopping-lists/generate/', {
+            'group': self.group.id, 'start_date': '2026-01-05', 'end_date': '2026-01-11', 'auto_update': True,
+        }, format='json')
+        self.shopping_list = ShoppingList.objects.get(pk=response.data['id'])
+
+    def request(self, method, url, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 300, response.content)
+        return response
+
+    def add_plan(self, meal, day, slot, servings):
+        return self.request('post', '/api/plans/', {
+            'group': self.group.id, 'date': f'2026-01-0{day}', 'meal_slot': slot,
+            'meal': meal.id, 'target_servings': servings,
+        }).data['id']
+
+    def assertMatchesGenerated(self):
+        items = {(item.name, item.unit): item.quantity for item in self.shopping_list.items.all()}
+        expected = aggregate_ingredients(self.group, date(2026, 1, 5), date(2026, 1, 11))
+        self.assertEqual(set(items), set(expected))
+        for key, quantity in expected.items():
+            self.assertAlmostEqual(items[key], quantity, places=9, msg=key)
+
+    def shown(self):
+        response = self.client.get(f'/api/shopping-lists/{self.shopping_list.id}/')
+        return {item['name']: item['quantity'] for item in response.data['items']}
+
+    def test_add_edit_delete_round_trip(self):
+        lunch = self.add_plan(self.tortilla, 5, 'LUNCH', 1)
+        dinner = self.add_plan(self.tortilla, 6, 'DINNER', 1)
+        self.assertMatchesGenerated()
+        self.assertEqual(self.shown(), {'Huevo': 0.75})
+
+        self.request('patch', f'/api/plans/{lunch}/', {'target_servings': 3})
+        self.assertMatchesGenerated()
+        self.assertEqual(self.shown(), {'Huevo': 1.5})
+
+        self.request('patch', f'/api/plans/{dinner}/', {'meal': self.paella.id})
+        self.assertMatchesGenerated()
+
+        self.request('delete', f'/api/plans/{lunch}/')
+        self.request('delete', f'/api/plans/{dinner}/')
+        self.assertFalse(self.shopping_list.items.exists())
+
+    def test_small_quantities_are_kept(self):
+        plan = self.add_plan(self.paella, 7, 'LUNCH', 1)
+        self.assertMatchesGenerated()
+        self.assertEqual(self.shown(), {'Azafrán': 0.0})
+
+        self.request('delete', f'/api/plans/{plan}/')
+        self.assertFalse(self.shopping_list.items.exists())
+
+    def test_ingredient_rename(self):
+        plan = self.add_plan(self.tortilla, 5, 'LUNCH', 2)
+        self.client.get(f'/api/meals/{self.tortilla.id}/scaled/', {'servings': 2})  # Vector en caché
+        egg = Ingredient.objects.get(name='Huevo')
+        egg.name = 'Huevo campero'
+        with self.captureOnCommitCallbacks(execute=True):
+            egg.save()
+        self.assertMatchesGenerated()
+
+        response = self.client.get(f'/api/meals/{self.tortilla.id}/scaled/', {'servings': 2})
+        self.assertEqual([row['ingredient_name'] for row in response.data['ingredients']], ['Huevo campero'])
+
+        self.request('patch', f'/api/plans/{plan}/', {'target_servings': 3})
+        self.assertMatchesGenerated()
+        self.request('delete', f'/api/plans/{plan}/')
+        self.assertFalse(self.shopping_list.items.exists())
+
+    def test_bulk_week_round_trip(self):
+        plans = [
+            {'date': f'2026-01-0{5 + d}', 'meal_slot': 'LUNCH', 'meal': self.tortilla.id, 'target_servings': 1}
+            for d in range(5)
+        ]
+        self.request('post', '/api/plans/bulk/', {
+            'group': self.group.id, 'start_date': '2026-01-05', 'end_date': '2026-01-11', 'plans': plans,
+        })
+        self.assertMatchesGenerated()
+        self.assertEqual(self.shown(), {'Huevo': 1.88})
+
+        self.request('post', '/api/plans/bulk/', {
+            'group': self.group.id, 'start_date': '2026-01-05', 'end_date': '2026-01-11', 'plans': [],
+        })
+        self.assertFalse(self.shopping_list.items.exists())
+
+    def test_save_without_loading(self):
+        plan = DailyPlan.objects.get(pk=self.add_plan(self.tortilla, 5, 'LUNCH', 8))
+        # Una instancia que no viene de la BD, y otra cargada a medias
+        with self.captureOnCommitCallbacks(execute=True):
+            DailyPlan(pk=plan.pk, group=self.group, date=plan.date, meal_slot='LUNCH',
+                      meal=self.tortilla, target_servings=4).save()
+        self.assertMatchesGenerated()
+        self.assertEqual(self.shown(), {'Huevo': 1.5})
+
+        partial = DailyPlan.objects.only('id', 'target_servings').get(pk=plan.pk)
+        partial.target_servings = 16
+        with self.captureOnCommitCallbacks(execute=True):
+            partial.save(update_fields=['target_servings'])
+        self.assertMatchesGenerated()
+        self.assertEqual(self.shown(), {'Huevo': 6.0})
+
+    def test_recipe_edit(self):
+        rice = Ingredient.objects.create(name='Arroz')
+        risotto = Meal.objects.create(name='Risotto', base_servings=2, user=self.user)
+        RecipeIngredient.objects.create(meal=risotto, ingredient=rice, quantity=100, unit='g')
+        lunch = self.add_plan(risotto, 5, 'LUNCH', 2)
+        self.add_plan(risotto, 6, 'LUNCH', 2)
+        self.assertEqual(self.shown(), {'Arroz': 200})
+
+        def edit(quantity, servings=2):
+            self.request('put', f'/api/meals/{risotto.id}/', {
+                'name': 'Risotto', 'base_servings': servings,
+                'ingredients': [{'ingredient': rice.id, 'quantity': quantity, 'unit': 'g'}],
+            })
+
+        edit(300)
+        self.assertMatchesGenerated()
+        self.assertEqual(self.shown(), {'Arroz': 600})
+        edit(300, servings=4)
+        self.assertMatchesGenerated()
+        self.assertEqual(self.shown(), {'Arroz': 300})
+
+        # Al borrar un plan se resta lo que aporta ahora, no lo de antes
+        self.request('delete', f'/api/plans/{lunch}/')
+        self.assertMatchesGenerated()
+        self.assertEqual(self.shown(), {'Arroz': 150})
+
+    def test_recipe_deletion(self):
+        self.add_plan(self.tortilla, 5, 'LUNCH', 8)
+        self.add_plan(self.tortilla, 6, 'DINNER', 8)
+        self.add_plan(self.paella, 7, 'LUNCH', 400)
+        # Sin el vector en caché (ej: otro proceso): hay que leerlo antes de la cascada
+        meal_vectors.clear()
+        self.request('delete', f'/api/meals/{self.tortilla.id}/')
+        self.assertMatchesGenerated()
+        self.assertEqual(self.shown(), {'Azafrán': 1.0})
+
+    def test_recipe_owner_deletion(self):
+        # Al borrar la cuenta, la cascada quita los ingredientes privados y las
+        # recetas antes que los planes del grupo que las usan
+        owner = User.objects.create_user(username='luis', password='x')
+        self.group.members.add(owner)
+        salmorejo = Meal.objects.create(name='Salmorejo', base_servings=4, user=owner)
+        RecipeIngredient.objects.create(meal=salmorejo, ingredient=Ingredient.objects.create(name='Pan', user=owner),
+                                        quantity=200, unit='g')
+        self.add_plan(salmorejo, 5, 'LUNCH', 4)
+        self.add_plan(self.tortilla, 6, 'LUNCH', 8)
+        meal_vectors.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            owner.delete()
+        self.assertMatchesGenerated()
+        self.assertEqual(self.shown(), {'Huevo': 3.0})
+
+
+class PlanETagTests(APITestCase):
+    """Un GET condicional no puede dar 304 si ha cambiado algo de lo que pinta la respuesta."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        self.partner = User.objects.create_user(username='luis', password='x')
+        self.group = PlanningGroup.objects.create(name='Casa')
+        self.group.members.add(self.user, self.partner)
+        self.meal = Meal.objects.create(name='Lentejas', user=self.partner)
+        RecipeIngredient.objects.create(meal=self.meal, ingredient=Ingredient.objects.create(name='Lenteja'),
+                                        quantity=200, unit='g')
+        self.plan = DailyPlan.objects.create(group=self.group, date=date(2026, 1, 5), meal_slot='LUNCH', meal=self.meal)
+        self.client.force_authenticate(self.user)
+
+    def assertRevalidated(self, change):
+        """Hace `change` y devuelve la receta de cada URL, que no puede llegar como 304."""
+        urls = {'/api/plans/': {'group': self.group.id}, f'/api/plans/{self.plan.id}/': {}}
+        etags = {}
+        for url, params in urls.items():
+            etags[url] = self.client.get(url, params)['ETag']
+            self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etags[url]).status_code, 304)
+
+        change()
+        meals = []
+        for url, params in urls.items():
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, 200, url)
+            self.assertNotIn('Last-Modified', response)
+            meals.append((response.data[0] if url == '/api/plans/' else response.data)['meal_details'])
+        return meals
+
+    def test_saving_and_deleting_a_copy(self):
+        def save():
+            response = self.client.post(f'/api/meals/{self.meal.id}/import_recipe/')
+            self.assertLess(response.status_code, 300, response.content)
+
+        for meal in self.assertRevalidated(save):
+            self.assertTrue(meal['is_saved_by_user'])
+
+        copy = Meal.objects.get(user=self.user, source_meal=self.meal)
+        for meal in self.assertRevalidated(lambda: self.client.delete(f'/api/meals/{copy.id}/')):
+            self.assertFalse(meal['is_saved_by_user'])
+
+    def test_owner_rename(self):
+        def rename():
+            self.partner.username = 'luisa'
+            self.partner.save()
+
+        for meal in self.assertRevalidated(rename):
+            self.assertEqual(meal['owner_name'], 'luisa')
+
+
+class BulkItemsTests(APITestCase):
+    """Marcar ítems mientras la lista auto-mantenida borra alguno."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        group = PlanningGroup.objects.create(name='Casa')
+        group.members.add(self.user)
+        self.shopping_list = ShoppingList.objects.create(
+            group=group, start_date=date(2026, 1, 5), end_date=date(2026, 1, 11),
+        )
+        self.items = [
+            ShoppingListItem.objects.create(shopping_list=self.shopping_list, name=name, quantity=1, unit='g')
+            for name in ('Sal', 'Arroz')
+        ]
+        self.client.force_authenticate(self.user)
+
+    def test_item_deleted_after_validation_is_reported(self):
+        kept, gone = self.items
+        gone_id = gone.id
+        changes = [{'id': kept.id, 'is_purchased': True}, {'id': gone_id, 'is_purchased': True}]
+        gone.delete()
+
+        revision, changed, deleted = update_items(self.shopping_list, changes)
+        self.assertEqual([item.id for item in changed], [kept.id])
+        self.assertEqual(deleted, [gone_id])
+        self.assertTrue(ShoppingListItem.objects.get(pk=kept.id).is_purchased)
+
+        # Lo mismo por la API, con el borrado entre la validación y la escritura
+        changes[0]['is_purchased'] = False
+        with mock.patch('planner.serializers.BulkItemsSerializer.validate_items', lambda self, items: items):
+            response = self.client.post(f'/api/shopping-lists/{self.shopping_list.id}/items/bulk/',
+                                        {'items': changes}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['deleted'], [gone_id])
+        self.assertEqual([item['id'] for item in response.data['items']], [kept.id])
+
+
+class PlanBulkTests(APITestCase):
+    """
+    Operaciones en bloque del calendario (planner/bulk.py): qué planes quedan,
+    qué se reutiliza, y que la lista auto-mantenida y el registro de cambios
+    se enteran aunque no haya señales por instancia.
+    """
+
+    def setUp(self):
+        # Cada test deshace su transacción y SQLite reutiliza los id: sin
+        # esto la LRU devolvería el vector de la receta de otro test
+        meal_vectors.clear()
+        self.user = User.objects.create_user(username='ana', password='x')
+        self.group = PlanningGroup.objects.create(name='Casa')
+        self.group.members.add(self.user)
+        self.tortilla = Meal.objects.create(name='Tortilla', base_servings=8, user=self.user)
+        RecipeIngredient.objects.create(meal=self.tortilla, ingredient=Ingredient.objects.create(name='Huevo'),
+                                        quantity=3, unit='unidades')
+        self.paella = Meal.objects.create(name='Paella', base_servings=4, user=self.user)
+        RecipeIngredient.objects.create(meal=self.paella, ingredient=Ingredient.objects.create(name='Arroz'),
+                                        quantity=400, unit='g')
+        # Dos semanas: la del 5 de enero y la del 12
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/shopping-lists/generate/', {
+            'group': self.group.id, 'start_date': '2026-01-05', 'end_date': '2026-01-18', 'auto_update': True,
+        }, format='json')
+        self.shopping_list = ShoppingList.objects.get(pk=response.data['id'])
+
+    def spec(self, day, slot, meal=None, servings=4, custom_name=None):
+        return {
+            'date': date(2026, 1, day), 'meal_slot': slot, 'meal_id': meal.id if meal else None,
+            'target_servings': servings, 'is_eating_out': meal is None, 'custom_name': custom_name,
+        }
+
+    def add_plans(self, *specs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [DailyPlan.objects.create(group=self.group, **spec) for spec in specs]
+
+    def run_bulk(self, operation, *args):
+        """Ejecuta la operación y devuelve (resultado, [(op, id del plan)] apuntados)."""
+        cursor = ChangeLogEntry.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        with self.captureOnCommitCallbacks(execute=True):
+            result = operation(*args)
+        logged = ChangeLogEntry.objects.filter(kind='plans', id__gt=cursor).values_list('op', 'object_id')
+        return result, sorted(logged)
+
+    def calendar(self, start, end):
+        return list(DailyPlan.objects.filter(
+            group=self.group, date__range=[date(2026, 1, start), date(2026, 1, end)],
+        ).order_by('date', 'meal_slot', 'id').values_list('date__day', 'meal_slot', 'meal_id', 'target_servings'))
+
+    def assertMatchesGenerated(self):
+        items = {(item.name, item.unit): item.quantity for item in self.shopping_list.items.all()}
+        expected = aggregate_ingredients(self.group, date(2026, 1, 5), date(2026, 1, 18))
+        self.assertEqual(set(items), set(expected))
+        for key, quantity in expected.items():
+            self.assertAlmostEqual(items[key], quantity, places=9, msg=key)
+
+    def test_write_plans_replaces_the_range(self):
+        same, changed, dropped = self.add_plans(
+            self.spec(5, 'LUNCH', self.tortilla), self.spec(6, 'LUNCH', self.tortilla), self.spec(7, 'DINNER', self.paella),
+        )
+        outside = self.add_plans(self.spec(12, 'LUNCH', self.paella))[0]
+        updated_at = same.updated_at
+
+        result, logged = self.run_bulk(write_plans, self.group, [
+            self.spec(5, 'LUNCH', self.tortilla), self.spec(6, 'LUNCH', self.paella, servings=2),
+            self.spec(8, 'LUNCH', self.tortilla, servings=1),
+        ], date(2026, 1, 5), date(2026, 1, 11))
+
+        self.assertEqual((result['created'], result['updated'], result['deleted']), (1, 1, 1))
+        created = result['plans'][2]
+        # Se reutilizan los planes por (fecha, franja); el que no cambia no se toca
+        self.assertEqual([plan.pk for plan in result['plans'][:2]], [same.pk, changed.pk])
+        self.assertEqual(DailyPlan.objects.get(pk=same.pk).updated_at, updated_at)
+        self.assertFalse(DailyPlan.objects.filter(pk=dropped.pk).exists())
+        self.assertEqual(self.calendar(5, 11), [
+            (5, 'LUNCH', self.tortilla.id, 4), (6, 'LUNCH', self.paella.id, 2), (8, 'LUNCH', self.tortilla.id, 1),
+        ])
+        # Fuera del rango no se toca nada
+        self.assertTrue(DailyPlan.objects.filter(pk=outside.pk).exists())
+        self.assertEqual(logged, sorted([('create', created.pk), ('delete', dropped.pk), ('update', changed.pk)]))
+        self.assertMatchesGenerated()
+
+    def test_write_plans_without_range_only_adds(self):
+        existing = self.add_plans(self.spec(5, 'LUNCH', self.tortilla))[0]
+        result, logged = self.run_bulk(write_plans, self.group, [self.spec(5, 'LUNCH', self.paella)])
+
+        self.assertEqual((result['created'], result['updated'], result['deleted']), (1, 0, 0))
+        self.assertEqual(self.calendar(5, 5), [(5, 'LUNCH', self.tortilla.id, 4), (5, 'LUNCH', self.paella.id, 4)])
+        self.assertEqual(DailyPlan.objects.get(pk=existing.pk).meal_id, self.tortilla.id)
+        self.assertEqual(logged, [('create', result['plans'][0].pk)])
+        self.assertMatchesGenerated()
+
+    def test_copy_range_replace_and_merge(self):
+        self.add_plans(self.spec(5, 'LUNCH', self.tortilla, servings=2), self.spec(6, 'DINNER', self.paella))
+        target = self.add_plans(self.spec(14, 'LUNCH', self.paella, servings=8))[0]
+
+        # Sin reemplazar: se suma a lo que ya había en el destino
+        result, logged = self.run_bulk(copy_range, self.group, date(2026, 1, 5), date(2026, 1, 11), date(2026, 1, 12), False)
+        self.assertEqual((result['created'], result['updated'], result['deleted']), (2, 0, 0))
+        self.assertEqual(self.calendar(12, 18), [
+            (12, 'LUNCH', self.tortilla.id, 2), (13, 'DINNER', self.paella.id, 4), (14, 'LUNCH', self.paella.id, 8),
+        ])
+        self.assertEqual([op for op, pk in logged], ['create', 'create'])
+        self.assertMatchesGenerated()
+
+        # Reemplazando: el destino queda igual que el origen (las copias ya
+        # puestas se reutilizan y lo que sobra se borra)
+        copies = [plan.pk for plan in result['plans']]
+        result, logged = self.run_bulk(copy_range, self.group, date(2026, 1, 5), date(2026, 1, 11), date(2026, 1, 12), True)
+        self.assertEqual((result['created'], result['updated'], result['deleted']), (0, 0, 1))
+        self.assertEqual([plan.pk for plan in result['plans']], copies)
+        self.assertEqual(self.calendar(12, 18), [(12, 'LUNCH', self.tortilla.id, 2), (13, 'DINNER', self.paella.id, 4)])
+        self.assertEqual(logged, [('delete', target.pk)])
+        self.assertMatchesGenerated()
+
+    def test_apply_template(self):
+        template = WeekTemplate.objects.create(group=self.group, name='Semana tipo')
+        WeekTemplateEntry.objects.bulk_create([
+            WeekTemplateEntry(template=template, day=0, meal_slot='LUNCH', meal=self.tortilla, target_servings=4),
+            WeekTemplateEntry(template=template, day=3, meal_slot='DINNER', is_eating_out=True, custom_name='Cumpleaños'),
+        ])
+        self.add_plans(self.spec(12, 'LUNCH', self.paella), self.spec(13, 'LUNCH', self.paella))
+
+        result, logged = self.run_bulk(apply_template, template, date(2026, 1, 12), True)
+        self.assertEqual((result['created'], result['updated'], result['deleted']), (1, 1, 1))
+        self.assertEqual(self.calendar(12, 18), [(12, 'LUNCH', self.tortilla.id, 4), (15, 'DINNER', None, 4)])
+        self.assertEqual(DailyPlan.objects.get(date=date(2026, 1, 15)).custom_name, 'Cumpleaños')
+        self.assertEqual([op for op, pk in logged], ['create', 'delete', 'update'])
+        self.assertMatchesGenerated()
+
+        # Aplicarla otra vez no cambia nada ni apunta nada
+        result, logged = self.run_bulk(apply_template, template, date(2026, 1, 12), True)
+        self.assertEqual((result['created'], result['updated'], result['deleted']), (0, 0, 0))
+        self.assertEqual(logged, [])
+
+        # Sin reemplazar se añade encima
+        result, logged = self.run_bulk(apply_template, template, date(2026, 1, 12), False)
+        self.assertEqual(result['created'], 2)
+        self.assertEqual(len(self.calendar(12, 18)), 4)
+        self.assertMatchesGenerated()
+
+
+class PlanMealVisibilityTests(APITestCase):
+    """Solo se pueden planificar las recetas propias o las de alguien de mis grupos."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        partner = User.objects.create_user(username='luis', password='x')
+        stranger = User.objects.create_user(username='eva', password='x')
+        self.group = PlanningGroup.objects.create(name='Casa')
+        self.group.members.add(self.user, partner)
+        self.shared = Meal.objects.create(name='Lentejas', user=partner)
+        self.private = Meal.objects.create(name='Receta secreta', user=stranger)
+        self.client.force_authenticate(self.user)
+
+    def plan(self, meal):
+        return {'date': '2026-03-02', 'meal_slot': 'LUNCH', 'meal': meal.id, 'target_servings': 2}
+
+    def test_single_plan(self):
+        response = self.client.post('/api/plans/', {'group': self.group.id, **self.plan(self.private)}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/plans/', {'group': self.group.id, **self.plan(self.shared)}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_bulk_plans(self):
+        response = self.client.post('/api/plans/bulk/', {
+            'group': self.group.id, 'plans': [self.plan(self.shared), self.plan(self.private)],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('Receta secreta', response.content.decode())
+        self.assertFalse(DailyPlan.objects.exists())
+
+    def test_week_template(self):
+        entry = {'day': 0, 'meal_slot': 'LUNCH', 'target_servings': 2}
+        response = self.client.post('/api/week-templates/', {
+            'group': self.group.id, 'name': 'Semana', 'entries': [{**entry, 'meal': self.private.id}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WeekTemplate.objects.exists())
+
+        response = self.client.post('/api/week-templates/', {
+            'group': self.group.id, 'name': 'Semana', 'entries': [{**entry, 'meal': self.shared.id}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+
+class PlanPaginationTests(APITestCase):
+    """
+    El listado de planes se pagina por (date, meal_slot, id): muchos planes
+    con la misma fecha y franja no se repiten ni se saltan, y ninguna página
+    usa OFFSET.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        self.group = PlanningGroup.objects.create(name='Casa')
+        self.group.members.add(self.user)
+        meal = Meal.objects.create(name='Lentejas', user=self.user)
+        self.plans = DailyPlan.objects.bulk_create(
+            DailyPlan(group=self.group, date=date(2026, 1, 5 + day), meal_slot=slot, meal=meal)
+            for day in range(3)
+            for slot in ('LUNCH', 'DINNER', 'LUNCH', 'LUNCH')
+        )
+        self.client.force_authenticate(self.user)
+
+    def page(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query['sql'] for query in context.captured_queries if 'OFFSET' in query['sql']])
+        links = dict(
+            (rel.split('"')[1], link.strip()[1:-1])
+            for link, rel in (part.split(';') for part in response.get('Link', '').split(',') if part)
+        )
+        return [plan['id'] for plan in response.data], links
+
+    def expected(self):
+        return list(DailyPlan.objects.order_by('date', 'meal_slot', 'id').values_list('id', flat=True))
+
+    def test_walk_forward_and_back(self):
+        ids, links = self.page('/api/plans/', {'page_size': 5})
+        pages = [ids]
+        while 'next' in links:
+            ids, links = self.page(links['next'])
+            pages.append(ids)
+        self.assertEqual([plan_id for page in pages for plan_id in page], self.expected())
+        self.assertEqual([len(page) for page in pages], [5, 5, 2])
+
+        # Y hacia atrás desde la última, las mismas páginas
+        ids, links = self.page(links['prev'])
+        self.assertEqual(ids, pages[1])
+        ids, links = self.page(links['prev'])
+        self.assertEqual(ids, pages[0])
+        self.assertNotIn('prev', links)
+
+    def test_plan_moved_between_pages(self):
+        first, links = self.page('/api/plans/', {'page_size': 5})
+        # Un plan de más adelante pasa al principio del calendario
+        moved = DailyPlan.objects.get(pk=self.expected()[-1])
+        moved.date = date(2026, 1, 1)
+        moved.save()
+
+        seen = list(first)
+        while 'next' in links:
+            ids, links = self.page(links['next'])
+            seen.extend(ids)
+        # Ni se repite ni se salta ningún otro plan
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(sorted(seen), sorted(plan.id for plan in self.plans if plan.id != moved.id))
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/plans/', {'cursor': 'no-vale'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(REALTIME_HISTORY=3, REALTIME_KEEPALIVE=0.05)
+class RealtimeTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        self.group = PlanningGroup.objects.create(name='Casa')
+        self.group.members.add(self.user)
+        self.token = str(AccessToken.for_user(self.user))
+        # Un broker limpio por test (el de verdad se comparte en el proceso)
+        self.broker = MemoryBroker()
+        patcher = mock.patch('planner.realtime._broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def url(self, token=None):
+        return f'/api/groups/{self.group.pk}/events/?token={token or self.token}'
+
+    async def test_replay(self):
+        first_id = self.broker._first_id
+        self.broker.publish(self.group.pk, {'type': 'plans', 'dates': []})
+        self.broker.publish(self.group.pk, {'type': 'resync'})
+
+        events = await self.broker.replay(self.group.pk, first_id)
+        self.assertEqual(events, [(first_id + 1, {'type': 'resync'})])
+        self.assertEqual(await self.broker.replay(self.group.pk, first_id + 1), [])
+        # Un id de antes de arrancar el proceso: no se sabe qué se perdió
+        self.assertIsNone(await self.broker.replay(self.group.pk, first_id - 1))
+
+    async def test_replay_after_history_overflow(self):
+        first_id = self.broker._first_id
+        for _ in range(5):
+            self.broker.publish(self.group.pk, {'type': 'resync'})
+        # Solo quedan los 3 últimos (first_id + 2 ...): el + 1 se ha perdido
+        self.assertIsNone(await self.broker.replay(self.group.pk, first_id))
+        self.assertEqual([event[0] for event in await self.broker.replay(self.group.pk, first_id + 1)],
+                         [first_id + 2, first_id + 3, first_id + 4])
+
+    async def test_errors(self):
+        self.assertEqual((await self.async_client.get(f'/api/groups/{self.group.pk}/events/')).status_code, 401)
+        self.assertEqual((await self.async_client.get(self.url('no-vale'))).status_code, 401)
+        self.assertEqual((await self.async_client.post(self.url())).status_code, 405)
+
+        other = await User.objects.acreate(username='luis')
+        response = await self.async_client.get(self.url(str(AccessToken.for_user(other))))
+        self.assertEqual(response.status_code, 404)
+
+    def test_wsgi(self):
+        self.assertEqual(self.client.get(self.url()).status_code, 501)
+
+    async def read(self, stream):
+        return await asyncio.wait_for(anext(stream), timeout=1)
+
+    async def test_stream(self):
+        first_id = self.broker._first_id
+        self.broker.publish(self.group.pk, {'type': 'resync'})
+        self.broker.publish(self.group.pk, {'type': 'shopping_list', 'op': 'deleted', 'id': 5})
+        # El cliente vio el primero: se le manda el segundo y luego lo nuevo
+        response = await self.async_client.get(self.url(), headers={'Last-Event-ID': str(first_id)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+
+        self.assertTrue((await self.read(stream)).startswith(b'retry:'))
+        event = await self.read(stream)
+        self.assertIn(f'id: {first_id + 1}'.encode(), event)
+        self.assertIn(b'event: shopping_list', event)
+
+        self.broker.publish(self.group.pk, {'type': 'plans', 'dates': ['2026-03-02']})
+        event = await self.read(stream)
+        self.assertIn(f'id: {first_id + 2}'.encode(), event)
+        self.assertIn(b'event: plans', event)
+        self.assertEqual(await self.read(stream), b': keepalive\n\n')
+
+    async def test_stream_closes_after_leaving_group(self):
+        response = await self.async_client.get(self.url())
+        stream = aiter(response.streaming_content)
+        await self.read(stream)  # retry
+        await self.read(stream)  # keepalive (sigue siendo miembro)
+
+        await self.group.members.aremove(self.user)
+        # Como mucho un keepalive más y se cierra
+        with self.assertRaises(StopAsyncIteration):
+            for _ in range(3):
+                await self.read(stream)
@@ -2,19 +2,60 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db import transaction
-from .models import DailyPlan, ShoppingList, ShoppingListItem
+from django.db.models import Prefetch
+from recipes.models import Meal
+from .models import DailyPlan, ShoppingList, ShoppingListItem, WeekTemplate
 from .serializers import DailyPlanSerializer, ShoppingListSerializer # <--- Asegúrate de tener este serializer (lo creamos ahora)
+from .serializers import ApplyTemplateSerializer, BulkPlansSerializer, CopyRangeSerializer, WeekTemplateSerializer
+from .serializers import CalendarQuerySerializer, BulkItemsSerializer, ItemChangesQuerySerializer
+from .shopping import item_changes, update_items
+from .bulk import apply_template, copy_range, write_plans
+from .grid import SLOTS, build_grid, grid_etag
+from django.utils.cache import get_conditional_response, patch_cache_control
+from users.models import PlanningGroup
+from meal_backend.conditional import ConditionalResponseMixin
+from meal_backend.routers import ReplicaReadMixin
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .realtime import event_stream, item_payload
+from django.shortcuts import get_object_or_404
 
 
-class DailyPlanViewSet(viewsets.ModelViewSet):
+def bulk_plans_response(request, result):
+    """Respuesta común de las operaciones en bloque (ver planner/bulk.py)."""
+    plans = DailyPlan.objects.filter(pk__in=[plan.pk for plan in result['plans']]).prefetch_related(
+        Prefetch('meal', queryset=Meal.objects.with_details(request.user))
+    ).order_by('date', 'meal_slot', 'id')
+    return Response({
+        "created": result['created'],
+        "updated": result['updated'],
+        "deleted": result['deleted'],
+        "plans": DailyPlanSerializer(plans, many=True, context={'request': request}).data,
+    })
+
+
+class DailyPlanViewSet(ReplicaReadMixin, ConditionalResponseMixin, viewsets.ModelViewSet):
     queryset = DailyPlan.objects.all()
     serializer_class = DailyPlanSerializer
+    # Cada plan lleva la receta completa dentro
+    conditional_timestamps = ('updated_at', 'meal__updated_at')
+    # Mismo orden que el calendario; el id desempata
+    cursor_ordering = ('date', 'meal_slot', 'id')
     
     def get_queryset(self):
         queryset = super().get_queryset()
         # Filtro de seguridad: Solo mis grupos
         queryset = queryset.filter(group__members=self.request.user)
 
+        # Precargamos la receta completa de cada plan (ingredientes, dueño,
+        # si ya la tengo guardada...) en un número fijo de consultas.
+        queryset = queryset.prefetch_related(
+            Prefetch('meal', queryset=Meal.objects.with_details(self.request.user))
+        )
+
         # Filtro específico si el frontend manda ?group=5
         group_id = self.request.query_params.get('group')
         if group_id:
@@ -26,9 +67,139 @@ class DailyPlanViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(date__range=[start_date, end_date])
         return queryset
 
-class ShoppingListViewSet(viewsets.ModelViewSet):
+    def conditional_state(self, request):
+        # "is_saved_by_user" de cada receta depende de las copias del usuario
+        return Meal.objects.saved_copies_state(request.user)
+
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """
+        Rejilla compacta fecha x franja de un grupo para la vista semanal:
+            ?group=1&start_date=2026-03-02&end_date=2026-03-08
+        Con If-None-Match y sin cambios en el grupo devuelve 304 tras leer
+        solo la versión del grupo.
+        """
+        query = CalendarQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        group_id, start_date, end_date = (query.validated_data[key] for key in ('group', 'start_date', 'end_date'))
+
+        # Una consulta: versión del grupo (y, de paso, que soy miembro)
+        version = PlanningGroup.objects.filter(pk=group_id, members=request.user).values_list('version', flat=True).first()
+        if version is None:
+            return Response({"error": "Grupo no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = grid_etag(group_id, version, start_date, end_date)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response({
+                "group": group_id,
+                "version": version,
+                "start_date": start_date,
+                "end_date": end_date,
+                "slots": SLOTS,
+                "days": build_grid(request, group_id, start_date, end_date),
+            })
+        response['ETag'] = etag
+        # El navegador puede guardarla, pero siempre debe preguntar si sigue valiendo
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Guarda muchos planes de un grupo en una sola petición/transacción:
+            {"group": 1, "plans": [{"date": "2026-03-02", "meal_slot": "LUNCH", "meal": 7}, ...],
+             "start_date": "2026-03-02", "end_date": "2026-03-08"}
+        Con start_date/end_date, el rango se REEMPLAZA por estos planes.
+        """
+        serializer = BulkPlansSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        result = write_plans(data['group'], data['plans'], data.get('start_date'), data.get('end_date'))
+        return bulk_plans_response(request, result)
+
+    @action(detail=False, methods=['post'])
+    def copy(self, request):
+        """
+        Copia un rango de fechas a otro (ej: repetir la semana pasada):
+            {"group": 1, "source_start": "2026-03-02", "source_end": "2026-03-08",
+             "target_start": "2026-03-09", "replace": true}
+        """
+        serializer = CopyRangeSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        result = copy_range(data['group'], data['source_start'], data['source_end'], data['target_start'], data['replace'])
+        return bulk_plans_response(request, result)
+
+
+class WeekTemplateViewSet(viewsets.ModelViewSet):
+    """Semanas tipo de mis grupos."""
+    queryset = WeekTemplate.objects.all()
+    serializer_class = WeekTemplateSerializer
+    cursor_ordering = 'id'
+
+    def get_queryset(self):
+        queryset = WeekTemplate.objects.filter(group__members=self.request.user).prefetch_related('entries')
+        group_id = self.request.query_params.get('group')
+        if group_id:
+            queryset = queryset.filter(group_id=group_id)
+        return queryset
+
+    @action(detail=True, methods=['post'])
+    def apply(self, request, pk=None):
+        """
+        Aplica la semana tipo a partir de una fecha: {"start_date": "2026-03-09", "replace": true}
+        """
+        template = self.get_object()
+        serializer = ApplyTemplateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = apply_template(template, serializer.validated_data['start_date'], serializer.validated_data['replace'])
+        return bulk_plans_response(request, result)
+
+
+class ShoppingListViewSet(ReplicaReadMixin, ConditionalResponseMixin, viewsets.ModelViewSet):
     queryset = ShoppingList.objects.all()
     serializer_class = ShoppingListSerializer
+    # Las más recientes primero
+    cursor_ordering = '-id'
+
+    def get_queryset(self):
+        # Solo las listas de mis grupos, con sus ítems en una consulta
+        return ShoppingList.objects.filter(group__members=self.request.user).prefetch_related('items')
+
+    def get_member_list(self):
+        # Para tocar ítems hay que ser del grupo de la lista
+        return get_object_or_404(ShoppingList, pk=self.kwargs['pk'], group__members=self.request.user)
+
+    @action(detail=True, methods=['post'], url_path='items/bulk', url_name='items-bulk')
+    def bulk_items(self, request, pk=None):
+        """
+        Edita muchos ítems de la lista en una petición (ej: marcar comprados):
+            {"items": [{"id": 3, "is_purchased": true}, {"id": 4, "quantity": 2, "unit": "kg"}]}
+        Devuelve la nueva revisión, los ítems que han cambiado y en "deleted"
+        los que se han borrado mientras tanto (el cliente los quita).
+        """
+        shopping_list = self.get_member_list()
+        serializer = BulkItemsSerializer(data=request.data, context={'shopping_list': shopping_list})
+        serializer.is_valid(raise_exception=True)
+        revision, changed, deleted = update_items(shopping_list, serializer.validated_data['items'])
+        return Response({
+            "revision": revision,
+            "items": [item_payload(item) for item in changed],
+            "deleted": deleted,
+        })
+
+    @action(detail=True, methods=['get'])
+    def changes(self, request, pk=None):
+        """
+        Cambios en los ítems desde la revisión que ya tiene el cliente:
+            GET /api/shopping-lists/5/changes/?since=12
+            -> {"revision": 14, "reset": false, "items": [...], "deleted": [7]}
+        """
+        shopping_list = self.get_member_list()
+        query = ItemChangesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(item_changes(shopping_list, query.validated_data['since']))
 
     @action(detail=False, methods=['post'])
     def generate(self, request):
@@ -46,4 +217,49 @@ class ShoppingListViewSet(viewsets.ModelViewSet):
             shopping_list = serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+async def group_events(request, group_id):
+    """
+    GET /api/groups/<id>/events/ -> text/event-stream con los cambios del
+    grupo (ver planner/realtime.py). Es una vista async normal y no de DRF:
+    la conexión se queda abierta sin ocupar un hilo.
+
+    EventSource no deja mandar cabeceras, así que además de
+    "Authorization: Bearer ..." se acepta el token de acceso en ?token=.
+    """
+    if request.method != 'GET':
+        return JsonResponse({"detail": "Método no permitido."}, status=405)
+    if not isinstance(request, ASGIRequest):
+        # Con WSGI la conexión bloquearía un worker entero
+        return JsonResponse(
+            {"detail": "Los eventos en tiempo real necesitan servir la aplicación con ASGI."}, status=501,
+        )
+
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header else request.GET.get('token')
+    if not raw_token:
+        return JsonResponse({"detail": "Las credenciales de autenticación no se proveyeron."}, status=401)
+    try:
+        user = await sync_to_async(auth.get_user)(auth.get_validated_token(raw_token))
+    except AuthenticationFailed:  # InvalidToken también lo es
+        return JsonResponse({"detail": "El token no es válido o ha caducado."}, status=401)
+
+    async def is_member():
+        return await PlanningGroup.objects.filter(pk=group_id, members=user).aexists()
+
+    if not await is_member():
+        return JsonResponse({"detail": "No encontrado."}, status=404)
+
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_event_id = None
+
+    # Si sale del grupo con la conexión abierta, se le corta (ver event_stream)
+    response = StreamingHttpResponse(event_stream(group_id, last_event_id, is_member), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx: no acumular la respuesta antes de mandarla
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,6 +1,6 @@
 # recipes/admin.py
 from django.contrib import admin
-from .models import Ingredient, Meal, RecipeIngredient
+from .models import Ingredient, Meal, RecipeIngredient, ImageJob
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
@@ -16,4 +16,9 @@ class MealAdmin(admin.ModelAdmin):
     list_display = ('name', 'meal_type', 'base_servings', 'user')
     list_filter = ('meal_type', 'user')
     search_fields = ('name',)
-    inlines = [RecipeIngredientInline] # <--- Esto activa la magia
\ No newline at end of file
+    inlines = [RecipeIngredientInline] # <--- Esto activa la magia
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ('meal', 'status', 'attempts', 'created_at', 'updated_at')
+    list_filter = ('status',)
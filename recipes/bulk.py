@@ -0,0 +1,186 @@
+"""
+Operaciones en bloque sobre recetas: resolver ingredientes por nombre,
+clonar recetas de otros usuarios y guardar los ingredientes de una receta,
+todo con un número fijo de consultas.
+"""
+from django.db import transaction
+from django.db.models import Prefetch
+from .models import Ingredient, Meal, RecipeIngredient
+from .search import schedule_reindex
+from .typeahead import normalize_name
+from sync.log import CREATE, record
+
+
+class IngredientResolver:
+    """
+    Traduce nombres de ingrediente a filas Ingredient de un usuario usando un
+    mapa en memoria (nombre normalizado -> Ingredient). Se compara sin tildes
+    ni mayúsculas (ver `normalize_name`).
+
+    Los que no existen se crean todos juntos con `bulk_create` en `resolve()`.
+    """
+
+    def __init__(self, user, include_global=False):
+        self.user = user
+        self.include_global = include_global
+        self.by_name = {}
+
+    def load(self, names):
+        """Carga de la BD (una consulta) los que aún no están en el mapa."""
+        wanted = {normalize_name(name) for name in names} - set(self.by_name)
+        if not wanted:
+            return
+
+        queryset = Ingredient.objects.filter(normalized_name__in=wanted)
+        private = list(queryset.filter(user=self.user).order_by('id'))
+        # Si hay uno privado con ese nombre, manda sobre el global
+        for ingredient in private:
+            self.by_name.setdefault(ingredient.normalized_name, ingredient)
+        if self.include_global:
+            for ingredient in queryset.filter(user__isnull=True).order_by('id'):
+                self.by_name.setdefault(ingredient.normalized_name, ingredient)
+
+    def resolve(self, names):
+        """
+        Devuelve {nombre normalizado: Ingredient} para todos los `names`,
+        creando como privados del usuario los que falten.
+        """
+        names = [name.strip() for name in names if name and name.strip()]
+        self.load(names)
+
+        missing = {}
+        for name in names:
+            key = normalize_name(name)
+            if key not in self.by_name:
+                missing.setdefault(key, Ingredient(name=name, normalized_name=key, user=self.user))
+        if missing:
+            created = Ingredient.objects.bulk_create(missing.values())
+            for ingredient in created:
+                self.by_name[ingredient.normalized_name] = ingredient
+            record('ingredients', created, CREATE)
+
+        return {key: self.by_name[key] for key in map(normalize_name, names)}
+
+
+RECIPE_INGREDIENT_FIELDS = ('ingredient', 'quantity', 'unit')
+
+
+def sync_recipe_ingredients(meal, rows, existing=None):
+    """
+    Deja los ingredientes de `meal` como indica `rows` (datos validados de
+    RecipeIngredientSerializer) tocando solo lo que cambia:
+    - Las filas con id se comparan con la existente y, si difieren, se
+      actualizan (un único bulk_update).
+    - Las filas sin id reutilizan, si la hay, una fila existente que nadie
+      ha reclamado con el mismo ingrediente (y mejor si también la unidad).
+      Si no, se crean (un único bulk_create).
+    - Las filas existentes que sobran se borran (un único DELETE).
+
+    `existing` permite pasar las filas actuales (o [] en una receta nueva)
+    para ahorrar la consulta. Devuelve True si se ha cambiado algo.
+    """
+    if existing is None:
+        existing = RecipeIngredient.objects.filter(meal=meal).order_by('id')
+    unclaimed = {recipe_ing.pk: recipe_ing for recipe_ing in existing}
+
+    pairs = []
+    new_rows = []
+    for row in rows:
+        recipe_ing = unclaimed.pop(row['id'], None) if row.get('id') is not None else None
+        if recipe_ing is None:
+            new_rows.append(row)
+        else:
+            pairs.append((recipe_ing, row))
+
+    to_create = []
+    for row in new_rows:
+        candidates = [r for r in unclaimed.values() if r.ingredient_id == row['ingredient'].pk]
+        recipe_ing = next((r for r in candidates if r.unit == row['unit']), None) or next(iter(candidates), None)
+        if recipe_ing is None:
+            to_create.append(RecipeIngredient(meal=meal, **{f: row[f] for f in RECIPE_INGREDIENT_FIELDS}))
+        else:
+            del unclaimed[recipe_ing.pk]
+            pairs.append((recipe_ing, row))
+
+    to_update = []
+    for recipe_ing, row in pairs:
+        # Comparamos ingredient_id (no .ingredient, que haría una consulta por fila)
+        wanted = {'ingredient_id': row['ingredient'].pk, 'quantity': row['quantity'], 'unit': row['unit']}
+        if any(getattr(recipe_ing, attname) != value for attname, value in wanted.items()):
+            for attname, value in wanted.items():
+                setattr(recipe_ing, attname, value)
+            to_update.append(recipe_ing)
+
+    if to_update:
+        RecipeIngredient.objects.bulk_update(to_update, RECIPE_INGREDIENT_FIELDS)
+    if to_create:
+        RecipeIngredient.objects.bulk_create(to_create)
+    if unclaimed:
+        RecipeIngredient.objects.filter(pk__in=list(unclaimed)).delete()
+
+    return bool(to_update or to_create or unclaimed)
+
+
+def originals_queryset():
+    """Recetas originales con sus ingredientes precargados (2 consultas)."""
+    return Meal.objects.prefetch_related(
+        Prefetch('ingredients', queryset=RecipeIngredient.objects.select_related('ingredient').order_by('id'))
+    )
+
+
+def clone_meals(originals, user):
+    """
+    Copia varias recetas a la biblioteca de `user`.
+
+    Misma lógica que la importación de una sola receta:
+    - Ingredientes globales: se reutilizan tal cual.
+    - Ingredientes privados de otro usuario: se usa el mío con el mismo
+      nombre o, si no lo tengo, se crea una copia privada.
+
+    Todo con un número fijo de consultas (sin importar cuántas recetas ni
+    ingredientes haya). Devuelve las recetas nuevas, en el mismo orden.
+    """
+    originals = list(originals)
+    if not originals:
+        return []
+
+    private_names = [
+        recipe_ing.ingredient.name
+        for original in originals
+        for recipe_ing in original.ingredients.all()
+        if recipe_ing.ingredient.user_id is not None
+    ]
+
+    with transaction.atomic():
+        resolved = IngredientResolver(user).resolve(private_names)
+
+        new_meals = Meal.objects.bulk_create([
+            Meal(
+                name=original.name,
+                meal_type=original.meal_type,
+                base_servings=original.base_servings,
+                instructions=original.instructions,
+                user=user,
+                source_meal=original,
+            )
+            for original in originals
+        ])
+
+        recipe_ingredients = []
+        for original, new_meal in zip(originals, new_meals):
+            for recipe_ing in original.ingredients.all():
+                ingredient = recipe_ing.ingredient
+                if ingredient.user_id is not None:
+                    ingredient = resolved[normalize_name(ingredient.name)]
+                recipe_ingredients.append(RecipeIngredient(
+                    meal=new_meal,
+                    ingredient=ingredient,
+                    quantity=recipe_ing.quantity,
+                    unit=recipe_ing.unit,
+                ))
+        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        # bulk_create no lanza señales: el buscador y el registro de cambios hay que avisarlos a mano
+        schedule_reindex(meal.pk for meal in new_meals)
+        record('meals', new_meals, CREATE)
+
+    return new_meals
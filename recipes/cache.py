@@ -0,0 +1,162 @@
+"""
+Caché de "vectores" de ingredientes por ración de cada receta.
+
+Para cada Meal guardamos la lista normalizada de (ingrediente, unidad, cantidad
+por ración). Con eso, escalar una receta o sumar lo que aporta un plan es una
+multiplicación en memoria, sin ir a RecipeIngredient.
+
+La clave es (meal_id, ingredients_version). Cuando una receta cambia se sube
+su versión en la BD (ver `invalidate_meal`), así que ningún proceso puede
+leer un vector antiguo aunque lo tenga aún en su LRU local.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+from sync.log import record
+
+VectorEntry = namedtuple('VectorEntry', ['ingredient_id', 'name', 'unit', 'per_serving'])
+
+# Se lanza cuando cambia lo que lleva una receta por ración (ver
+# `invalidate_meal`), para quien haya sumado el vector anterior (las listas
+# auto-mantenidas). Argumentos: meal (ya con la versión nueva), previous (el
+# vector de antes del cambio).
+meal_vector_changed = Signal()
+
+
+class MealVectorCache:
+    """
+    LRU en memoria (acotada) con respaldo opcional en el framework de caché
+    de Django (útil si hay varios procesos/servidores).
+    """
+
+    def __init__(self, maxsize=2048, alias=None):
+        self.maxsize = maxsize
+        self.alias = alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(meal_id, version):
+        return f"meal-vector:{meal_id}:{version}"
+
+    def get_many(self, versions):
+        """
+        `versions` es {meal_id: version}. Devuelve {meal_id: vector}.
+        Los que faltan se calculan con UNA consulta.
+        """
+        found = {}
+        missing = {}
+        with self._lock:
+            for meal_id, version in versions.items():
+                key = self.key(meal_id, version)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[meal_id] = self._entries[key]
+                else:
+                    missing[key] = meal_id
+
+        if missing and self.alias:
+            shared = caches[self.alias].get_many(list(missing))
+            for key, vector in shared.items():
+                found[missing.pop(key)] = vector
+                self._store(key, vector)
+
+        if missing:
+            loaded = load_vectors(list(missing.values()))
+            to_share = {}
+            for key, meal_id in missing.items():
+                vector = loaded.get(meal_id, ())
+                found[meal_id] = vector
+                to_share[key] = vector
+                self._store(key, vector)
+            if self.alias:
+                caches[self.alias].set_many(to_share)
+
+        return found
+
+    def get(self, meal_id, version):
+        return self.get_many({meal_id: version})[meal_id]
+
+    def evict(self, meal_id):
+        prefix = f"meal-vector:{meal_id}:"
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key, vector):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def load_vectors(meal_ids):
+    """
+    Calcula desde la BD los vectores por ración de varias recetas.
+    """
+    from .models import Meal, RecipeIngredient
+
+    vectors = {meal_id: [] for meal_id in Meal.objects.filter(pk__in=meal_ids).values_list('pk', flat=True)}
+    rows = RecipeIngredient.objects.filter(meal_id__in=meal_ids).order_by('pk').values_list(
+        'meal_id', 'ingredient_id', 'ingredient__name', 'unit', 'quantity', 'meal__base_servings'
+    )
+    for meal_id, ingredient_id, name, unit, quantity, base_servings in rows:
+        # Evitamos división por cero si la receta estuviera mal
+        base = base_servings if base_servings > 0 else 1
+        vectors[meal_id].append(VectorEntry(ingredient_id, name, unit, quantity / base))
+    return {meal_id: tuple(vector) for meal_id, vector in vectors.items()}
+
+
+meal_vectors = MealVectorCache(
+    maxsize=getattr(settings, 'MEAL_VECTOR_CACHE_SIZE', 2048),
+    alias=getattr(settings, 'MEAL_VECTOR_CACHE_ALIAS', None),
+)
+
+
+def get_vector(meal):
+    """Vector por ración de una receta (instancia de Meal)."""
+    return meal_vectors.get(meal.pk, meal.ingredients_version)
+
+
+def get_vectors_by_id(meal_ids):
+    """
+    Igual que `get_vector` pero a partir de ids: una consulta para leer las
+    versiones y, solo si hay fallos de caché, otra para calcularlos.
+    """
+    from .models import Meal
+
+    versions = dict(Meal.objects.filter(pk__in=set(meal_ids)).values_list('pk', 'ingredients_version'))
+    return meal_vectors.get_many(versions)
+
+
+def scale_vector(vector, servings):
+    """Cantidades de cada ingrediente para `servings` raciones."""
+    return [(entry, entry.per_serving * servings) for entry in vector]
+
+
+def invalidate_meal(meal, previous=None):
+    """
+    Marca como obsoleto el vector de una receta (tras editarla/crearla).
+    Si se pasa `previous` (el vector de antes de editarla) se avisa con
+    `meal_vector_changed`.
+    """
+    from .models import Meal
+
+    now = timezone.now()
+    Meal.objects.filter(pk=meal.pk).update(ingredients_version=F('ingredients_version') + 1, updated_at=now)
+    meal.updated_at = now
+    meal.ingredients_version += 1
+    meal_vectors.evict(meal.pk)
+    record('meals', [meal])
+    if previous is not None:
+        meal_vector_changed.send(sender=Meal, meal=meal, previous=previous)
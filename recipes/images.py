@@ -0,0 +1,196 @@
+"""
+Procesado de imágenes de recetas en segundo plano.
+
+Meal.save() ya no toca Pillow: solo calcula el hash del contenido cuando llega
+un fichero nuevo y deja un ImageJob en la cola (tabla de la BD). El worker
+(`manage.py process_images`) genera las variantes en WebP y JPEG:
+
+    meals/variants/<hash>/<variante>.<webp|jpg>
+
+Como la ruta lleva el hash del contenido, los ficheros nunca cambian y se
+pueden cachear para siempre.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+from meal_backend.metrics import timed
+from PIL import Image, ImageOps
+from sync.log import record
+
+logger = logging.getLogger(__name__)
+
+# Nombre de la variante -> ancho máximo en píxeles
+VARIANTS = {
+    'thumb': 160,
+    'list': 400,
+    'full': 800,
+}
+
+# Extensión -> (formato de Pillow, opciones de guardado)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 75, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 75, 'optimize': True, 'progressive': True}),
+}
+
+# Se lanza cuando el worker deja listas las variantes de una receta (meal_id)
+variants_ready = Signal()
+
+VARIANTS_DIR = 'meals/variants'
+MAX_ATTEMPTS = 3
+# Si un worker muere con un trabajo a medias, se vuelve a encolar pasado este tiempo
+STALE_AFTER = timedelta(minutes=10)
+
+
+@timed('image')
+def content_hash(file):
+    """SHA-256 del contenido de un fichero (leído por trozos)."""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def variant_path(digest, name, ext):
+    return f"{VARIANTS_DIR}/{digest}/{name}.{ext}"
+
+
+def enqueue(meal, previous_hash=''):
+    """Encola el procesado de la imagen actual de una receta."""
+    from .models import ImageJob
+
+    job = ImageJob.objects.create(meal=meal, content_hash=meal.image_hash, previous_hash=previous_hash or '')
+    if getattr(settings, 'IMAGE_PROCESSING_EAGER', False):
+        # Modo desarrollo: sin worker, se procesa al confirmar la transacción
+        transaction.on_commit(lambda: process_job(job))
+    return job
+
+
+def build_variants(image_file, digest):
+    """
+    Genera todas las variantes de una imagen y las guarda en el storage.
+    Devuelve el diccionario que se guarda en Meal.image_variants.
+    """
+    with Image.open(image_file) as original:
+        # Corregir orientación basada en EXIF (móviles verticales)
+        img = ImageOps.exif_transpose(original)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        variants = {}
+        for name, max_width in VARIANTS.items():
+            resized = img
+            if img.width > max_width:
+                height = int(img.height * max_width / float(img.width))
+                resized = img.resize((max_width, height), Image.Resampling.LANCZOS)
+
+            files = {}
+            for ext, (fmt, options) in FORMATS.items():
+                path = variant_path(digest, name, ext)
+                # El contenido es el mismo para el mismo hash: si ya existe, se reutiliza
+                if not default_storage.exists(path):
+                    buffer = BytesIO()
+                    resized.save(buffer, format=fmt, **options)
+                    default_storage.save(path, ContentFile(buffer.getvalue()))
+                files[ext] = path
+
+            variants[name] = {'width': resized.width, 'height': resized.height, **files}
+    return variants
+
+
+def delete_variants(digest):
+    """Borra las variantes de un hash si ninguna receta lo usa ya."""
+    from .models import Meal
+
+    if not digest or Meal.objects.filter(image_hash=digest).exists():
+        return
+    for name in VARIANTS:
+        for ext in FORMATS:
+            path = variant_path(digest, name, ext)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+
+
+def process_job(job):
+    """Procesa un ImageJob. Los errores se registran en el propio trabajo."""
+    from .models import ImageJob, Meal
+
+    meal = Meal.objects.filter(pk=job.meal_id).only('id', 'image', 'image_hash').first()
+
+    # Si la imagen cambió (o se borró) después de encolar, este trabajo sobra
+    if meal is None or not meal.image or meal.image_hash != job.content_hash:
+        ImageJob.objects.filter(pk=job.pk).update(status=ImageJob.DONE, updated_at=timezone.now())
+        return
+
+    try:
+        with meal.image.open('rb') as image_file:
+            variants = build_variants(image_file, job.content_hash)
+    except Exception as e:
+        logger.exception("Error procesando la imagen de la receta %s", meal.pk)
+        status = ImageJob.FAILED if job.attempts >= MAX_ATTEMPTS else ImageJob.PENDING
+        ImageJob.objects.filter(pk=job.pk).update(status=status, error=str(e), updated_at=timezone.now())
+        return
+
+    with transaction.atomic():
+        # Solo guardamos si la receta sigue teniendo esa misma imagen
+        updated = Meal.objects.filter(pk=meal.pk, image_hash=job.content_hash).update(
+            image_variants=variants, updated_at=timezone.now(),
+        )
+        ImageJob.objects.filter(pk=job.pk).update(status=ImageJob.DONE, error='', updated_at=timezone.now())
+        if updated:
+            record('meals', [meal])
+            variants_ready.send(sender=Meal, meal_id=meal.pk)
+
+    if job.previous_hash:
+        delete_variants(job.previous_hash)
+
+
+def claim_next_job():
+    """
+    Coge el siguiente trabajo pendiente. El UPDATE condicionado al estado
+    evita que dos workers procesen el mismo.
+    """
+    from .models import ImageJob
+
+    while True:
+        job = ImageJob.objects.filter(status=ImageJob.PENDING).order_by('id').first()
+        if job is None:
+            return None
+        claimed = ImageJob.objects.filter(pk=job.pk, status=ImageJob.PENDING).update(
+            status=ImageJob.RUNNING,
+            attempts=F('attempts') + 1,
+            updated_at=timezone.now(),
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def requeue_stale_jobs():
+    from .models import ImageJob
+
+    return ImageJob.objects.filter(
+        status=ImageJob.RUNNING,
+        updated_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status=ImageJob.PENDING)
+
+
+def run_pending(limit=None):
+    """Procesa trabajos pendientes (hasta `limit`). Devuelve cuántos ha hecho."""
+    done = 0
+    while limit is None or done < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        process_job(job)
+        done += 1
+    return done
@@ -0,0 +1,32 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import FORMATS, export_recipes, guess_format
+
+
+class Command(BaseCommand):
+    help = "Exporta las recetas de un usuario a JSON Lines o CSV (copia de seguridad)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help="Usuario cuyas recetas se exportan")
+        parser.add_argument('--output', default='-', help="Fichero de salida ('-' para la salida estándar)")
+        parser.add_argument('--format', choices=FORMATS, help="Por defecto, según la extensión (o jsonl)")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['user']}")
+
+        output = options['output']
+        fmt = options['format'] or guess_format(output) or 'jsonl'
+
+        if output == '-':
+            for chunk in export_recipes(user, fmt):
+                sys.stdout.write(chunk)
+            return
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            for chunk in export_recipes(user, fmt):
+                f.write(chunk)
@@ -0,0 +1,46 @@
+import json
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import BATCH_SIZE, FORMATS, ImportFormatError, guess_format, import_recipes
+
+
+class Command(BaseCommand):
+    help = "Importa recetas desde un fichero JSON Lines o CSV (por streaming, en lotes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichero a importar ('-' para la entrada estándar)")
+        parser.add_argument('--user', required=True, help="Usuario dueño de las recetas")
+        parser.add_argument('--format', choices=FORMATS, help="Por defecto, según la extensión")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['user']}")
+
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        if fmt is None:
+            raise CommandError("No sé el formato del fichero: usa --format jsonl|csv")
+
+        try:
+            if path == '-':
+                summary = import_recipes(sys.stdin, user, fmt, options['batch_size'])
+            else:
+                # newline='' para que el CSV respete los saltos de línea dentro de un campo
+                with open(path, encoding='utf-8', newline='') as lines:
+                    summary = import_recipes(lines, user, fmt, options['batch_size'])
+        except (OSError, UnicodeDecodeError, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        for error in summary['errors']:
+            self.stderr.write(f"Línea {error['line']}: {'; '.join(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['imported']} receta(s) importada(s), {summary['failed']} con errores"
+        ))
+        if options['verbosity'] > 1:
+            self.stdout.write(json.dumps(summary, ensure_ascii=False))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import content_hash, enqueue, requeue_stale_jobs, run_pending
+from recipes.models import Meal
+
+
+class Command(BaseCommand):
+    help = "Worker que procesa la cola de imágenes de recetas (variantes WebP/JPEG)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Vacía la cola y termina")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Segundos de espera con la cola vacía")
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help="Encola las recetas con imagen anteriores a las variantes (sin hash)",
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.backfill()
+
+        while True:
+            requeue_stale_jobs()
+            done = run_pending()
+            if done:
+                self.stdout.write(f"{done} imagen(es) procesada(s)")
+            if options['once']:
+                break
+            if not done:
+                time.sleep(options['sleep'])
+
+    def backfill(self):
+        queued = 0
+        for meal in Meal.objects.exclude(image='').exclude(image__isnull=True).filter(image_hash='').iterator():
+            try:
+                with meal.image.open('rb') as image_file:
+                    meal.image_hash = content_hash(image_file)
+            except FileNotFoundError:
+                self.stderr.write(f"Receta {meal.pk}: no se encuentra {meal.image.name}")
+                continue
+            Meal.objects.filter(pk=meal.pk).update(image_hash=meal.image_hash)
+            enqueue(meal)
+            queued += 1
+        self.stdout.write(f"{queued} receta(s) encolada(s)")
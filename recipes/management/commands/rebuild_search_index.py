@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes.search import backend, reindex_all
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de texto completo de las recetas (FTS5 / tsvector)."
+
+    def handle(self, *args, **options):
+        if backend() is None:
+            self.stdout.write("Este motor de base de datos no tiene índice de búsqueda")
+            return
+        total = reindex_all()
+        self.stdout.write(self.style.SUCCESS(f"{total} receta(s) indexada(s)"))
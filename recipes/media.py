@@ -0,0 +1,153 @@
+"""
+Utilidades para servir ficheros de media desde MediaProxyView:
+rutas seguras, validadores (ETag/Last-Modified), peticiones por rangos y
+delegación de la transferencia al servidor web (X-Sendfile/X-Accel-Redirect).
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+CHUNK_SIZE = 64 * 1024
+
+# Rutas con el hash del contenido (ej: meals/variants/<sha256>/thumb.webp):
+# su contenido no cambia nunca, así que se pueden cachear "para siempre".
+HASHED_PATH_RE = re.compile(r'(^|/)[0-9a-f]{64}/')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def resolve_media_path(filepath):
+    """
+    Ruta absoluta de un fichero dentro de MEDIA_ROOT.
+    Cualquier intento de salir de MEDIA_ROOT (../, rutas absolutas, enlaces
+    simbólicos) se trata como si el fichero no existiera.
+    """
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    try:
+        path = os.path.realpath(safe_join(root, filepath))
+    except (SuspiciousFileOperation, ValueError):
+        raise Http404
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        raise Http404
+    return path
+
+
+def parse_range(header, size):
+    """
+    Interpreta una cabecera Range de UN solo rango.
+    Devuelve (inicio, fin) inclusivos, None si no hay que aplicarla
+    (sin cabecera o con varios rangos) o False si no se puede satisfacer.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-500 -> los últimos 500 bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def if_range_matches(request, etag, mtime):
+    """Si hay If-Range, el rango solo vale si el validador sigue igual."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def iter_file_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_media(request, filepath):
+    path = resolve_media_path(filepath)
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': (
+            IMMUTABLE_CACHE if HASHED_PATH_RE.search(filepath)
+            else f'public, max-age={settings.MEDIA_PROXY_MAX_AGE}'
+        ),
+    }
+
+    # 304 Not Modified / 412 Precondition Failed
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is not None:
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    # El servidor web (Apache/nginx) se encarga de enviar el fichero (y los rangos)
+    sendfile = settings.MEDIA_SENDFILE
+    if sendfile:
+        response = HttpResponse(content_type=content_type)
+        relative = os.path.relpath(path, os.path.realpath(settings.MEDIA_ROOT)).replace(os.sep, '/')
+        if sendfile == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_SENDFILE_PREFIX.rstrip('/') + '/' + quote(relative)
+        else:
+            response['X-Sendfile'] = path
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    byte_range = None
+    if if_range_matches(request, etag, stat.st_mtime):
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+
+    length = end - start + 1 if size else 0
+    response = StreamingHttpResponse(iter_file_range(path, start, length), status=status, content_type=content_type)
+    response['Content-Length'] = str(length)
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meal',
+            name='ingredients_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
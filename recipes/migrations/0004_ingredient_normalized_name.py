@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 19:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+from recipes.typeahead import normalize_name
+
+
+def fill_normalized_names(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    batch = []
+    for ingredient in Ingredient.objects.only('id', 'name').iterator(chunk_size=2000):
+        ingredient.normalized_name = normalize_name(ingredient.name)
+        batch.append(ingredient)
+        if len(batch) >= 2000:
+            Ingredient.objects.bulk_update(batch, ['normalized_name'])
+            batch = []
+    if batch:
+        Ingredient.objects.bulk_update(batch, ['normalized_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_image_variants_and_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_normalized_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'normalized_name'], name='ingredient_typeahead_idx'),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 6.0 on 2026-10-18 19:40
+
+from django.conf import settings
+from django.db import migrations
+
+from recipes.typeahead import normalize_name
+
+# Índice de texto completo de recetas (ver recipes/search.py).
+# Es SQL propio de cada motor, así que no hay modelo: con otros motores
+# la migración no hace nada y la búsqueda usa icontains.
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE recipes_meal_search USING fts5("
+    "name, ingredients, instructions, user_id UNINDEXED, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+]
+
+POSTGRESQL_CREATE = [
+    "CREATE TABLE recipes_meal_search ("
+    "meal_id bigint PRIMARY KEY, user_id bigint NOT NULL, document tsvector NOT NULL)",
+    "CREATE INDEX recipes_meal_search_document_idx ON recipes_meal_search USING gin (document)",
+    "CREATE INDEX recipes_meal_search_user_idx ON recipes_meal_search (user_id)",
+]
+
+
+BATCH_SIZE = 500
+
+SQLITE_INSERT = (
+    "INSERT INTO recipes_meal_search (rowid, name, ingredients, instructions, user_id) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+
+POSTGRESQL_INSERT = (
+    "INSERT INTO recipes_meal_search (meal_id, user_id, document) VALUES (%s, %s, "
+    "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+    "setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+    "setweight(to_tsvector(%s::regconfig, %s), 'C'))"
+)
+
+
+def create_search_index(apps, schema_editor):
+    # Se indexa aquí con los modelos históricos y la conexión de la migración
+    # (no con recipes.search, que usa los modelos y la conexión actuales)
+    vendor = schema_editor.connection.vendor
+    statements = {
+        'sqlite': SQLITE_CREATE,
+        'postgresql': POSTGRESQL_CREATE,
+    }.get(vendor)
+    if statements is None:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+    Meal = apps.get_model('recipes', 'Meal')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    db_alias = schema_editor.connection.alias
+    config = getattr(settings, 'RECIPE_SEARCH_CONFIG', 'spanish')
+    meals = Meal.objects.using(db_alias).order_by('id').values_list('id', 'user_id', 'name', 'instructions')
+    batch = []
+    for meal in meals.iterator(chunk_size=BATCH_SIZE):
+        batch.append(meal)
+        if len(batch) >= BATCH_SIZE:
+            index_meals(schema_editor.connection, RecipeIngredient.objects.using(db_alias), vendor, config, batch)
+            batch = []
+    if batch:
+        index_meals(schema_editor.connection, RecipeIngredient.objects.using(db_alias), vendor, config, batch)
+
+
+def index_meals(connection, recipe_ingredients, vendor, config, meals):
+    ingredient_names = {}
+    rows = recipe_ingredients.filter(meal_id__in=[meal[0] for meal in meals]).order_by('meal_id', 'id').values_list(
+        'meal_id', 'ingredient__name'
+    )
+    for meal_id, name in rows:
+        ingredient_names.setdefault(meal_id, []).append(normalize_name(name))
+
+    documents = [
+        (meal_id, user_id, normalize_name(name), ', '.join(ingredient_names.get(meal_id, [])), normalize_name(instructions))
+        for meal_id, user_id, name, instructions in meals
+    ]
+    with connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.executemany(SQLITE_INSERT, [
+                (meal_id, name, ingredients, instructions, user_id)
+                for meal_id, user_id, name, ingredients, instructions in documents
+            ])
+        else:
+            cursor.executemany(POSTGRESQL_INSERT, [
+                (meal_id, user_id, config, name, config, ingredients, config, instructions)
+                for meal_id, user_id, name, ingredients, instructions in documents
+            ])
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS recipes_meal_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_normalized_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
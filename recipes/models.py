@@ -1,20 +1,78 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from PIL import Image, ImageOps
-from io import BytesIO
-from django.core.files.base import ContentFile
-from django.core.files import File
-import os
+from .images import content_hash, delete_variants, enqueue
+from .typeahead import normalize_name
 
 class Ingredient(models.Model):
     name = models.CharField(max_length=100)
+    # Nombre sin tildes ni mayúsculas, para el buscador (ver recipes/typeahead.py)
+    normalized_name = models.CharField(max_length=100, default='', editable=False)
     # user=Null -> Ingrediente Global (Agua, Sal)
     # user=User -> Ingrediente Privado
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='ingredients')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Búsqueda por prefijo: globales (user IS NULL) y privados de cada usuario
+            models.Index(fields=['user', 'normalized_name'], name='ingredient_typeahead_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Nombre con el que se leyó, para saber si un save() lo cambia (ver
+        # recipes/signals.py: ingredient_renamed)
+        instance._loaded_name = instance.__dict__.get('name')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Ojo: bulk_create no pasa por aquí, hay que rellenarlo a mano
+        self.normalized_name = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            extra = {'updated_at', 'normalized_name'} if 'name' in update_fields else {'updated_at'}
+            kwargs['update_fields'] = {*update_fields, *extra}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
+class MealQuerySet(models.QuerySet):
+    def with_details(self, user):
+        """
+        Precarga todo lo que pinta MealSerializer para no hacer N+1:
+        dueño, ingredientes (con su nombre) y si `user` ya tiene una copia.
+        """
+        queryset = self.select_related('user').prefetch_related(
+            models.Prefetch('ingredients', queryset=RecipeIngredient.objects.select_related('ingredient'))
+        )
+        if user is None or not user.is_authenticated:
+            return queryset.annotate(has_saved_copy=models.Value(False))
+
+        copies = self.model.objects.filter(user=user, source_meal=models.OuterRef('pk'))
+        return queryset.annotate(has_saved_copy=models.Exists(copies))
+
+    def visible_to(self, user):
+        """
+        Recetas que `user` puede ver y planificar: las suyas y las de quien
+        comparte algún grupo con él (le salen en los planes del grupo).
+        """
+        co_members = User.objects.filter(planning_groups__members=user).values('pk')
+        return self.filter(models.Q(user=user) | models.Q(user__in=co_members))
+
+    def saved_copies_state(self, user):
+        """
+        Subconsultas con cuántas copias tiene `user` y la última, para la
+        huella del ETag de lo que pinta "is_saved_by_user". Los id solo crecen:
+        guardar o borrar una copia cambia alguno de los dos.
+        """
+        copies = self.model.objects.filter(user=user, source_meal__isnull=False).order_by().values('user')
+        return {
+            'saved_copies': models.Subquery(copies.annotate(total=models.Count('pk')).values('total')),
+            'last_saved_copy': models.Subquery(copies.annotate(last=models.Max('pk')).values('last')),
+        }
+
 class Meal(models.Model):
     MEAL_TYPES = [
         ('HOME', 'Hecho en casa'),
@@ -26,66 +84,71 @@ class Meal(models.Model):
 
     # Local storage for images
     image = models.ImageField(upload_to='meals/', blank=True, null=True)
+    # Hash del contenido de la imagen y variantes generadas por el worker:
+    # {"thumb": {"width": 160, "height": 120, "webp": "meals/variants/...", "jpg": "..."}, ...}
+    image_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     instructions = models.TextField(blank=True, null=True)
     
     # La receta pertenece al USUARIO, no al grupo
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='meals')
     source_meal = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='copies')
+
+    # Sube cada vez que cambian los ingredientes/raciones (ver recipes/cache.py)
+    ingredients_version = models.PositiveIntegerField(default=0, editable=False)
+
+    # Última modificación de lo que devuelve la API (ETag/Last-Modified, ver
+    # meal_backend/conditional.py). Los UPDATE directos la ponen a mano.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = MealQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # "¿Ya tengo una copia de esta receta?" (is_saved_by_user, import_recipe)
+            models.Index(fields=['user', 'source_meal'], name='meal_user_source_idx'),
+        ]
     
+    # Campos que se actualizan con UPDATE directos (worker de imágenes, caché).
+    # Un save() normal de una instancia vieja no debe pisarlos.
+    QUERY_MANAGED_FIELDS = ('ingredients_version', 'image_variants')
+
     def save(self, *args, **kwargs):
-        # Optimization: Compress image if it's new
-        # Note: This simply checks if there is an image. 
-        # A more robust check would be comparing with the old value, but for simplicity/freshness:
-        if self.image:
-            try:
-                # We open the image. If it's already a file object, this works.
-                # If it's a new upload (InMemoryUploadedFile), this works.
-                # Using 'open' ensures the file pointer is ready.
-                
-                # Check if it is already compressed/processed (to avoid re-compression recursion)
-                # This is tricky without a flag. 
-                # However, usually uploads are InMemoryUploadedFile, while saved files are FieldFile.
-                
-                # Let's check name. If it ends in .jpg and we are enforcing jpg, we might skip?
-                # But user might upload a huge jpg.
-                
-                # Safe approach: Only process if it has not been committed to storage yet?
-                # or if it is an InMemoryUploadedFile.
-                from django.core.files.uploadedfile import InMemoryUploadedFile
-                
-                if isinstance(self.image.file, InMemoryUploadedFile) or hasattr(self.image.file, 'name'):
-                     # Basic compression logic
-                    img = Image.open(self.image)
-                    # Corregir orientación basada en EXIF (móviles verticales)
-                    img = ImageOps.exif_transpose(img)
-
-                    if img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    
-                    max_width = 800
-                    if img.width > max_width:
-                        ratio = max_width / float(img.width)
-                        height = int((float(img.height) * float(ratio)))
-                        img = img.resize((max_width, height), Image.Resampling.LANCZOS)
-                    
-                    im_io = BytesIO()
-                    img.save(im_io, name=self.image.name, format='JPEG', quality=75)
-                    
-                    # Generate a clean filename
-                    original_name = self.image.name
-                    if not original_name:
-                         original_name = f"meal_{uuid.uuid4()}.jpg"
-                    
-                    filename = os.path.splitext(os.path.basename(original_name))[0] + '.jpg'
-                    
-                    new_image = ContentFile(im_io.getvalue(), name=filename)
-                    self.image = new_image
-            except Exception as e:
-                # If there's any error opening index/file, we skip compression
-                pass
+        # La imagen ya no se procesa aquí (era lento y se hacía en cada guardado).
+        # Solo si llega un fichero NUEVO calculamos su hash; si el contenido
+        # cambia, se encola un ImageJob y el worker genera las variantes.
+        update_fields = kwargs.get('update_fields')
+        previous_hash = self.image_hash
+        image_changed = False
+
+        if update_fields is None or 'image' in update_fields:
+            if self.image and not self.image._committed:
+                digest = content_hash(self.image)
+                if digest != self.image_hash:
+                    self.image_hash = digest
+                    self.image_variants = {}
+                    image_changed = True
+            elif not self.image and self.image_hash:
+                self.image_hash = ''
+                self.image_variants = {}
+
+        if not self._state.adding:
+            if update_fields is None:
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in self.QUERY_MANAGED_FIELDS
+                ]
+            if self.image_hash != previous_hash:
+                update_fields = {*update_fields, 'image_hash', 'image_variants'}
+            kwargs['update_fields'] = {*update_fields, 'updated_at'}
 
         super().save(*args, **kwargs)
 
+        if image_changed:
+            enqueue(self, previous_hash=previous_hash)
+        elif previous_hash and not self.image_hash:
+            transaction.on_commit(lambda: delete_variants(previous_hash))
+
     def __str__(self):
         return self.name
 
@@ -96,4 +159,38 @@ class RecipeIngredient(models.Model):
     unit = models.CharField(max_length=50)
 
     def __str__(self):
-        return f"{self.quantity} {self.unit} of {self.ingredient.name}"
\ No newline at end of file
+        return f"{self.quantity} {self.unit} of {self.ingredient.name}"
+
+class ImageJob(models.Model):
+    """
+    Cola (en la BD) de imágenes pendientes de procesar.
+    La consume `manage.py process_images`.
+    """
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (PENDING, 'Pendiente'),
+        (RUNNING, 'En proceso'),
+        (DONE, 'Hecho'),
+        (FAILED, 'Fallido'),
+    ]
+
+    meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name='image_jobs')
+    content_hash = models.CharField(max_length=64)
+    # Hash de la imagen anterior, para borrar sus variantes al terminar
+    previous_hash = models.CharField(max_length=64, blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='imagejob_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.meal_id} [{self.status}] {self.content_hash[:12]}"
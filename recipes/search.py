@@ -0,0 +1,244 @@
+"""
+Búsqueda de texto completo en las recetas (nombre, ingredientes e
+instrucciones), ordenada por relevancia.
+
+El índice vive en la tabla `recipes_meal_search`, que crea la migración 0005:
+- SQLite: tabla virtual FTS5 (rowid = id de la receta).
+- PostgreSQL: columna tsvector con índice GIN (nombre con peso A,
+  ingredientes B, instrucciones C).
+Con otros motores se busca con icontains (sin índice).
+
+Los textos se indexan normalizados (sin tildes ni mayúsculas, ver
+recipes/typeahead.py), así que "jamon" encuentra "Jamón".
+
+El índice se mantiene con señales (ver recipes/signals.py). Las operaciones
+en bloque (bulk_create no lanza señales) llaman a `schedule_reindex` a mano.
+Dentro de una transacción, las recetas se acumulan y se reindexan una sola
+vez al confirmar.
+"""
+import re
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Q
+
+from .typeahead import normalize_name
+
+TABLE = 'recipes_meal_search'
+BATCH_SIZE = 500
+
+# Pesos de bm25 (FTS5) por columna: name, ingredients, instructions
+FTS_WEIGHTS = (10.0, 4.0, 1.0)
+
+WORD_RE = re.compile(r'\w+')
+
+_pending = threading.local()
+
+
+def backend(using=DEFAULT_DB_ALIAS):
+    """'sqlite', 'postgresql' o None si el motor de `using` no tiene índice."""
+    vendor = connections[using].vendor
+    if vendor in ('sqlite', 'postgresql'):
+        return vendor
+    return None
+
+
+def search_config():
+    return getattr(settings, 'RECIPE_SEARCH_CONFIG', 'spanish')
+
+
+def words(text):
+    return WORD_RE.findall(normalize_name(text))
+
+
+# --- Mantenimiento del índice ---
+
+def build_documents(meal_ids):
+    """
+    Textos a indexar de cada receta (2 consultas):
+    {meal_id: (user_id, nombre, ingredientes, instrucciones)}
+    """
+    from .models import Meal, RecipeIngredient
+
+    ingredient_names = {}
+    rows = RecipeIngredient.objects.filter(meal_id__in=meal_ids).order_by('meal_id', 'id').values_list(
+        'meal_id', 'ingredient__name'
+    )
+    for meal_id, name in rows:
+        ingredient_names.setdefault(meal_id, []).append(normalize_name(name))
+
+    return {
+        meal_id: (
+            user_id,
+            normalize_name(name),
+            ', '.join(ingredient_names.get(meal_id, [])),
+            normalize_name(instructions),
+        )
+        for meal_id, user_id, name, instructions in Meal.objects.filter(pk__in=meal_ids).values_list(
+            'id', 'user_id', 'name', 'instructions'
+        )
+    }
+
+
+def reindex_meals(meal_ids):
+    """
+    Vuelve a indexar las recetas indicadas. Las que ya no existen se
+    quitan del índice.
+    """
+    kind = backend()
+    if kind is None:
+        return
+    meal_ids = sorted(set(meal_ids))
+
+    for start in range(0, len(meal_ids), BATCH_SIZE):
+        batch = meal_ids[start:start + BATCH_SIZE]
+        documents = build_documents(batch)
+        placeholders = ', '.join(['%s'] * len(batch))
+
+        with connection.cursor() as cursor:
+            if kind == 'sqlite':
+                cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})', batch)
+                cursor.executemany(
+                    f'INSERT INTO {TABLE} (rowid, name, ingredients, instructions, user_id) '
+                    'VALUES (%s, %s, %s, %s, %s)',
+                    [
+                        (meal_id, name, ingredients, instructions, user_id)
+                        for meal_id, (user_id, name, ingredients, instructions) in documents.items()
+                    ],
+                )
+            else:
+                cursor.execute(f'DELETE FROM {TABLE} WHERE meal_id IN ({placeholders})', batch)
+                cursor.executemany(
+                    f'INSERT INTO {TABLE} (meal_id, user_id, document) VALUES (%s, %s, '
+                    "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+                    "setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+                    "setweight(to_tsvector(%s::regconfig, %s), 'C'))",
+                    [
+                        (
+                            meal_id, user_id,
+                            search_config(), name,
+                            search_config(), ingredients,
+                            search_config(), instructions,
+                        )
+                        for meal_id, (user_id, name, ingredients, instructions) in documents.items()
+                    ],
+                )
+
+
+def reindex_all():
+    """Reconstruye el índice entero (ver `manage.py rebuild_search_index`)."""
+    from .models import Meal
+
+    if backend() is None:
+        return 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+        meal_ids = list(Meal.objects.order_by('id').values_list('id', flat=True))
+        reindex_meals(meal_ids)
+    return len(meal_ids)
+
+
+def schedule_reindex(meal_ids):
+    """
+    Marca recetas para reindexar cuando se confirme la transacción actual
+    (o ya mismo si no hay ninguna abierta).
+    """
+    if backend() is None:
+        return
+    pending = getattr(_pending, 'ids', None)
+    if pending is None:
+        pending = _pending.ids = set()
+    pending.update(meal_ids)
+    # Si la transacción se deshace, los ids se quedan y se reindexan en el
+    # siguiente commit: no pasa nada, reindexar lee siempre el estado actual.
+    transaction.on_commit(flush_pending)
+
+
+def flush_pending():
+    meal_ids = getattr(_pending, 'ids', None)
+    if meal_ids:
+        _pending.ids = set()
+        reindex_meals(meal_ids)
+
+
+# --- Consultas ---
+
+def fts_quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def fts5_query(query, ingredients):
+    """
+    Expresión MATCH de FTS5. Todas las palabras son obligatorias (AND) y
+    se buscan por prefijo; los ingredientes solo en su columna:
+        "pollo"* AND ingredients : ("ajo"*) AND ingredients : ("aceite oliva"*)
+    """
+    clauses = [f'{fts_quote(word)}*' for word in words(query)]
+    for ingredient in ingredients:
+        terms = words(ingredient)
+        if terms:
+            # Frase: las palabras del ingrediente seguidas y en ese orden
+            phrase = fts_quote(' '.join(terms))
+            clauses.append(f'ingredients : ({phrase}*)')
+    return ' AND '.join(clauses)
+
+
+def tsquery(query, ingredients):
+    """
+    Texto para to_tsquery de PostgreSQL. Igual que en FTS5: todo con AND y
+    por prefijo; los ingredientes restringidos al peso B.
+        pollo:* & ajo:*B & aceite:*B & oliva:*B
+    """
+    clauses = [f'{word}:*' for word in words(query)]
+    for ingredient in ingredients:
+        clauses.extend(f'{word}:*B' for word in words(ingredient))
+    return ' & '.join(clauses)
+
+
+def search_meal_ids(user, query='', ingredients=(), limit=20, using=DEFAULT_DB_ALIAS):
+    """
+    Ids de las recetas de `user` que cumplen la búsqueda, de más a menos
+    relevante. `ingredients` son ingredientes que deben aparecer todos.
+    `using` es la base de datos donde se buscan (la misma de la que se
+    leerán luego las recetas, ej: una réplica).
+    """
+    from .models import Meal
+
+    kind = backend(using)
+    if kind == 'sqlite':
+        expression = fts5_query(query, ingredients)
+        if not expression:
+            return []
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        sql = (
+            f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s AND user_id = %s '
+            f'ORDER BY bm25({TABLE}, {weights}) LIMIT %s'
+        )
+        params = [expression, user.pk, limit]
+    elif kind == 'postgresql':
+        expression = tsquery(query, ingredients)
+        if not expression:
+            return []
+        sql = (
+            f'SELECT meal_id FROM {TABLE}, to_tsquery(%s::regconfig, %s) query '
+            'WHERE document @@ query AND user_id = %s '
+            'ORDER BY ts_rank(document, query) DESC, meal_id LIMIT %s'
+        )
+        params = [search_config(), expression, user.pk, limit]
+    else:
+        # Sin índice: aquí no hay nombres normalizados, se busca tal cual
+        queryset = Meal.objects.using(using).filter(user=user)
+        for word in query.split():
+            queryset = queryset.filter(
+                Q(name__icontains=word) | Q(instructions__icontains=word)
+                | Q(ingredients__ingredient__name__icontains=word)
+            )
+        for ingredient in ingredients:
+            queryset = queryset.filter(ingredients__ingredient__name__icontains=ingredient.strip())
+        return list(queryset.distinct().order_by('name', 'id').values_list('id', flat=True)[:limit])
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
@@ -1,8 +1,14 @@
 import base64
 import uuid
+from django.db import transaction
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from .models import Meal, Ingredient, RecipeIngredient
+from .cache import get_vector, invalidate_meal
+from .bulk import sync_recipe_ingredients
+from .search import schedule_reindex
+from .uploads import InvalidImage, check_image, max_upload_bytes
 
 # --- CLASE PERSONALIZADA PARA IMÁGENES BASE64 ---
 # Esto reemplaza a la librería drf-extra-fields que da error en Python 3.13+
@@ -11,13 +17,27 @@ class Base64ImageField(serializers.ImageField):
         # Si recibimos una cadena (base64), la convertimos a archivo
         if isinstance(data, str) and data.startswith('data:image'):
             # formato esperado: "data:image/png;base64,iVBORw0KGgo..."
+            # (Camino antiguo: para imágenes nuevas mejor POST /api/meals/{id}/image/)
             try:
                 format, imgstr = data.split(';base64,')
+            except ValueError:
+                raise serializers.ValidationError("Formato de imagen base64 inválido")
+
+            # Comprobamos el tamaño ANTES de decodificar (base64 ocupa 4/3)
+            if len(imgstr) * 3 // 4 > max_upload_bytes():
+                raise serializers.ValidationError("La imagen es demasiado grande")
+
+            try:
                 ext = format.split('/')[-1] # ej: png, jpg
                 file_name = f"{uuid.uuid4()}.{ext}"
                 data = ContentFile(base64.b64decode(imgstr), name=file_name)
             except Exception as e:
                 raise serializers.ValidationError("Formato de imagen base64 inválido")
+
+            try:
+                check_image(data)
+            except InvalidImage as e:
+                raise serializers.ValidationError(str(e))
         
         return super().to_internal_value(data)
 # ------------------------------------------------
@@ -29,6 +49,9 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ['user']
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
+    # Escribible: al editar una receta, las filas que traen id se actualizan
+    # en su sitio en lugar de borrarse y crearse de nuevo
+    id = serializers.IntegerField(required=False)
     ingredient_name = serializers.ReadOnlyField(source='ingredient.name')
     unit = serializers.CharField() 
     
@@ -43,21 +66,54 @@ class MealSerializer(serializers.ModelSerializer):
     
     # Usamos nuestra clase personalizada
     image = Base64ImageField(required=False, allow_null=True)
+    # Versiones redimensionadas (thumb/list/full en webp y jpg) que genera el worker.
+    # Mientras no estén listas viene vacío y el cliente usa `image`.
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Meal
-        fields = ['id', 'name', 'meal_type', 'base_servings', 'ingredients', 'owner_name', 'is_saved_by_user', 'instructions', 'image']
+        fields = ['id', 'name', 'meal_type', 'base_servings', 'ingredients', 'owner_name', 'is_saved_by_user', 'instructions', 'image', 'image_variants']
     
     def get_is_saved_by_user(self, obj):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
             
-        if obj.user == request.user:
+        if obj.user_id == request.user.id:
             return True
+
+        # Si la vista lo anotó con Meal.objects.with_details(), no consultamos
+        if hasattr(obj, 'has_saved_copy'):
+            return obj.has_saved_copy
             
         return Meal.objects.filter(user=request.user, source_meal=obj).exists()
 
+    def validate_ingredients(self, value):
+        # Al editar, los ids que vengan tienen que ser filas de ESTA receta
+        ids = [row['id'] for row in value if row.get('id') is not None]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Hay ingredientes repetidos (mismo id)")
+        if ids and self.instance is not None:
+            own = set(RecipeIngredient.objects.filter(meal=self.instance, pk__in=ids).values_list('pk', flat=True))
+            unknown = sorted(set(ids) - own)
+            if unknown:
+                raise serializers.ValidationError(f"Estos ingredientes no son de esta receta: {unknown}")
+        return value
+
+    def get_image_variants(self, obj):
+        request = self.context.get('request')
+        variants = {}
+        for name, variant in (obj.image_variants or {}).items():
+            entry = {'width': variant.get('width'), 'height': variant.get('height')}
+            for ext in ('webp', 'jpg'):
+                url = default_storage.url(variant[ext])
+                entry[ext] = request.build_absolute_uri(url) if request else url
+            variants[name] = entry
+        return variants
+
+    # En una transacción: si algo falla no queda la receta a medias, y el
+    # índice de búsqueda se actualiza una sola vez al confirmar.
+    @transaction.atomic
     def create(self, validated_data):
         # 1. Sacamos los datos anidados y la imagen
         ingredients_data = validated_data.pop('ingredients')
@@ -72,18 +128,30 @@ class MealSerializer(serializers.ModelSerializer):
             meal.image = image
             meal.save()
 
-        # 4. Creamos ingredientes
-        for ingredient_data in ingredients_data:
-            RecipeIngredient.objects.create(meal=meal, **ingredient_data)
+        # 4. Creamos ingredientes (todos de una vez; aquí los ids no cuentan)
+        sync_recipe_ingredients(meal, [
+            {key: value for key, value in ingredient_data.items() if key != 'id'}
+            for ingredient_data in ingredients_data
+        ], existing=[])
+
+        # 5. Invalidamos la caché de ingredientes por ración
+        invalidate_meal(meal)
             
         return meal
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         # 1. Sacamos los datos especiales
         ingredients_data = validated_data.pop('ingredients', None)
         image = validated_data.pop('image', None) # Sacamos la imagen por si viene nueva
 
         # 2. Actualizamos los campos normales (nombre, raciones, instrucciones...)
+        previous_servings = instance.base_servings
+        # Lo que aportaba la receta antes del cambio (las listas auto-mantenidas
+        # lo restan al ajustarse)
+        previous_vector = None
+        if ingredients_data is not None or 'base_servings' in validated_data:
+            previous_vector = get_vector(instance)
         instance = super().update(instance, validated_data)
 
         # 3. Lógica de la Imagen
@@ -92,13 +160,17 @@ class MealSerializer(serializers.ModelSerializer):
             instance.image = image
             instance.save()
 
-        # 4. Lógica de Ingredientes (Reemplazo completo)
+        # 4. Lógica de Ingredientes: comparamos con lo que ya hay y solo se
+        # actualiza, crea o borra lo que ha cambiado (ver recipes/bulk.py)
+        ingredients_changed = False
         if ingredients_data is not None:
-            # a) Borramos los ingredientes viejos vinculados a esta comida
-            RecipeIngredient.objects.filter(meal=instance).delete()
-            
-            # b) Creamos los nuevos con los datos que vienen del formulario
-            for ing_data in ingredients_data:
-                RecipeIngredient.objects.create(meal=instance, **ing_data)
+            ingredients_changed = sync_recipe_ingredients(instance, ingredients_data)
+            if ingredients_changed:
+                # Las operaciones en bloque no lanzan señales
+                schedule_reindex([instance.pk])
+
+        # 5. Invalidamos la caché solo si cambian ingredientes o raciones
+        if ingredients_changed or instance.base_servings != previous_servings:
+            invalidate_meal(instance, previous=previous_vector)
 
         return instance
\ No newline at end of file
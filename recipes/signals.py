@@ -0,0 +1,90 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.db.models import F
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from .cache import meal_vectors
+from .images import delete_variants
+from .models import Ingredient, Meal, RecipeIngredient
+from .search import schedule_reindex
+from .typeahead import catalog
+from sync.log import record_rows
+
+# Se lanza cuando un ingrediente cambia de nombre, con los vectores de las
+# recetas que lo usan ya invalidados (llevan el nombre, ver recipes/cache.py).
+# Argumentos: ingredient, previous_name (None si no se sabe), meal_ids.
+ingredient_name_changed = Signal()
+
+
+@receiver(post_delete, sender=Meal)
+def delete_image_variants(sender, instance, **kwargs):
+    # django_cleanup borra la imagen original; las variantes las borramos nosotros
+    if instance.image_hash:
+        digest = instance.image_hash
+        transaction.on_commit(lambda: delete_variants(digest))
+
+
+@receiver(post_save, sender=Meal)
+@receiver(post_delete, sender=Meal)
+def reindex_meal(sender, instance, **kwargs):
+    schedule_reindex([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def reindex_meal_ingredients(sender, instance, **kwargs):
+    schedule_reindex([instance.meal_id])
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def refresh_ingredient_catalog(sender, instance, **kwargs):
+    # El catálogo en memoria solo tiene los globales
+    if instance.user_id is None:
+        catalog.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, update_fields=None, **kwargs):
+    # Si se renombra un ingrediente, cambian las recetas que lo usan: su
+    # texto en el buscador, lo que devuelve la API (updated_at) y sus vectores
+    # (ingredients_version). Si no se sabe con qué nombre se leyó (no viene
+    # de la BD), se da por cambiado.
+    previous = getattr(instance, '_loaded_name', None)
+    instance._loaded_name = instance.name
+    if created or (update_fields is not None and 'name' not in update_fields) or previous == instance.name:
+        return
+    meals = set(RecipeIngredient.objects.filter(ingredient=instance).values_list('meal_id', 'meal__user_id'))
+    meal_ids = {meal_id for meal_id, user_id in meals}
+    if meal_ids:
+        Meal.objects.filter(pk__in=meal_ids).update(
+            updated_at=timezone.now(), ingredients_version=F('ingredients_version') + 1,
+        )
+        for meal_id in meal_ids:
+            meal_vectors.evict(meal_id)
+        record_rows('meals', ((meal_id, user_id, None) for meal_id, user_id in meals))
+        ingredient_name_changed.send(sender=Ingredient, ingredient=instance, previous_name=previous, meal_ids=meal_ids)
+    schedule_reindex(meal_ids)
+
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    # Sin consultar: si el campo está diferido no se sabe (y no se mira)
+    instance._loaded_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+def owner_renamed(sender, instance, created, **kwargs):
+    # Las recetas llevan el nombre del dueño (owner_name): si cambia, cambian
+    # ellas para los ETag y la sincronización
+    previous = instance._loaded_username
+    instance._loaded_username = current = instance.__dict__.get('username')
+    if created or previous is None or previous == current:
+        return
+    meals = Meal.objects.filter(user=instance)
+    meal_ids = list(meals.values_list('pk', flat=True))
+    if meal_ids:
+        meals.update(updated_at=timezone.now())
+        record_rows('meals', ((meal_id, instance.pk, None) for meal_id in meal_ids))
@@ -1,3 +1,402 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.http import Http404
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from meal_backend.testing import QueryBudgetMixin
+from sync.models import ChangeLogEntry
+from users.models import PlanningGroup
+from .media import parse_range, resolve_media_path
+from .models import Ingredient, Meal, RecipeIngredient
+from .transfer import FORMATS, export_recipes, import_recipes
+from .typeahead import normalize_name
+
+
+class RecipeEndpointBudgetTests(QueryBudgetMixin, APITestCase):
+    """
+    Consultas máximas de cada acción de recetas e ingredientes, y que ninguna
+    lectura recorra una tabla entera. Varias recetas con varios ingredientes
+    para que un N+1 se note.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        self.partner = User.objects.create_user(username='luis', password='x')
+        group = PlanningGroup.objects.create(name='Casa')
+        group.members.add(self.user, self.partner)
+
+        Ingredient.objects.create(name='Sal')
+        Ingredient.objects.create(name='Aceite')
+        self.meals = {self.user: [], self.partner: []}
+        # Con los callbacks de on_commit se rellena el índice de búsqueda
+        with self.captureOnCommitCallbacks(execute=True):
+            for owner in (self.user, self.partner):
+                for i in range(3):
+                    meal = Meal.objects.create(name=f'Arroz {i}', user=owner, instructions='Hervir')
+                    for name in ('Arroz', 'Tomate'):
+                        ingredient = Ingredient.objects.create(name=f'{name} {i}', user=owner)
+                        RecipeIngredient.objects.create(meal=meal, ingredient=ingredient, quantity=100, unit='g')
+                    self.meals[owner].append(meal)
+        # Una copia para que "is_saved_by_user" tenga ambos valores
+        Meal.objects.create(name='Copia', user=self.user, source_meal=self.meals[self.partner][0])
+        self.meal = self.meals[self.user][0]
+        self.client.force_authenticate(self.user)
+
+    def request(self, budget, method, url, data=None, status=200, **kwargs):
+        kwargs.setdefault('format', 'json')
+        # Lo que se hace al confirmar (reindexar, eventos...) también cuenta
+        with self.assertQueryBudget(budget), self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, **kwargs)
+            if response.streaming:
+                content = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status, content if response.streaming else response.content)
+        return response
+
+    def meal_payload(self, name):
+        return {
+            'name': name, 'base_servings': 2,
+            'ingredients': [{'ingredient': ingredient.id, 'quantity': 1, 'unit': 'g'}
+                            for ingredient in Ingredient.objects.filter(user__isnull=True)],
+        }
+
+    def test_meal_reads(self):
+        self.request(3, 'get', '/api/meals/')
+        self.request(3, 'get', f'/api/meals/{self.meal.id}/')
+        self.request(4, 'get', f'/api/meals/{self.meal.id}/scaled/', {'servings': 4})
+        self.request(3, 'get', '/api/meals/search/', {'q': 'arroz'})
+        self.request(2, 'get', '/api/meals/export/', {'fmt': 'jsonl'})
+
+    def test_meal_writes(self):
+        self.request(16, 'post', '/api/meals/', self.meal_payload('Nueva'), status=201)
+        payload = self.meal_payload('Renombrada')
+        payload['ingredients'].append({'ingredient': Ingredient.objects.filter(user=self.user).first().id,
+                                       'quantity': 5, 'unit': 'g'})
+        self.request(26, 'put', f'/api/meals/{self.meal.id}/', payload)
+        self.request(16, 'delete', f'/api/meals/{self.meal.id}/', status=204)
+
+    def test_meal_imports(self):
+        original, *others = self.meals[self.partner][1:]
+        self.request(17, 'post', f'/api/meals/{original.id}/import_recipe/')
+        self.request(13, 'post', '/api/meals/import_batch/', {'meal_ids': [meal.id for meal in others]})
+        lines = '\n'.join(json.dumps({
+            'name': f'Importada {i}', 'ingredients': [{'name': 'Sal', 'quantity': 1, 'unit': 'g'},
+                                                      {'name': f'Nuevo {i}', 'quantity': 2, 'unit': 'g'}],
+        }) for i in range(5))
+        self.request(13, 'post', '/api/meals/import/', lines.encode(), content_type='application/x-ndjson', format=None)
+
+    def test_meal_image_upload(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        image = io.BytesIO()
+        Image.new('RGB', (8, 8), 'red').save(image, 'PNG')
+        with override_settings(MEDIA_ROOT=media_root):
+            self.request(10, 'post', f'/api/meals/{self.meal.id}/image/', image.getvalue(),
+                         content_type='image/png', format=None)
+
+    def test_ingredient_endpoints(self):
+        self.request(2, 'get', '/api/ingredients/')
+        self.request(2, 'get', '/api/ingredients/search/', {'q': 'arr'})
+        self.request(2, 'post', '/api/ingredients/', {'name': 'Pimienta'}, status=201)
+
+
+class RecipeTransferTests(TestCase):
+    """Exportar e importar deja las recetas como estaban."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        self.other = User.objects.create_user(username='luis', password='x')
+        egg = Ingredient.objects.create(name='Huevo')
+        salt = Ingredient.objects.create(name='Sal')
+        for servings, instructions, ingredient in ((2, 'A', egg), (6, 'B', salt)):
+            meal = Meal.objects.create(name='Tortilla', base_servings=servings, instructions=instructions, user=self.user)
+            RecipeIngredient.objects.create(meal=meal, ingredient=ingredient, quantity=servings, unit='unidades')
+        Meal.objects.create(name='Vacía', instructions='', user=self.user)
+
+    def recipes(self, user):
+        return sorted(
+            (meal.name, meal.base_servings, meal.instructions,
+             sorted((ri.ingredient.name, ri.quantity, ri.unit) for ri in meal.ingredients.all()))
+            for meal in Meal.objects.filter(user=user).prefetch_related('ingredients__ingredient')
+        )
+
+    def test_round_trip_keeps_recipes_with_the_same_name(self):
+        for fmt in FORMATS:
+            with self.subTest(fmt=fmt):
+                Meal.objects.filter(user=self.other).delete()
+                exported = ''.join(export_recipes(self.user, fmt))
+                summary = import_recipes(io.StringIO(exported), self.other, fmt)
+                self.assertEqual(summary['imported'], 3, summary)
+                self.assertEqual(self.recipes(self.other), self.recipes(self.user))
+
+    def test_csv_without_recipe_column_groups_by_name(self):
+        lines = io.StringIO(
+            'name,ingredient,quantity,unit\n'
+            'Tortilla,Huevo,2,unidades\n'
+            'Tortilla,Sal,1,g\n'
+            'Pisto,,,\n'
+        )
+        summary = import_recipes(lines, self.other, 'csv')
+        self.assertEqual(summary['imported'], 2, summary)
+        self.assertEqual(
+            [(name, len(ingredients)) for name, _, _, ingredients in self.recipes(self.other)],
+            [('Pisto', 0), ('Tortilla', 2)],
+        )
+
+
+class IngredientRenameTests(TestCase):
+    """Solo un cambio de nombre toca las recetas que usan el ingrediente."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        ingredient = Ingredient.objects.create(name='Sal', user=self.user)
+        self.meal = Meal.objects.create(name='Caldo', user=self.user)
+        RecipeIngredient.objects.create(meal=self.meal, ingredient=ingredient, quantity=1, unit='g')
+        self.ingredient = Ingredient.objects.get(pk=ingredient.pk)
+
+    def meal_queries(self, save):
+        with CaptureQueriesContext(connection) as context:
+            save()
+        return [query['sql'] for query in context.captured_queries if 'recipes_meal' in query['sql']]
+
+    def test_saves_without_rename_leave_meals_alone(self):
+        self.assertEqual(self.meal_queries(self.ingredient.save), [])
+        self.assertEqual(self.meal_queries(lambda: self.ingredient.save(update_fields=['updated_at'])), [])
+
+    def test_rename_touches_meals(self):
+        before = Meal.objects.get(pk=self.meal.pk).updated_at
+        self.ingredient.name = 'Sal marina'
+        self.assertTrue(self.meal_queries(self.ingredient.save))
+        self.assertGreater(Meal.objects.get(pk=self.meal.pk).updated_at, before)
+        # Ya guardado con el nombre nuevo: guardar otra vez no es renombrar
+        self.assertEqual(self.meal_queries(self.ingredient.save), [])
+
+
+class RecipeIngredientSyncTests(APITestCase):
+    """Editar una receta solo toca las filas de ingredientes que cambian (recipes/bulk.py)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        self.salt = Ingredient.objects.create(name='Sal')
+        self.rice = Ingredient.objects.create(name='Arroz')
+        self.meal = Meal.objects.create(name='Arroz blanco', base_servings=2, user=self.user)
+        self.rows = [
+            RecipeIngredient.objects.create(meal=self.meal, ingredient=ingredient, quantity=quantity, unit=unit)
+            for ingredient, quantity, unit in ((self.salt, 1, 'g'), (self.rice, 100, 'g'), (self.rice, 2, 'tazas'))
+        ]
+        self.client.force_authenticate(self.user)
+
+    def put(self, ingredients):
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as context:
+            response = self.client.put(f'/api/meals/{self.meal.id}/', {
+                'name': 'Arroz blanco', 'base_servings': 2, 'ingredients': ingredients,
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [query['sql'] for query in context.captured_queries if 'recipes_recipeingredient' in query['sql']]
+
+    def current(self):
+        return list(self.meal.ingredients.order_by('id').values_list('id', 'ingredient__name', 'quantity', 'unit'))
+
+    def version(self):
+        return Meal.objects.get(pk=self.meal.pk).ingredients_version
+
+    def test_rows_with_id_are_updated_in_place(self):
+        version = self.version()
+        self.put([
+            {'id': self.rows[0].id, 'ingredient': self.salt.id, 'quantity': 3, 'unit': 'g'},
+            {'id': self.rows[1].id, 'ingredient': self.rice.id, 'quantity': 100, 'unit': 'g'},
+            {'id': self.rows[2].id, 'ingredient': self.rice.id, 'quantity': 2, 'unit': 'tazas'},
+        ])
+        self.assertEqual(self.current(), [
+            (self.rows[0].id, 'Sal', 3, 'g'), (self.rows[1].id, 'Arroz', 100, 'g'),
+            (self.rows[2].id, 'Arroz', 2, 'tazas'),
+        ])
+        self.assertEqual(self.version(), version + 1)
+        # El vector en caché sale ya con la cantidad nueva
+        response = self.client.get(f'/api/meals/{self.meal.id}/scaled/', {'servings': 2})
+        self.assertEqual(response.data['ingredients'][0]['quantity'], 3)
+
+    def test_rows_without_id_reuse_the_same_ingredient_preferring_the_unit(self):
+        self.put([
+            {'ingredient': self.rice.id, 'quantity': 3, 'unit': 'tazas'},
+            {'ingredient': self.salt.id, 'quantity': 1, 'unit': 'g'},
+        ])
+        # Arroz en tazas reutiliza la fila en tazas (no la primera de arroz); la de gramos sobra
+        self.assertEqual(self.current(), [(self.rows[0].id, 'Sal', 1, 'g'), (self.rows[2].id, 'Arroz', 3, 'tazas')])
+
+    def test_new_and_removed_rows(self):
+        pepper = Ingredient.objects.create(name='Pimienta')
+        version = self.version()
+        self.put([
+            {'id': self.rows[0].id, 'ingredient': self.salt.id, 'quantity': 1, 'unit': 'g'},
+            {'ingredient': pepper.id, 'quantity': 0.5, 'unit': 'g'},
+        ])
+        rows = self.current()
+        self.assertEqual(rows[0], (self.rows[0].id, 'Sal', 1, 'g'))
+        self.assertEqual(rows[1][1:], ('Pimienta', 0.5, 'g'))
+        self.assertNotIn(rows[1][0], [row.id for row in self.rows])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(self.version(), version + 1)
+        self.assertTrue(ChangeLogEntry.objects.filter(kind='meals', object_id=self.meal.id).exists())
+        # El buscador ya la encuentra por el ingrediente nuevo
+        response = self.client.get('/api/meals/search/', {'q': 'pimienta'})
+        self.assertEqual([meal['id'] for meal in response.data], [self.meal.id])
+
+    def test_unchanged_rows_are_not_written(self):
+        version = self.version()
+        queries = self.put([
+            {'id': row.id, 'ingredient': row.ingredient_id, 'quantity': row.quantity, 'unit': row.unit}
+            for row in self.rows
+        ])
+        self.assertFalse([sql for sql in queries if not sql.startswith('SELECT')], queries)
+        self.assertEqual(self.version(), version)
+
+
+class MediaProxyTests(TestCase):
+    """GET /api/media-proxy/<ruta>: no sale de MEDIA_ROOT y respeta rangos y validadores."""
+
+    def setUp(self):
+        base = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, base)
+        self.root = os.path.join(base, 'media')
+        os.makedirs(os.path.join(self.root, 'meals'))
+        with open(os.path.join(self.root, 'meals', 'receta.txt'), 'wb') as f:
+            f.write(b'0123456789')
+        with open(os.path.join(base, 'secreto.txt'), 'wb') as f:
+            f.write(b'no')
+        os.symlink(os.path.join(base, 'secreto.txt'), os.path.join(self.root, 'meals', 'enlace.txt'))
+        os.symlink(base, os.path.join(self.root, 'fuera'))
+        settings = override_settings(MEDIA_ROOT=self.root, MEDIA_SENDFILE=None)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def get(self, path, **headers):
+        response = self.client.get(f'/api/media-proxy/{path}', headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_file(self):
+        response, body = self.get('meals/receta.txt')
+        self.assertEqual((response.status_code, body), (200, b'0123456789'))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_paths_outside_media_root(self):
+        for path in ('../secreto.txt', 'meals/../../secreto.txt', '%2e%2e/secreto.txt',
+                     'meals/enlace.txt', 'fuera/secreto.txt', os.path.join(os.path.dirname(self.root), 'secreto.txt')):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path)[0].status_code, 404)
+        for path in ('../secreto.txt', 'meals/enlace.txt', '/etc/passwd', 'meals'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                resolve_media_path(path)
+
+    def test_ranges(self):
+        response, body = self.get('meals/receta.txt', range='bytes=2-4')
+        self.assertEqual((response.status_code, body, response['Content-Range']), (206, b'234', 'bytes 2-4/10'))
+        response, body = self.get('meals/receta.txt', range='bytes=-3')
+        self.assertEqual((response.status_code, body, response['Content-Range']), (206, b'789', 'bytes 7-9/10'))
+        response, body = self.get('meals/receta.txt', range='bytes=8-')
+        self.assertEqual((response.status_code, body, response['Content-Length']), (206, b'89', '2'))
+
+    def test_unsatisfiable_range(self):
+        for header in ('bytes=10-', 'bytes=5-2', 'bytes=-0'):
+            with self.subTest(header=header):
+                response, body = self.get('meals/receta.txt', range=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_parse_range(self):
+        self.assertIsNone(parse_range('', 10))
+        self.assertIsNone(parse_range('bytes=0-1,3-4', 10))  # Varios rangos: fichero entero
+        self.assertEqual(parse_range('bytes=-50', 10), (0, 9))
+        self.assertEqual(parse_range('bytes=3-100', 10), (3, 9))
+        self.assertIs(parse_range('bytes=20-30', 10), False)
+
+    def test_if_range(self):
+        etag = self.get('meals/receta.txt')[0]['ETag']
+        response, body = self.get('meals/receta.txt', range='bytes=0-1', if_range=etag)
+        self.assertEqual((response.status_code, body), (206, b'01'))
+        # El fichero ha cambiado desde que el cliente pidió la primera parte
+        response, body = self.get('meals/receta.txt', range='bytes=0-1', if_range='"otro"')
+        self.assertEqual((response.status_code, body), (200, b'0123456789'))
+        response, body = self.get('meals/receta.txt', range='bytes=0-1', if_range='Mon, 01 Jan 2001 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified(self):
+        first = self.get('meals/receta.txt')[0]
+        response, body = self.get('meals/receta.txt', if_none_match=first['ETag'])
+        self.assertEqual((response.status_code, body), (304, b''))
+        self.assertEqual(response['ETag'], first['ETag'])
+        self.assertEqual(self.get('meals/receta.txt', if_none_match='"otro"')[0].status_code, 200)
+
+    def test_hashed_paths_are_immutable(self):
+        digest = 'a' * 64
+        os.makedirs(os.path.join(self.root, 'meals', 'variants', digest))
+        with open(os.path.join(self.root, 'meals', 'variants', digest, 'thumb.webp'), 'wb') as f:
+            f.write(b'webp')
+        response = self.get(f'meals/variants/{digest}/thumb.webp')[0]
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertNotIn('immutable', self.get('meals/receta.txt')[0]['Cache-Control'])
+
+
+class IngredientTypeaheadTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        for name in ['Tomate', 'Tomate cherry', 'Tomillo', 'Atún', 'Jamón serrano']:
+            Ingredient.objects.create(name=name)
+        self.client.force_authenticate(self.user)
+
+    def names(self, query, limit=10):
+        response = self.client.get('/api/ingredients/search/', {'q': query, 'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data]
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name('  Jamón   SERRANO '), 'jamon serrano')
+
+    def test_prefix(self):
+        self.assertEqual(self.names('tom'), ['Tomate', 'Tomate cherry', 'Tomillo'])
+        self.assertEqual(self.names('tom', limit=2), ['Tomate', 'Tomate cherry'])
+        # Solo por el principio, sin tildes ni mayúsculas
+        self.assertEqual(self.names('mate'), [])
+        self.assertEqual(self.names('JAMON s'), ['Jamón serrano'])
+        self.assertEqual(self.names('atún'), ['Atún'])
+        self.assertEqual(self.names(''), [])
+
+    def test_private_first(self):
+        Ingredient.objects.create(name='Tomate', user=self.user)
+        Ingredient.objects.create(name='Tomate frito', user=self.user)
+        other = User.objects.create_user(username='luis', password='x')
+        Ingredient.objects.create(name='Tomatillo', user=other)
+
+        response = self.client.get('/api/ingredients/search/', {'q': 'tomat'})
+        # El "Tomate" global no se repite: ya tengo uno mío
+        self.assertEqual(
+            [(row['name'], row['user']) for row in response.data],
+            [('Tomate', self.user.pk), ('Tomate frito', self.user.pk), ('Tomate cherry', None)],
+        )
+
+    def test_catalog_invalidated_on_save(self):
+        self.assertEqual(self.names('pimi'), [])
+        Ingredient.objects.create(name='Pimiento')
+        self.assertEqual(self.names('pimi'), ['Pimiento'])
+
+    @override_settings(INGREDIENT_CATALOG_TTL=60)
+    def test_catalog_ttl(self):
+        now = 1000.0
+        with mock.patch('recipes.typeahead.time.monotonic', side_effect=lambda: now):
+            self.assertEqual(self.names('pimi'), [])
+            # Como si lo hubiera creado otro proceso: aquí no llega la señal
+            Ingredient.objects.bulk_create([Ingredient(name='Pimiento', normalized_name='pimiento')])
+            now += 59
+            self.assertEqual(self.names('pimi'), [])
+            now += 2
+            self.assertEqual(self.names('pimi'), ['Pimiento'])
@@ -0,0 +1,275 @@
+"""
+Importación y exportación de recetas en bloque, por streaming.
+
+Formatos:
+- JSON Lines ("jsonl"): una receta por línea
+    {"name": "Tortilla", "meal_type": "HOME", "base_servings": 2,
+     "instructions": "...", "ingredients": [{"name": "Huevo", "quantity": 4, "unit": "unidades"}]}
+- CSV ("csv"): una fila por ingrediente con las columnas de CSV_COLUMNS.
+  Las filas SEGUIDAS con el mismo `recipe` (la exportación pone el id de la
+  receta) son la misma receta. Sin esa columna, o con ella vacía, se agrupan
+  por nombre (ficheros escritos a mano); dos recetas seguidas con el mismo
+  nombre se juntarían en una. Una receta sin ingredientes es una fila con
+  `ingredient` vacío.
+
+El fichero se lee receta a receta y se guarda en lotes de `batch_size`:
+validar, resolver los ingredientes por nombre (ver IngredientResolver) y un
+bulk_create de Meal y otro de RecipeIngredient, cada lote en su transacción.
+La memoria no depende del tamaño del fichero.
+"""
+import csv
+import io
+import json
+from itertools import groupby, islice
+
+from django.db import transaction
+
+from .bulk import IngredientResolver, originals_queryset
+from .models import Meal, RecipeIngredient
+from .search import schedule_reindex
+from .typeahead import normalize_name
+from sync.log import CREATE, record
+
+FORMATS = ('jsonl', 'csv')
+CSV_COLUMNS = ['recipe', 'name', 'meal_type', 'base_servings', 'instructions', 'ingredient', 'quantity', 'unit']
+
+BATCH_SIZE = 500
+# Errores que se devuelven con detalle (el resto solo se cuentan)
+MAX_REPORTED_ERRORS = 100
+
+MEAL_TYPES = {code for code, _ in Meal.MEAL_TYPES}
+
+
+class ImportFormatError(Exception):
+    """El fichero no se puede leer en el formato indicado."""
+
+
+def guess_format(filename):
+    """'recetas.csv' -> 'csv'. None si la extensión no dice nada."""
+    ext = (filename or '').rsplit('.', 1)[-1].lower()
+    if ext in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if ext == 'csv':
+        return 'csv'
+    return None
+
+
+# --- Lectura ---
+
+def iter_jsonl(lines):
+    """Genera (nº de línea, receta) de un fichero JSON Lines."""
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, ImportFormatError(f"JSON inválido: {e.msg}")
+
+
+def iter_csv(lines):
+    """Genera (nº de línea de la primera fila, receta) de un CSV."""
+    reader = csv.DictReader(lines)
+    missing = {'name', 'ingredient', 'quantity', 'unit'} - set(reader.fieldnames or [])
+    if missing:
+        raise ImportFormatError(f"Faltan columnas en el CSV: {', '.join(sorted(missing))}")
+
+    def recipe_key(item):
+        row = item[1]
+        key = (row.get('recipe') or '').strip()
+        return ('recipe', key) if key else ('name', (row.get('name') or '').strip())
+
+    numbered = ((reader.line_num, row) for row in reader)
+    for _, rows in groupby(numbered, key=recipe_key):
+        rows = list(rows)
+        line_no, first = rows[0]
+        yield line_no, {
+            'name': first.get('name'),
+            'meal_type': first.get('meal_type') or 'HOME',
+            'base_servings': first.get('base_servings') or 2,
+            'instructions': first.get('instructions') or '',
+            'ingredients': [
+                {'name': row.get('ingredient'), 'quantity': row.get('quantity'), 'unit': row.get('unit')}
+                for _, row in rows
+                if (row.get('ingredient') or '').strip()
+            ],
+        }
+
+
+def iter_records(lines, fmt):
+    if fmt == 'jsonl':
+        return iter_jsonl(lines)
+    if fmt == 'csv':
+        return iter_csv(lines)
+    raise ImportFormatError(f"Formato no soportado: {fmt}")
+
+
+# --- Validación ---
+
+def clean_record(row):
+    """
+    Valida una receta. Devuelve (datos limpios, None) o (None, [errores]).
+    Es a mano y no con MealSerializer para no hacer consultas por receta.
+    """
+    if isinstance(row, ImportFormatError):
+        return None, [str(row)]
+    if not isinstance(row, dict):
+        return None, ["Cada receta debe ser un objeto"]
+
+    errors = []
+    name = str(row.get('name') or '').strip()
+    if not name:
+        errors.append("Falta el nombre")
+    elif len(name) > 200:
+        errors.append("El nombre no puede superar 200 caracteres")
+
+    meal_type = row.get('meal_type') or 'HOME'
+    if meal_type not in MEAL_TYPES:
+        errors.append(f"meal_type debe ser uno de: {', '.join(sorted(MEAL_TYPES))}")
+
+    try:
+        base_servings = int(row.get('base_servings') or 2)
+        if base_servings < 1:
+            raise ValueError
+    except (TypeError, ValueError):
+        errors.append("base_servings debe ser un entero positivo")
+        base_servings = None
+
+    ingredients = []
+    raw_ingredients = row.get('ingredients') or []
+    if not isinstance(raw_ingredients, list):
+        errors.append("ingredients debe ser una lista")
+        raw_ingredients = []
+    for position, item in enumerate(raw_ingredients, start=1):
+        if not isinstance(item, dict):
+            errors.append(f"Ingrediente {position}: debe ser un objeto")
+            continue
+        ingredient_name = str(item.get('name') or '').strip()
+        unit = str(item.get('unit') or '').strip()
+        try:
+            quantity = float(item.get('quantity'))
+        except (TypeError, ValueError):
+            quantity = None
+        if not ingredient_name or len(ingredient_name) > 100:
+            errors.append(f"Ingrediente {position}: nombre vacío o de más de 100 caracteres")
+        if quantity is None or quantity < 0:
+            errors.append(f"Ingrediente {position}: cantidad inválida")
+        if not unit or len(unit) > 50:
+            errors.append(f"Ingrediente {position}: unidad vacía o de más de 50 caracteres")
+        ingredients.append({'name': ingredient_name, 'quantity': quantity, 'unit': unit})
+
+    if errors:
+        return None, errors
+    return {
+        'name': name,
+        'meal_type': meal_type,
+        'base_servings': base_servings,
+        'instructions': str(row.get('instructions') or ''),
+        'ingredients': ingredients,
+    }, None
+
+
+# --- Importación ---
+
+def save_batch(recipes, user, resolver):
+    """Guarda un lote de recetas ya validadas (número fijo de consultas)."""
+    with transaction.atomic():
+        resolved = resolver.resolve(
+            ingredient['name'] for recipe in recipes for ingredient in recipe['ingredients']
+        )
+        meals = Meal.objects.bulk_create([
+            Meal(
+                name=recipe['name'],
+                meal_type=recipe['meal_type'],
+                base_servings=recipe['base_servings'],
+                instructions=recipe['instructions'],
+                user=user,
+            )
+            for recipe in recipes
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                meal=meal,
+                ingredient=resolved[normalize_name(ingredient['name'])],
+                quantity=ingredient['quantity'],
+                unit=ingredient['unit'],
+            )
+            for recipe, meal in zip(recipes, meals)
+            for ingredient in recipe['ingredients']
+        ])
+        # bulk_create no lanza señales: el buscador y el registro de cambios hay que avisarlos a mano
+        schedule_reindex(meal.pk for meal in meals)
+        record('meals', meals, CREATE)
+    return len(meals)
+
+
+def import_recipes(lines, user, fmt, batch_size=BATCH_SIZE):
+    """
+    Importa recetas desde un iterable de líneas de texto (un fichero abierto
+    en modo texto, por ejemplo). Las recetas con errores se saltan y se
+    informan; las demás se guardan. Devuelve un resumen:
+        {"imported": 120, "failed": 2, "errors": [{"line": 7, "errors": [...]}]}
+    """
+    # El mapa nombre -> Ingredient se comparte entre lotes: crece con los
+    # ingredientes distintos, no con el número de recetas
+    resolver = IngredientResolver(user, include_global=True)
+    summary = {'imported': 0, 'failed': 0, 'errors': []}
+
+    records = iter_records(lines, fmt)
+    while True:
+        chunk = list(islice(records, batch_size))
+        if not chunk:
+            break
+        valid = []
+        for line_no, row in chunk:
+            data, errors = clean_record(row)
+            if errors:
+                summary['failed'] += 1
+                if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                    summary['errors'].append({'line': line_no, 'errors': errors})
+            else:
+                valid.append(data)
+        if valid:
+            summary['imported'] += save_batch(valid, user, resolver)
+    return summary
+
+
+# --- Exportación ---
+
+def export_records(user):
+    """(id, receta como diccionario) de las recetas de `user`, leídas por lotes."""
+    queryset = originals_queryset().filter(user=user).order_by('id')
+    for meal in queryset.iterator(chunk_size=BATCH_SIZE):
+        yield meal.pk, {
+            'name': meal.name,
+            'meal_type': meal.meal_type,
+            'base_servings': meal.base_servings,
+            'instructions': meal.instructions or '',
+            'ingredients': [
+                {'name': recipe_ing.ingredient.name, 'quantity': recipe_ing.quantity, 'unit': recipe_ing.unit}
+                for recipe_ing in meal.ingredients.all()
+            ],
+        }
+
+
+def export_recipes(user, fmt):
+    """Genera el fichero de exportación trozo a trozo (texto)."""
+    if fmt == 'jsonl':
+        for _, row in export_records(user):
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+        return
+    if fmt != 'csv':
+        raise ImportFormatError(f"Formato no soportado: {fmt}")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for meal_id, row in export_records(user):
+        base = [meal_id, row['name'], row['meal_type'], row['base_servings'], row['instructions']]
+        for ingredient in row['ingredients'] or [{'name': '', 'quantity': '', 'unit': ''}]:
+            writer.writerow(base + [ingredient['name'], ingredient['quantity'], ingredient['unit']])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,115 @@
+"""
+Búsqueda por prefijo de ingredientes (typeahead del selector).
+
+- Los nombres se normalizan (sin tildes, en minúsculas, espacios colapsados)
+  y se guardan en Ingredient.normalized_name, que está indexada.
+- El catálogo global (user=None) se mantiene en memoria en cada proceso como
+  un "trie aplanado": la lista ordenada de nombres normalizados. Todos los
+  que empiezan por un prefijo están juntos, así que una búsqueda es un
+  bisect + recorrer k elementos: O(log n + k), sin tocar la BD.
+- Los ingredientes privados del usuario se buscan en la BD por rango sobre
+  el índice (user, normalized_name).
+"""
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+
+# Carácter más alto posible: todo lo que empieza por `prefix` es < prefix + MAX_CHAR
+MAX_CHAR = '\U0010ffff'
+
+
+def normalize_name(name):
+    """'  Jamón  Serrano ' -> 'jamon serrano'"""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    without_accents = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(without_accents.casefold().split())
+
+
+class IngredientCatalog:
+    """Índice en memoria de los ingredientes globales."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []      # nombres normalizados, ordenados
+        self._entries = []   # (id, nombre) en el mismo orden
+        self._built_at = None
+        self._dirty = True
+
+    def invalidate(self):
+        self._dirty = True
+
+    def _stale(self):
+        if self._dirty or self._built_at is None:
+            return True
+        # Otros procesos no reciben nuestras señales: reconstruimos cada cierto tiempo
+        return time.monotonic() - self._built_at > settings.INGREDIENT_CATALOG_TTL
+
+    def _build(self):
+        from .models import Ingredient
+
+        rows = Ingredient.objects.filter(user__isnull=True).order_by('normalized_name', 'id').values_list(
+            'normalized_name', 'id', 'name'
+        )
+        keys, entries = [], []
+        for normalized, ingredient_id, name in rows:
+            keys.append(normalized)
+            entries.append((ingredient_id, name))
+        self._keys, self._entries = keys, entries
+        self._built_at = time.monotonic()
+        self._dirty = False
+
+    def search(self, prefix, limit):
+        if self._stale():
+            with self._lock:
+                if self._stale():
+                    self._build()
+
+        keys, entries = self._keys, self._entries
+        start = bisect_left(keys, prefix)
+        results = []
+        for i in range(start, min(start + limit, len(keys))):
+            if not keys[i].startswith(prefix):
+                break
+            results.append(entries[i])
+        return results
+
+
+catalog = IngredientCatalog()
+
+
+def search_ingredients(user, query, limit):
+    """
+    Ingredientes cuyo nombre empieza por `query` (sin distinguir tildes ni
+    mayúsculas): primero los privados del usuario, luego los globales.
+    Devuelve una lista de (id, nombre, user_id).
+    """
+    from .models import Ingredient
+
+    prefix = normalize_name(query)
+    if not prefix:
+        return []
+
+    results = []
+    seen = set()
+    if user is not None and user.is_authenticated:
+        private = Ingredient.objects.filter(
+            user=user,
+            normalized_name__gte=prefix,
+            normalized_name__lt=prefix + MAX_CHAR,
+        ).order_by('normalized_name', 'id').values_list('id', 'name', 'normalized_name')[:limit]
+        for ingredient_id, name, normalized in private:
+            results.append((ingredient_id, name, user.id))
+            seen.add(normalized)
+
+    for ingredient_id, name in catalog.search(prefix, limit):
+        if len(results) >= limit:
+            break
+        # Si tengo uno privado que se llama igual, no repetimos el global
+        if normalize_name(name) in seen:
+            continue
+        results.append((ingredient_id, name, None))
+
+    return results
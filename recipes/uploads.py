@@ -0,0 +1,109 @@
+"""
+Subida de imágenes de recetas por streaming.
+
+El fichero se escribe a disco por trozos mientras llega (nunca entero en
+memoria) y se corta en cuanto supera el límite de tamaño. Las dimensiones se
+comprueban leyendo solo la cabecera de la imagen, antes de decodificarla.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from meal_backend.metrics import timed
+from PIL import Image, UnidentifiedImageError
+
+# Formato de Pillow -> extensión del fichero guardado
+ALLOWED_FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'GIF': 'gif',
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ImageTooLarge(Exception):
+    """La subida supera MEAL_IMAGE_MAX_BYTES."""
+
+
+class InvalidImage(Exception):
+    """El fichero no es una imagen válida o se sale de los límites."""
+
+
+def max_upload_bytes():
+    return settings.MEAL_IMAGE_MAX_BYTES
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Igual que el handler de Django que escribe a un fichero temporal, pero
+    aborta la subida en cuanto se pasa del tamaño máximo.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = 0
+        self.exceeded = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > max_upload_bytes():
+            self.exceeded = True
+            raise StopUpload(connection_reset=True)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def read_raw_upload(stream, content_type):
+    """
+    Lee el cuerpo de una petición "en crudo" (Content-Type: image/...) y lo
+    vuelca a un fichero temporal por trozos.
+    """
+    upload = TemporaryUploadedFile(f"{uuid.uuid4()}", content_type, 0, None)
+    received = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        received += len(chunk)
+        if received > max_upload_bytes():
+            upload.close()
+            raise ImageTooLarge()
+        upload.write(chunk)
+    upload.size = received
+    upload.seek(0)
+    return upload
+
+
+@timed('image')
+def check_image(file):
+    """
+    Comprueba formato y dimensiones leyendo SOLO la cabecera (Pillow abre
+    las imágenes de forma perezosa). Devuelve la extensión a usar.
+    """
+    file.seek(0)
+    try:
+        with Image.open(file) as img:
+            fmt = img.format
+            width, height = img.size
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise InvalidImage("El fichero no es una imagen válida")
+    finally:
+        file.seek(0)
+
+    if fmt not in ALLOWED_FORMATS:
+        raise InvalidImage(f"Formato de imagen no soportado: {fmt}")
+
+    max_dimension = settings.MEAL_IMAGE_MAX_DIMENSION
+    if width > max_dimension or height > max_dimension:
+        raise InvalidImage(f"La imagen no puede superar {max_dimension}px de ancho o alto")
+    if width * height > settings.MEAL_IMAGE_MAX_PIXELS:
+        raise InvalidImage("La imagen tiene demasiados píxeles")
+
+    return ALLOWED_FORMATS[fmt]
+
+
+def upload_name(ext):
+    """Nombre con el que se guarda el fichero (no usamos el del cliente)."""
+    return f"{uuid.uuid4()}.{ext}"
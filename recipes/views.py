@@ -3,40 +3,80 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db.models import Q
 from django.db import transaction
-from .models import Meal, Ingredient, RecipeIngredient
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from .models import Meal, Ingredient
 from .serializers import MealSerializer, IngredientSerializer
-from django.http import FileResponse, Http404
+from .cache import get_vector, invalidate_meal, scale_vector
+from .bulk import clone_meals, originals_queryset
+from .search import search_meal_ids
+from .transfer import FORMATS, ImportFormatError, export_recipes, guess_format, import_recipes
+from .typeahead import search_ingredients
+from users.models import PlanningGroup
+from .uploads import (
+    ImageTooLarge, InvalidImage, LimitedTemporaryFileUploadHandler,
+    check_image, max_upload_bytes, read_raw_upload, upload_name,
+)
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
-import os
-from django.conf import settings
+from .media import serve_media
+from meal_backend.conditional import ConditionalResponseMixin
+from meal_backend.routers import ReplicaReadMixin
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ReplicaReadMixin, ConditionalResponseMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    cursor_ordering = 'id'
 
     def get_queryset(self):
         user = self.request.user
         if not user.is_authenticated:
             return Ingredient.objects.filter(user__isnull=True)
         # Globales (user=None) O Míos (user=yo)
-        return Ingredient.objects.filter(Q(user__isnull=True) | Q(user=user)).distinct()
+        return Ingredient.objects.filter(Q(user__isnull=True) | Q(user=user))
 
     def perform_create(self, serializer):
         # Al crear, asignamos al usuario actual
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Typeahead del selector de ingredientes: ?q=tom&limit=10
+        Busca por prefijo sin distinguir tildes ni mayúsculas.
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response({"error": "limit debe ser un número entero"}, status=400)
+
+        results = search_ingredients(request.user, request.query_params.get('q', ''), max(limit, 1))
+        return Response([
+            {"id": ingredient_id, "name": name, "user": user_id}
+            for ingredient_id, name, user_id in results
+        ])
+
 
-class MealViewSet(viewsets.ModelViewSet):
+# Content-Type del cuerpo en crudo -> formato de importación
+IMPORT_CONTENT_TYPES = {
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/json-lines': 'jsonl',
+    'text/csv': 'csv',
+}
+
+
+class MealViewSet(ReplicaReadMixin, ConditionalResponseMixin, viewsets.ModelViewSet):
     queryset = Meal.objects.all()
     serializer_class = MealSerializer
+    cursor_ordering = 'id'
 
     def get_queryset(self):
         user = self.request.user
         if not user.is_authenticated:
             return Meal.objects.none()
         # Solo mis recetas
-        return Meal.objects.filter(user=user)
+        return Meal.objects.filter(user=user).with_details(user)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -50,63 +90,22 @@ class MealViewSet(viewsets.ModelViewSet):
         try:
             # 1. Obtenemos la receta original (aunque no sea mía, si tengo el ID puedo clonarla)
             # Nota: Podrías añadir seguridad extra para comprobar si pertenece a un grupo compartido
-            original_meal = Meal.objects.get(pk=pk)
+            original_meal = originals_queryset().get(pk=pk)
             
             existing_copy = Meal.objects.filter(user=request.user, source_meal=original_meal).exists()
             if existing_copy:
                  return Response({"message": "Ya tienes una copia de esta receta"}, status=200)
 
-            if original_meal.user == request.user:
+            if original_meal.user_id == request.user.id:
                 return Response({"message": "Esta receta ya es tuya"}, status=200)
 
+            # 2. Clonamos la receta y sus ingredientes (ver recipes/bulk.py):
+            # Si el ingrediente es global, lo reutilizamos.
+            # Si es privado de otro usuario, buscamos si YO ya tengo uno con el mismo nombre.
+            # Si no tengo uno igual, creo una copia privada para mí.
             with transaction.atomic():
-                # 2. Clonamos la receta (Objeto Meal)
-                new_meal = Meal.objects.create(
-                    name=f"{original_meal.name}",
-                    meal_type=original_meal.meal_type,
-                    base_servings=original_meal.base_servings,
-                    instructions=original_meal.instructions,
-                    user=request.user, # ¡Ahora es mía!
-                    source_meal=original_meal
-                )
-
-                # 3. Clonamos los ingredientes
-                for recipe_ing in original_meal.ingredients.all():
-                    original_ingredient = recipe_ing.ingredient
-                    
-                    # LOGICA INTELIGENTE DE INGREDIENTES:
-                    # Si el ingrediente es global, lo reutilizamos.
-                    # Si es privado de otro usuario, buscamos si YO ya tengo uno con el mismo nombre.
-                    # Si no tengo uno igual, creo una copia privada para mí.
-                    
-                    target_ingredient = None
-                    
-                    if original_ingredient.user is None:
-                        # Es global, lo usamos directo
-                        target_ingredient = original_ingredient
-                    else:
-                        # Es privado. ¿Tengo yo uno igual?
-                        my_existing = Ingredient.objects.filter(
-                            user=request.user, 
-                            name__iexact=original_ingredient.name
-                        ).first()
-                        
-                        if my_existing:
-                            target_ingredient = my_existing
-                        else:
-                            # No lo tengo, creo una copia para mí
-                            target_ingredient = Ingredient.objects.create(
-                                name=original_ingredient.name,
-                                user=request.user
-                            )
-
-                    # Creamos la relación en la tabla intermedia
-                    RecipeIngredient.objects.create(
-                        meal=new_meal,
-                        ingredient=target_ingredient,
-                        quantity=recipe_ing.quantity,
-                        unit=recipe_ing.unit
-                    )
+                new_meal, = clone_meals([original_meal], request.user)
+                invalidate_meal(new_meal)
 
             return Response({"status": "Receta importada correctamente", "new_id": new_meal.id})
 
@@ -115,17 +114,237 @@ class MealViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({"error": str(e)}, status=500)
 
+    @action(detail=False, methods=['post'])
+    def import_batch(self, request):
+        """
+        Copia muchas recetas de golpe a la biblioteca del usuario actual.
+        Cuerpo: {"meal_ids": [1, 2, 3]} o {"owner": <id de usuario>} para
+        importar todas las recetas de un miembro de mis grupos.
+
+        Corre en un número fijo de consultas y devuelve el resultado por receta.
+        """
+        meal_ids = request.data.get('meal_ids')
+        owner_id = request.data.get('owner')
+
+        if owner_id is not None:
+            try:
+                owner_id = int(owner_id)
+            except (TypeError, ValueError):
+                return Response({"error": "owner debe ser un id de usuario"}, status=400)
+            shares_group = PlanningGroup.objects.filter(members=request.user).filter(members=owner_id).exists()
+            if not shares_group:
+                return Response({"error": "Ese usuario no está en ninguno de tus grupos"}, status=403)
+            originals = list(originals_queryset().filter(user_id=owner_id).order_by('id'))
+            meal_ids = [meal.id for meal in originals]
+        elif isinstance(meal_ids, list) and meal_ids:
+            try:
+                meal_ids = list(dict.fromkeys(int(meal_id) for meal_id in meal_ids))
+            except (TypeError, ValueError):
+                return Response({"error": "meal_ids debe ser una lista de ids"}, status=400)
+            originals = list(originals_queryset().filter(pk__in=meal_ids))
+        else:
+            return Response({"error": "Indica 'meal_ids' o 'owner'"}, status=400)
+
+        by_id = {meal.id: meal for meal in originals}
+        already_copied = set(
+            Meal.objects.filter(user=request.user, source_meal_id__in=by_id).values_list('source_meal_id', flat=True)
+        )
+
+        results = {}
+        to_clone = []
+        for meal_id in meal_ids:
+            original = by_id.get(meal_id)
+            if original is None:
+                results[meal_id] = {"source_id": meal_id, "status": "not_found"}
+            elif meal_id in already_copied:
+                results[meal_id] = {"source_id": meal_id, "status": "already_copied"}
+            elif original.user_id == request.user.id:
+                results[meal_id] = {"source_id": meal_id, "status": "own"}
+            else:
+                to_clone.append(original)
+
+        for original, new_meal in zip(to_clone, clone_meals(to_clone, request.user)):
+            results[original.id] = {"source_id": original.id, "status": "imported", "new_id": new_meal.id}
+
+        ordered = [results[meal_id] for meal_id in meal_ids]
+        return Response({
+            "imported": sum(1 for result in ordered if result["status"] == "imported"),
+            "results": ordered,
+        })
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[])
+    def import_file(self, request):
+        """
+        Importa muchas recetas desde un fichero JSON Lines o CSV (formato en
+        recipes/transfer.py). Se puede mandar en crudo (Content-Type:
+        application/x-ndjson o text/csv) o como multipart en el campo "file".
+        El formato se puede forzar con ?fmt=jsonl|csv.
+        Se lee por streaming y se guarda en lotes; devuelve el resumen.
+        """
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > settings.RECIPE_IMPORT_MAX_BYTES:
+            return Response({"error": "El fichero es demasiado grande"}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        django_request = request._request
+        content_type = request.content_type or ''
+        fmt = request.query_params.get('fmt')
+        if content_type.startswith('multipart/form-data'):
+            upload = django_request.FILES.get('file')
+            if upload is None:
+                return Response({"error": "Falta el campo 'file'"}, status=status.HTTP_400_BAD_REQUEST)
+            fmt = fmt or guess_format(upload.name)
+            source = upload
+        else:
+            fmt = fmt or IMPORT_CONTENT_TYPES.get(content_type.split(';')[0].strip())
+            source = django_request
+
+        if fmt not in FORMATS:
+            return Response(
+                {"error": "Formato desconocido: usa ?fmt=jsonl|csv o un Content-Type adecuado"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+
+        # Línea a línea (en bytes, cortando solo por \n) sin cargar el fichero entero
+        lines = (line.decode('utf-8') for line in source)
+        try:
+            summary = import_recipes(lines, request.user, fmt)
+        except UnicodeDecodeError:
+            return Response({"error": "El fichero debe estar en UTF-8"}, status=status.HTTP_400_BAD_REQUEST)
+        except ImportFormatError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_file(self, request):
+        """Descarga todas mis recetas (?fmt=jsonl|csv), generada por streaming."""
+        fmt = request.query_params.get('fmt', 'jsonl')
+        if fmt not in FORMATS:
+            return Response({"error": "fmt debe ser jsonl o csv"}, status=status.HTTP_400_BAD_REQUEST)
+        content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(export_recipes(request.user, fmt), content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="recetas.{fmt}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Búsqueda de texto completo en mis recetas (nombre, ingredientes e
+        instrucciones), de más a menos relevante:
+            ?q=pollo al horno&ingredient=ajo&ingredient=tomate&limit=20
+        Todas las palabras e ingredientes deben aparecer (por prefijo).
+        """
+        query = request.query_params.get('q', '')
+        ingredients = [name for name in request.query_params.getlist('ingredient') if name.strip()]
+        if not query.strip() and not ingredients:
+            return Response({"error": "Indica 'q' o algún 'ingredient'"}, status=400)
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            return Response({"error": "limit debe ser un número entero"}, status=400)
+
+        # El índice y las recetas se leen de la misma base de datos (réplica o primario)
+        queryset = self.get_queryset()
+        meal_ids = search_meal_ids(request.user, query, ingredients, max(limit, 1), using=queryset.db)
+        meals = queryset.in_bulk(meal_ids)
+        serializer = self.get_serializer([meals[meal_id] for meal_id in meal_ids if meal_id in meals], many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def scaled(self, request, pk=None):
+        """
+        Vista previa de la receta escalada a ?servings=N raciones.
+        Sale de la caché de ingredientes por ración (sin recorrer RecipeIngredient).
+        """
+        meal = self.get_object()
+        try:
+            servings = int(request.query_params.get('servings', meal.base_servings))
+        except ValueError:
+            return Response({"error": "servings debe ser un número entero"}, status=400)
+
+        ingredients = [
+            {
+                "ingredient": entry.ingredient_id,
+                "ingredient_name": entry.name,
+                "quantity": round(quantity, 2),
+                "unit": entry.unit,
+            }
+            for entry, quantity in scale_vector(get_vector(meal), servings)
+        ]
+        return Response({"id": meal.id, "servings": servings, "ingredients": ingredients})
+
+    @action(detail=True, methods=['post', 'put'], url_path='image', parser_classes=[])
+    def upload_image(self, request, pk=None):
+        """
+        Sube la imagen de una receta sin pasar por base64. Acepta:
+        - multipart/form-data con el fichero en el campo "image", o
+        - el fichero en crudo en el cuerpo (Content-Type: image/jpeg, image/png...).
+        Se escribe a disco por trozos y se corta al pasar MEAL_IMAGE_MAX_BYTES.
+        """
+        meal = self.get_object()
+
+        # Si el cliente ya nos dice que es demasiado grande, ni lo leemos
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > max_upload_bytes():
+            return Response({"error": "La imagen es demasiado grande"}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        # Leemos el cuerpo directamente de la petición de Django (sin los
+        # parsers de DRF) para poder usar nuestro upload handler.
+        django_request = request._request
+        content_type = request.content_type or ''
+        try:
+            if content_type.startswith('multipart/form-data'):
+                handler = LimitedTemporaryFileUploadHandler(django_request)
+                django_request.upload_handlers = [handler]
+                upload = django_request.FILES.get('image')
+                if handler.exceeded:
+                    raise ImageTooLarge()
+            elif content_type.startswith('image/'):
+                upload = read_raw_upload(django_request, content_type)
+            else:
+                return Response(
+                    {"error": "Envía la imagen como multipart/form-data o image/*"},
+                    status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                )
+        except ImageTooLarge:
+            return Response({"error": "La imagen es demasiado grande"}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        if upload is None:
+            return Response({"error": "Falta el campo 'image'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            ext = check_image(upload)
+        except InvalidImage as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Meal.save calcula el hash y encola el procesado de las variantes
+        upload.name = upload_name(ext)
+        meal.image = upload
+        meal.save(update_fields=['image'])
+        upload.close()
+
+        serializer = self.get_serializer(meal)
+        return Response({
+            "id": meal.id,
+            "image": serializer.data['image'],
+            "image_variants": serializer.data['image_variants'],
+        })
+
 class MediaProxyView(APIView):
     """
     Sirve archivos de media a través de Django para evitar problemas de CORS
     cuando se generan PDFs o se consumen desde clientes estrictos.
+
+    Soporta GET condicional (ETag/Last-Modified -> 304), rangos de bytes (206),
+    caché inmutable para rutas con hash y, opcionalmente, delega el envío al
+    servidor web con X-Sendfile/X-Accel-Redirect (settings.MEDIA_SENDFILE).
     """
     permission_classes = [AllowAny]
 
     def get(self, request, filepath):
-        # Construir la ruta completa
-        path = os.path.join(settings.MEDIA_ROOT, filepath)
-        
-        if os.path.exists(path):
-            return FileResponse(open(path, 'rb'))
-        raise Http404
+        return serve_media(request, filepath)
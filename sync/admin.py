@@ -0,0 +1,9 @@
+# sync/admin.py
+from django.contrib import admin
+from .models import ChangeLogEntry
+
+
+@admin.register(ChangeLogEntry)
+class ChangeLogEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'object_id', 'op', 'user_id', 'group_id', 'created_at')
+    list_filter = ('kind', 'op')
@@ -0,0 +1,126 @@
+"""
+Registro de cambios para la sincronización por diferencias (GET /api/sync/,
+ver sync/views.py).
+
+Cada escritura sobre un tipo sincronizable deja una ChangeLogEntry con el
+ámbito de quién puede verla. Las escrituras de una en una llegan por señales
+(sync/signals.py); las operaciones en bloque (bulk_create, bulk_update,
+update) no lanzan señales y llaman a `record` a mano, igual que con el
+buscador (ver recipes/search.py).
+
+Al leer, la entrada solo dice QUÉ objeto mirar: lo que se devuelve sale del
+estado actual. Si el objeto ya no existe o el usuario ya no lo ve, va como
+borrado. Así leer dos veces la misma entrada no hace daño.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from .models import ChangeLogEntry
+
+CREATE, UPDATE, DELETE = ChangeLogEntry.CREATE, ChangeLogEntry.UPDATE, ChangeLogEntry.DELETE
+
+# Tipos sincronizables: modelo y ámbito de sus cambios -> (user_id, group_id)
+KINDS = {
+    'meals': ('recipes.Meal', lambda obj: (obj.user_id, None)),
+    'ingredients': ('recipes.Ingredient', lambda obj: (obj.user_id, None)),
+    'plans': ('planner.DailyPlan', lambda obj: (None, obj.group_id)),
+    'shopping_lists': ('planner.ShoppingList', lambda obj: (None, obj.group_id)),
+    'groups': ('users.PlanningGroup', lambda obj: (None, obj.pk)),
+}
+KIND_BY_MODEL = {label: kind for kind, (label, scope) in KINDS.items()}
+
+
+def record(kind, objects, op=UPDATE):
+    """Apunta el cambio `op` de los `objects` (instancias de `kind`). Un INSERT."""
+    scope = KINDS[kind][1]
+    record_rows(kind, ((obj.pk, *scope(obj)) for obj in objects), op)
+
+
+def record_rows(kind, rows, op=UPDATE):
+    """Igual que `record` pero con filas (object_id, user_id, group_id)."""
+    ChangeLogEntry.objects.bulk_create([
+        ChangeLogEntry(kind=kind, object_id=object_id, op=op, user_id=user_id, group_id=group_id)
+        for object_id, user_id, group_id in rows
+    ])
+
+
+def record_membership(group_id, user_ids, op):
+    """
+    Un usuario entra en un grupo (o sale, o se borra el grupo): a partir de
+    ahora ve (o deja de ver) el grupo, sus planes, sus listas y las recetas
+    planificadas. Se apunta todo a su nombre para que su próxima
+    sincronización lo traiga (o lo quite).
+    """
+    from planner.models import DailyPlan, ShoppingList
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    plans = list(DailyPlan.objects.filter(group_id=group_id).values_list('pk', 'meal_id'))
+    objects = [('groups', group_id)]
+    objects += [('plans', plan_id) for plan_id, meal_id in plans]
+    objects += [('meals', meal_id) for meal_id in {meal_id for plan_id, meal_id in plans if meal_id}]
+    objects += [
+        ('shopping_lists', list_id)
+        for list_id in ShoppingList.objects.filter(group_id=group_id).values_list('pk', flat=True)
+    ]
+    ChangeLogEntry.objects.bulk_create([
+        ChangeLogEntry(kind=kind, object_id=object_id, op=op, user_id=user_id)
+        for user_id in user_ids
+        for kind, object_id in objects
+    ])
+
+
+# --- LECTURA ---
+
+def latest_cursor():
+    return ChangeLogEntry.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+def visible_entries(user):
+    """Entradas que le tocan a `user`: las suyas, las de sus grupos y las globales."""
+    group_ids = list(user.planning_groups.values_list('pk', flat=True))
+    return ChangeLogEntry.objects.filter(
+        Q(user_id=user.pk) | Q(group_id__in=group_ids) | Q(user_id__isnull=True, group_id__isnull=True)
+    )
+
+
+def read_changes(user, cursor, limit=None):
+    """
+    Objetos que han cambiado para `user` después de `cursor`, con coste
+    proporcional al número de cambios (índices por usuario/grupo + id).
+
+    Devuelve (nuevo cursor, quedan más, {kind: {object_id: se creó}}), o None
+    si no hay cursor o no vale (de antes de la limpieza del registro o de
+    otra base de datos): el cliente tiene que cargarlo todo de nuevo.
+    """
+    limit = limit or settings.SYNC_PAGE_SIZE
+    if cursor is None:
+        return None
+    bounds = ChangeLogEntry.objects.aggregate(oldest=Min('id'), latest=Max('id'))
+    if bounds['latest'] is not None and not bounds['oldest'] - 1 <= cursor <= bounds['latest']:
+        return None
+
+    entries = visible_entries(user)
+    fields = ('id', 'kind', 'object_id', 'op')
+    page = list(entries.filter(id__gt=cursor).order_by('id').values_list(*fields)[:limit + 1])
+    more = len(page) > limit
+    page = page[:limit]
+    # Con PostgreSQL una transacción puede coger un id menor que otra y
+    # confirmarse después: volvemos a mirar lo que entró hace muy poco por
+    # detrás del cursor (leerlo dos veces no hace daño). SQLite tiene un solo
+    # escritor, así que allí los ids se confirman en orden.
+    recent = []
+    if settings.SYNC_SAFETY_WINDOW and connection.vendor != 'sqlite':
+        recent = entries.filter(
+            id__lte=cursor, created_at__gte=timezone.now() - timedelta(seconds=settings.SYNC_SAFETY_WINDOW),
+        ).order_by('id').values_list(*fields)[:limit]
+
+    touched = {}
+    for entry_id, kind, object_id, op in [*recent, *page]:
+        objects = touched.setdefault(kind, {})
+        objects[object_id] = objects.get(object_id, False) or op == CREATE
+    return (page[-1][0] if page else cursor), more, touched
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sync.models import ChangeLogEntry
+
+
+class Command(BaseCommand):
+    help = "Borra las entradas antiguas del registro de cambios de la sincronización."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SYNC_LOG_RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        limit = timezone.now() - timedelta(days=options['days'])
+        latest = ChangeLogEntry.objects.order_by('-id').values_list('id', flat=True).first()
+        # La última se queda siempre: sin ella no sabríamos si un cursor
+        # viejo se ha perdido cambios (ver sync/log.py, read_changes)
+        deleted, _ = ChangeLogEntry.objects.filter(created_at__lt=limit).exclude(pk=latest).delete()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} entrada(s) borrada(s)"))
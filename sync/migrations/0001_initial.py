@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('op', models.CharField(choices=[('create', 'Creado'), ('update', 'Modificado'), ('delete', 'Borrado')], max_length=10)),
+                ('user_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('group_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['user_id', 'id'], name='changelog_user_cursor_idx'), models.Index(fields=['group_id', 'id'], name='changelog_group_cursor_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import models
+
+
+class ChangeLogEntry(models.Model):
+    """
+    Un cambio en un objeto que los clientes sincronizan por diferencias
+    (ver sync/log.py). El id es el cursor: cada cliente guarda el último que
+    ha visto y pide lo posterior.
+
+    El ámbito dice quién lo ve:
+    - user_id: solo ese usuario (sus recetas, sus ingredientes).
+    - group_id: los miembros del grupo (planes, listas, el propio grupo).
+    - ninguno de los dos: todos (ingredientes globales).
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    OPS = [
+        (CREATE, 'Creado'),
+        (UPDATE, 'Modificado'),
+        (DELETE, 'Borrado'),
+    ]
+
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    op = models.CharField(max_length=10, choices=OPS)
+    # Sin ForeignKey: la entrada tiene que sobrevivir al borrado del usuario/grupo
+    user_id = models.PositiveIntegerField(null=True, blank=True)
+    group_id = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # "lo de este usuario / grupo después del cursor"
+            models.Index(fields=['user_id', 'id'], name='changelog_user_cursor_idx'),
+            models.Index(fields=['group_id', 'id'], name='changelog_group_cursor_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.op} {self.kind}:{self.object_id}"
@@ -0,0 +1,71 @@
+from django.apps import apps
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from planner.models import DailyPlan
+from planner.signals import in_bulk_operation
+from recipes.models import Ingredient, Meal, RecipeIngredient
+from users.models import PlanningGroup
+from .log import CREATE, DELETE, KIND_BY_MODEL, KINDS, UPDATE, record, record_membership, record_rows
+
+
+def object_saved(sender, instance, created, raw=False, **kwargs):
+    # Las operaciones en bloque de planes apuntan sus cambios ellas mismas
+    if raw or (sender is DailyPlan and in_bulk_operation()):
+        return
+    record(KIND_BY_MODEL[sender._meta.label], [instance], CREATE if created else UPDATE)
+
+
+def object_deleted(sender, instance, **kwargs):
+    if sender is DailyPlan and in_bulk_operation():
+        return
+    record(KIND_BY_MODEL[sender._meta.label], [instance], DELETE)
+
+
+for kind, (label, scope) in KINDS.items():
+    post_save.connect(object_saved, sender=apps.get_model(label), dispatch_uid=f'sync_{kind}_saved')
+    post_delete.connect(object_deleted, sender=apps.get_model(label), dispatch_uid=f'sync_{kind}_deleted')
+
+
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_deleting(sender, instance, **kwargs):
+    # Se borra en cascada de las recetas que lo usan: esas recetas cambian
+    rows = RecipeIngredient.objects.filter(ingredient=instance).order_by().values_list(
+        'meal_id', 'meal__user_id',
+    ).distinct()
+    record_rows('meals', ((meal_id, user_id, None) for meal_id, user_id in rows))
+
+
+@receiver(pre_delete, sender=Meal)
+def meal_deleting(sender, instance, **kwargs):
+    # Las copias pierden su `source_meal` (SET_NULL, sin señales)
+    record_rows('meals', ((pk, user_id, None) for pk, user_id in instance.copies.values_list('pk', 'user_id')))
+
+
+@receiver(pre_delete, sender=PlanningGroup)
+def group_deleting(sender, instance, **kwargs):
+    # Después ya no sabríamos quiénes eran los miembros
+    record_membership(instance.pk, instance.members.values_list('pk', flat=True), DELETE)
+
+
+@receiver(m2m_changed, sender=PlanningGroup.members.through)
+def membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # Después del clear ya no sabríamos qué había
+        related = instance.planning_groups if reverse else instance.members
+        instance._sync_cleared_ids = list(related.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    other_ids = getattr(instance, '_sync_cleared_ids', []) if action == 'post_clear' else pk_set
+    # {grupo: [usuarios que entran/salen]}
+    if reverse:
+        changes = {group_id: [instance.pk] for group_id in other_ids}
+    else:
+        changes = {instance.pk: list(other_ids)}
+
+    op = CREATE if action == 'post_add' else DELETE
+    for group_id, user_ids in changes.items():
+        record_membership(group_id, user_ids, op)
+    # Para el resto de miembros, el grupo ha cambiado (la lista de miembros)
+    record_rows('groups', ((group_id, None, group_id) for group_id in changes))
@@ -0,0 +1,148 @@
+import io
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from meal_backend.testing import QueryBudgetMixin
+from planner.models import DailyPlan
+from recipes.models import Ingredient, Meal, RecipeIngredient
+from users.models import PlanningGroup
+from .models import ChangeLogEntry
+
+
+class SyncBudgetTests(QueryBudgetMixin, APITestCase):
+    """Una página de /api/sync/ cuesta lo mismo con 1 cambio que con muchos."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        group = PlanningGroup.objects.create(name='Casa')
+        group.members.add(self.user)
+        self.client.force_authenticate(self.user)
+        self.cursor = self.client.get('/api/sync/').data['cursor']
+
+        salt = Ingredient.objects.create(name='Sal', user=self.user)
+        for i in range(5):
+            meal = Meal.objects.create(name=f'Receta {i}', user=self.user)
+            RecipeIngredient.objects.create(meal=meal, ingredient=salt, quantity=1, unit='g')
+            DailyPlan.objects.create(group=group, date=date(2026, 1, 1 + i), meal=meal)
+
+    def test_changes_page(self):
+        with self.assertQueryBudget(9):
+            response = self.client.get('/api/sync/', {'cursor': self.cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['changes']['meals']['created']), 5)
+        self.assertEqual(len(response.data['changes']['plans']['created']), 5)
+
+
+class SyncBehaviourTests(APITestCase):
+    """Qué devuelve /api/sync/ después de cada tipo de cambio."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='x')
+        self.partner = User.objects.create_user(username='luis', password='x')
+        self.group = PlanningGroup.objects.create(name='Casa de Luis')
+        self.group.members.add(self.partner)
+        self.meal = Meal.objects.create(name='Lentejas', user=self.partner)
+        self.plan = DailyPlan.objects.create(group=self.group, date=date(2026, 1, 5), meal=self.meal)
+        self.client.force_authenticate(self.user)
+        self.cursor = self.client.get('/api/sync/').data['cursor']
+
+    def sync(self):
+        response = self.client.get('/api/sync/', {'cursor': self.cursor})
+        self.assertEqual(response.status_code, 200)
+        self.cursor = response.data['cursor']
+        return response.data
+
+    def ids(self, data, kind, op):
+        changes = data['changes'].get(kind, {}).get(op, [])
+        return sorted(change if op == 'deleted' else change['id'] for change in changes)
+
+    def test_created_updated_and_deleted(self):
+        meal = Meal.objects.create(name='Tortilla', user=self.user)
+        data = self.sync()
+        self.assertEqual(self.ids(data, 'meals', 'created'), [meal.id])
+
+        meal.name = 'Tortilla de patatas'
+        meal.save()
+        data = self.sync()
+        self.assertEqual(self.ids(data, 'meals', 'updated'), [meal.id])
+        self.assertEqual(data['changes']['meals']['updated'][0]['name'], 'Tortilla de patatas')
+
+        meal_id = meal.id
+        meal.delete()
+        data = self.sync()
+        self.assertEqual(self.ids(data, 'meals', 'deleted'), [meal_id])
+        self.assertEqual(self.ids(data, 'meals', 'created') + self.ids(data, 'meals', 'updated'), [])
+
+        # Nada nuevo: misma posición y sin cambios
+        data = self.sync()
+        self.assertEqual(data['changes'], {})
+
+    def test_other_users_changes_are_not_seen(self):
+        Meal.objects.create(name='Privada', user=self.partner)
+        DailyPlan.objects.create(group=self.group, date=date(2026, 1, 6), meal=self.meal)
+        self.assertEqual(self.sync()['changes'], {})
+
+    def test_joining_and_leaving_a_group(self):
+        self.group.members.add(self.user)
+        data = self.sync()
+        self.assertEqual(self.ids(data, 'groups', 'created'), [self.group.id])
+        self.assertEqual(self.ids(data, 'plans', 'created'), [self.plan.id])
+        # La receta de otro miembro sale porque está en los planes del grupo
+        self.assertEqual(self.ids(data, 'meals', 'created'), [self.meal.id])
+
+        self.plan.target_servings = 6
+        self.plan.save()
+        self.assertEqual(self.ids(self.sync(), 'plans', 'updated'), [self.plan.id])
+
+        self.group.members.remove(self.user)
+        data = self.sync()
+        self.assertEqual(self.ids(data, 'groups', 'deleted'), [self.group.id])
+        self.assertEqual(self.ids(data, 'plans', 'deleted'), [self.plan.id])
+        self.assertEqual(self.ids(data, 'meals', 'deleted'), [self.meal.id])
+
+    def test_pages(self):
+        meals = [Meal.objects.create(name=f'Receta {i}', user=self.user) for i in range(5)]
+        seen = []
+        with override_settings(SYNC_PAGE_SIZE=2):
+            for more in (True, True, False):
+                data = self.sync()
+                self.assertEqual(data['more'], more)
+                seen += self.ids(data, 'meals', 'created')
+        self.assertEqual(seen, [meal.id for meal in meals])
+
+    def test_cursor_older_than_the_log_resets(self):
+        Meal.objects.create(name='Vieja', user=self.user)
+        ChangeLogEntry.objects.update(created_at=timezone.now() - timedelta(days=40))
+        recent = Meal.objects.create(name='Nueva', user=self.user)
+        latest = ChangeLogEntry.objects.latest('id').id
+
+        out = io.StringIO()
+        call_command('prune_change_log', days=30, stdout=out)
+        self.assertEqual(list(ChangeLogEntry.objects.values_list('object_id', flat=True)), [recent.id])
+
+        data = self.sync()
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['cursor'], latest)
+        # Desde el cursor de la carga completa se sigue por diferencias
+        data = self.sync()
+        self.assertFalse(data['reset'])
+
+    def test_prune_keeps_the_latest_entry(self):
+        Meal.objects.create(name='Vieja', user=self.user)
+        ChangeLogEntry.objects.update(created_at=timezone.now() - timedelta(days=40))
+        latest = ChangeLogEntry.objects.latest('id').id
+        call_command('prune_change_log', days=30, stdout=io.StringIO())
+        self.assertEqual(list(ChangeLogEntry.objects.values_list('id', flat=True)), [latest])
+
+        # Un cliente al día no tiene que recargar nada
+        self.cursor = latest
+        self.assertFalse(self.sync()['reset'])
+
+    def test_unknown_cursor_resets(self):
+        self.cursor += 1000
+        self.assertTrue(self.sync()['reset'])
@@ -0,0 +1,91 @@
+from django.db.models import Prefetch, Q
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from planner.models import DailyPlan, ShoppingList
+from planner.serializers import DailyPlanSerializer, ShoppingListSerializer
+from recipes.models import Ingredient, Meal
+from recipes.serializers import IngredientSerializer, MealSerializer
+from users.models import PlanningGroup
+from users.serializers import PlanningGroupSerializer
+from .log import latest_cursor, read_changes
+
+
+# Cómo se lee cada tipo: lo que el usuario ve ahora mismo de esos ids, con el
+# mismo serializer (y las mismas precargas) que su endpoint normal
+
+def load_meals(request, ids):
+    user = request.user
+    # Las mías y las que salen en los planes de mis grupos
+    planned = DailyPlan.objects.filter(group__members=user).values('meal_id')
+    queryset = Meal.objects.filter(pk__in=ids).filter(Q(user=user) | Q(pk__in=planned)).with_details(user)
+    return MealSerializer(queryset, many=True, context={'request': request}).data
+
+
+def load_ingredients(request, ids):
+    queryset = Ingredient.objects.filter(pk__in=ids).filter(Q(user__isnull=True) | Q(user=request.user))
+    return IngredientSerializer(queryset, many=True, context={'request': request}).data
+
+
+def load_plans(request, ids):
+    queryset = DailyPlan.objects.filter(pk__in=ids, group__members=request.user).prefetch_related(
+        Prefetch('meal', queryset=Meal.objects.with_details(request.user))
+    )
+    return DailyPlanSerializer(queryset, many=True, context={'request': request}).data
+
+
+def load_shopping_lists(request, ids):
+    queryset = ShoppingList.objects.filter(pk__in=ids, group__members=request.user).prefetch_related('items')
+    return ShoppingListSerializer(queryset, many=True, context={'request': request}).data
+
+
+def load_groups(request, ids):
+    queryset = PlanningGroup.objects.filter(pk__in=ids, members=request.user).prefetch_related('members')
+    return PlanningGroupSerializer(queryset, many=True, context={'request': request}).data
+
+
+LOADERS = {
+    'meals': load_meals,
+    'ingredients': load_ingredients,
+    'plans': load_plans,
+    'shopping_lists': load_shopping_lists,
+    'groups': load_groups,
+}
+
+
+class SyncQuerySerializer(serializers.Serializer):
+    # Último cursor que recibió el cliente (sin él: carga completa)
+    cursor = serializers.IntegerField(min_value=0, required=False)
+
+
+class SyncView(APIView):
+    """
+    GET /api/sync/?cursor=N -> lo que ha cambiado desde N para el usuario:
+        {"cursor": 1234, "reset": false, "more": false,
+         "changes": {"meals": {"created": [...], "updated": [...], "deleted": [7]}, ...}}
+    Se vuelve a llamar con el nuevo `cursor` (enseguida si "more": true).
+    Sin cursor, o con "reset": true, el cliente tiene que cargarlo todo por
+    los endpoints normales y seguir desde el `cursor` devuelto.
+    """
+
+    def get(self, request):
+        query = SyncQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        result = read_changes(request.user, query.validated_data.get('cursor'))
+        if result is None:
+            # El cursor se lee ANTES de que el cliente lo cargue todo: lo que
+            # cambie mientras tanto le llegará en la siguiente sincronización
+            return Response({"cursor": latest_cursor(), "reset": True, "more": False, "changes": {}})
+
+        cursor, more, touched = result
+        changes = {}
+        for kind, objects in touched.items():
+            visible = {data['id']: data for data in LOADERS[kind](request, list(objects))}
+            changes[kind] = {
+                "created": [data for object_id, data in visible.items() if objects[object_id]],
+                "updated": [data for object_id, data in visible.items() if not objects[object_id]],
+                # Borrados o que ya no son visibles para este usuario
+                "deleted": sorted(object_id for object_id in objects if object_id not in visible),
+            }
+        return Response({"cursor": cursor, "reset": False, "more": more, "changes": changes})
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 19:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_planninggroup_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planninggroup',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
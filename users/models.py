@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import User
 
 class PlanningGroup(models.Model):
@@ -16,6 +17,19 @@ class PlanningGroup(models.Model):
     planning_config = models.JSONField(default=dict, verbose_name="Días de planificación")
     
     created_at = models.DateTimeField(auto_now_add=True)
+    # Nombre, configuración o miembros (no cambia con los planes: para eso está `version`)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Contador de cambios del calendario del grupo (planes y recetas que
+    # aparecen en él). Sirve de ETag para el calendario compacto.
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    @classmethod
+    def touch(cls, group_ids):
+        """Sube la versión de los grupos indicados (un único UPDATE)."""
+        group_ids = {group_id for group_id in group_ids if group_id is not None}
+        if group_ids:
+            cls.objects.filter(pk__in=group_ids).update(version=F('version') + 1)
 
     def __str__(self):
         return self.name
\ No newline at end of file
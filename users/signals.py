@@ -0,0 +1,23 @@
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import PlanningGroup
+
+
+@receiver(m2m_changed, sender=PlanningGroup.members.through)
+def members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # La API devuelve los miembros dentro del grupo: si cambian, cambia el grupo
+    if reverse and action == 'pre_clear':
+        # user.planning_groups.clear(): después ya no sabríamos qué grupos eran
+        instance._cleared_group_ids = list(instance.planning_groups.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        group_ids = [instance.pk]
+    elif action == 'post_clear':
+        group_ids = getattr(instance, '_cleared_group_ids', [])
+    else:
+        group_ids = pk_set
+    PlanningGroup.objects.filter(pk__in=group_ids).update(updated_at=timezone.now())
@@ -1,3 +1,44 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from meal_backend.testing import QueryBudgetMixin
+from .models import PlanningGroup
+
+
+class UserEndpointBudgetTests(QueryBudgetMixin, APITestCase):
+    """
+    Consultas máximas de usuarios y grupos, y que ninguna lectura recorra una
+    tabla entera. Varios grupos con varios miembros para que un N+1 se note.
+    """
+    # /api/users/ lista todos los usuarios por id (paginado: se corta en el LIMIT)
+    allowed_scans = ('auth_user',)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', email='ana@example.com', password='x')
+        self.others = [
+            User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='x')
+            for i in range(4)
+        ]
+        self.groups = []
+        for i in range(3):
+            group = PlanningGroup.objects.create(name=f'Grupo {i}')
+            group.members.add(self.user, *self.others[i:i + 2])
+            self.groups.append(group)
+        self.client.force_authenticate(self.user)
+
+    def request(self, budget, method, url, data=None, status=200):
+        with self.assertQueryBudget(budget), self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, status, response.content)
+        return response
+
+    def test_group_endpoints(self):
+        self.request(3, 'get', '/api/groups/')
+        self.request(3, 'get', f'/api/groups/{self.groups[0].id}/')
+        self.request(11, 'post', '/api/groups/', {'name': 'Nuevo'}, status=201)
+        self.request(11, 'post', f'/api/groups/{self.groups[0].id}/add_member/', {'username': 'user3@example.com'})
+
+    def test_user_endpoints(self):
+        self.request(1, 'get', '/api/users/')
+        self.request(0, 'get', '/api/users/me/')
+        self.request(1, 'patch', '/api/users/me/', {'first_name': 'Ana'})
@@ -7,6 +7,7 @@ from rest_framework.permissions import AllowAny
 from .serializers import RegisterSerializer, UserSerializer, PlanningGroupSerializer
 from django.shortcuts import get_object_or_404
 from .models import PlanningGroup
+from meal_backend.conditional import ConditionalResponseMixin
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -17,6 +18,7 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = 'id'
 
     # Esta función permite acceder a /api/users/me/
     @action(detail=False, methods=['get', 'patch'])
@@ -33,13 +35,15 @@ class UserViewSet(viewsets.ModelViewSet):
                 return Response(serializer.data)
             return Response(serializer.errors, status=400)
 
-class PlanningGroupViewSet(viewsets.ModelViewSet):
+class PlanningGroupViewSet(ConditionalResponseMixin, viewsets.ModelViewSet):
     serializer_class = PlanningGroupSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = 'id'
 
     def get_queryset(self):
         # Solo mostrar los grupos a los que pertenece el usuario
-        return self.request.user.planning_groups.all()
+        # (con los miembros precargados: se pintan sus nombres)
+        return self.request.user.planning_groups.prefetch_related('members')
 
     def perform_create(self, serializer):
         # Al crear un grupo, el creador se añade automáticamente